@@ -0,0 +1,154 @@
+from __future__ import annotations
+from itertools import groupby
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+from . import models, versions
+from .cache import MISS, TTLCache
+
+# 成绩统计：均值、及格率、分段人数、学分加权成绩与绩点在 SQL 中聚合；
+# 中位数与百分位数取成绩列后计算（安装了 NumPy 时用 NumPy）。
+# 学生学分与绩点直接读取 student_summaries 汇总表（crud 增量维护），不经此处计算。
+# 结果按数据版本号缓存：选课 / 成绩 / 课程 / 学生档案有写入时自动失效（跨 worker 一致）。
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PASS_GRADE = 60
+# 分段区间 [lo, hi]
+BUCKETS = ((0, 59), (60, 69), (70, 79), (80, 89), (90, 100))
+PERCENTILES = (25, 50, 75, 90)
+SCOPES = (versions.ENROLLMENTS, versions.COURSES, versions.STUDENTS)
+
+_cache = TTLCache("analytics", 1024, 3600)
+
+SC, Course, Student = models.SC, models.Course, models.Student
+_graded = SC.grade.isnot(None)
+
+# 百分制转 4 分制绩点：(最低分, 绩点)，低于 60 为 0
+POINTS = ((90, 4.0), (80, 3.0), (70, 2.0), (60, 1.0))
+POINTS_EXPR = case(*[(SC.grade >= lo, p) for lo, p in POINTS], else_=0.0)
+
+def grade_points(grade: int) -> float:
+    for lo, p in POINTS:
+        if grade >= lo:
+            return p
+    return 0.0
+
+def _count_if(cond):
+    return func.sum(case((cond, 1), else_=0))
+
+def _round(v, n: int = 2):
+    return None if v is None else round(float(v), n)
+
+# 线性插值百分位（与 numpy.percentile 默认方法一致）；values 已升序
+def percentiles(values: list, qs=PERCENTILES) -> list[float | None]:
+    if not values:
+        return [None] * len(qs)
+    if np is not None:
+        return [float(x) for x in np.percentile(np.asarray(values, dtype=float), qs)]
+    out = []
+    for q in qs:
+        pos = (len(values) - 1) * q / 100
+        lo = int(pos)
+        hi = min(lo + 1, len(values) - 1)
+        out.append(values[lo] + (values[hi] - values[lo]) * (pos - lo))
+    return out
+
+# 版本号未变时返回缓存结果
+def _cached(db: Session, key, compute):
+    vers = versions.get(db, *SCOPES)
+    hit = _cache.get(key)
+    if hit is not MISS and hit[0] == vers:
+        return hit[1]
+    token = _cache.token(key)
+    result = compute()
+    _cache.put(key, (vers, result), token)
+    return result
+
+# ========== 课程 ==========
+
+def _course_stats(db: Session, Cno: str | None, Tno: str | None) -> list[dict]:
+    conds = []
+    if Cno:
+        conds.append(SC.Cno == Cno)
+    if Tno:
+        conds.append(SC.Tno == Tno)
+    agg = select(
+        SC.Cno, SC.Tno, Course.Cname, Course.Ccredit,
+        func.count(), func.count(SC.grade), func.avg(SC.grade), func.min(SC.grade), func.max(SC.grade),
+        _count_if(SC.grade >= PASS_GRADE),
+        *[_count_if(SC.grade.between(lo, hi)) for lo, hi in BUCKETS],
+    ).join(Course, and_(Course.Cno == SC.Cno, Course.Ctno == SC.Tno)
+    ).where(*conds).group_by(SC.Cno, SC.Tno, Course.Cname, Course.Ccredit).order_by(SC.Cno, SC.Tno)
+    grades = db.execute(select(SC.Cno, SC.Tno, SC.grade).where(_graded, *conds)
+                        .order_by(SC.Cno, SC.Tno, SC.grade)).all()
+    by_course = {k: [r[2] for r in g] for k, g in groupby(grades, key=lambda r: (r[0], r[1]))}
+    out = []
+    for row in db.execute(agg).all():
+        Cno_, Tno_, Cname, Ccredit, enrolled, graded, mean, lo, hi, passed, *buckets = row
+        p25, median, p75, p90 = percentiles(by_course.get((Cno_, Tno_), []))
+        out.append({
+            "Cno": Cno_, "Tno": Tno_, "Cname": Cname, "Ccredit": Ccredit,
+            "enrolled": enrolled, "graded": graded,
+            "mean": _round(mean), "min": lo, "max": hi,
+            "median": _round(median), "p25": _round(p25), "p75": _round(p75), "p90": _round(p90),
+            "pass_rate": _round(passed / graded, 4) if graded else None,
+            "histogram": [{"range": f"{lo_}-{hi_}", "count": n or 0} for (lo_, hi_), n in zip(BUCKETS, buckets)],
+        })
+    return out
+
+# 按课程统计成绩（可按课程号 / 任课教师过滤）
+def course_stats(db: Session, Cno: str | None = None, Tno: str | None = None) -> list[dict]:
+    return _cached(db, ("course", Cno, Tno), lambda: _course_stats(db, Cno, Tno))
+
+# ========== 学生绩点 ==========
+
+# 汇总表行 -> 输出（未录成绩时均分与绩点为空）；row 为 crud.STUDENT_SUMMARY_ROW 列元组
+def summary_out(row) -> dict:
+    (Sno, Sname, Sdept, courses, graded, attempted, credits_graded, earned, weighted_avg, gpa) = row
+    return {
+        "Sno": Sno, "Sname": Sname, "Sdept": Sdept, "courses": courses, "graded": graded,
+        "credits_attempted": _round(attempted), "credits_graded": _round(credits_graded),
+        "credits_earned": _round(earned),
+        "weighted_avg": _round(weighted_avg) if graded else None,
+        "gpa": _round(gpa) if graded else None,
+    }
+
+# ========== 院系汇总 ==========
+
+def _department_stats(db: Session) -> list[dict]:
+    credit = Course.Ccredit
+    per_student = select(
+        Student.Sdept.label("Sdept"), SC.Sno.label("Sno"),
+        func.count(SC.grade).label("graded"),
+        func.sum(case((_graded, SC.grade), else_=0)).label("grade_sum"),
+        _count_if(SC.grade >= PASS_GRADE).label("passed"),
+        (func.sum(case((_graded, credit * POINTS_EXPR))) /
+         func.nullif(func.sum(case((_graded, credit), else_=0)), 0)).label("gpa"),
+    ).join(Student, Student.Sno == SC.Sno
+    ).join(Course, and_(Course.Cno == SC.Cno, Course.Ctno == SC.Tno)
+    ).group_by(Student.Sdept, SC.Sno).subquery()
+    rows = db.execute(select(
+        per_student.c.Sdept, func.count(), func.sum(per_student.c.graded),
+        func.sum(per_student.c.grade_sum), func.sum(per_student.c.passed), func.avg(per_student.c.gpa),
+    ).group_by(per_student.c.Sdept).order_by(per_student.c.Sdept)).all()
+    grades = db.execute(select(Student.Sdept, SC.grade).join(Student, Student.Sno == SC.Sno)
+                        .where(_graded).order_by(Student.Sdept, SC.grade)).all()
+    by_dept = {k: [r[1] for r in g] for k, g in groupby(grades, key=lambda r: r[0])}
+    out = []
+    for Sdept, students, graded, grade_sum, passed, avg_gpa in rows:
+        _, median, _, _ = percentiles(by_dept.get(Sdept, []))
+        out.append({
+            "Sdept": Sdept, "students": students, "graded": graded or 0,
+            "mean": _round(grade_sum / graded) if graded else None,
+            "median": _round(median),
+            "pass_rate": _round(passed / graded, 4) if graded else None,
+            "avg_gpa": _round(avg_gpa),
+        })
+    return out
+
+# 按院系汇总：选课学生数、成绩均值 / 中位数、及格率、学生平均绩点
+def department_stats(db: Session) -> list[dict]:
+    return _cached(db, ("dept",), lambda: _department_stats(db))
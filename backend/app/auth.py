@@ -1,38 +1,163 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
+from . import config, revocation
+from .cache import MISS, TTLCache
 
 SECRET_KEY = "CHANGE_ME_SECRET"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_ctx = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# 迭代次数可配置；低于 min_rounds 的旧哈希在登录成功后透明重算
+pwd_ctx = CryptContext(
+    schemes=["pbkdf2_sha256"], deprecated="auto",
+    pbkdf2_sha256__default_rounds=config.PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=config.PASSWORD_HASH_ROUNDS,
+)
 oauth2 = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def get_password_hash(pw: str) -> str:
+# ========== 密码哈希：CPU 密集，放到进程池执行 ==========
+# PASSWORD_HASH_WORKERS=0 时改用线程池（hashlib 的 PBKDF2 计算期间释放 GIL），同样不占用事件循环
+
+# 以下两个函数在子进程中执行，必须是模块级函数
+def _hash_in_worker(pw: str) -> str:
     return pwd_ctx.hash(pw)
 
+def _hash_many_in_worker(pws: list[str]) -> list[str]:
+    return [pwd_ctx.hash(pw) for pw in pws]
+
+def _verify_and_update_in_worker(pw: str, hashed: str) -> tuple[bool, str | None]:
+    return pwd_ctx.verify_and_update(pw, hashed)
+
+_pool: Executor | None = None
+_pool_lock = threading.Lock()
+_pending = 0   # 已提交未完成的密码数（批量任务按其中的密码个数计）
+
+def _release(weight: int):
+    global _pending
+    with _pool_lock:
+        _pending -= weight
+
+# 实际并行计算的工作者数：进程池大小，或线程池模式下的 CPU 核数
+def _workers() -> int:
+    return config.PASSWORD_HASH_WORKERS if config.PASSWORD_HASH_WORKERS > 0 else os.cpu_count() or 1
+
+def _new_pool() -> Executor:
+    if config.PASSWORD_HASH_WORKERS > 0:
+        return ProcessPoolExecutor(max_workers=_workers())
+    return ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="password-hash")
+
+# 提交到进程池（或线程池），weight 为任务包含的密码数；排队超过上限时返回 None
+def _try_submit(fn, *args, weight: int = 1) -> Future | None:
+    global _pool, _pending
+    with _pool_lock:
+        if _pending + weight > config.PASSWORD_HASH_MAX_PENDING:
+            return None
+        if _pool is None:
+            _pool = _new_pool()
+        _pending += weight
+    try:
+        fut = _pool.submit(fn, *args)
+    except Exception:
+        _release(weight)
+        raise
+    fut.add_done_callback(lambda _fut: _release(weight))
+    return fut
+
+# 单个请求：排队超过上限时立即返回 503（背压）
+def _submit(fn, *args) -> Future:
+    fut = _try_submit(fn, *args)
+    if fut is None:
+        raise HTTPException(status_code=503, detail="系统繁忙，请稍后重试")
+    return fut
+
+# 已提交但未完成的哈希数
+def pending_hashes() -> int:
+    return _pending
+
+def shutdown_hash_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def get_password_hash(pw: str) -> str:
+    return _submit(_hash_in_worker, pw).result()
+
 def verify_password(pw: str, hashed: str) -> bool:
-    return pwd_ctx.verify(pw, hashed)
+    return _submit(_verify_and_update_in_worker, pw, hashed).result()[0]
+
+async def get_password_hash_async(pw: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash_in_worker, pw))
+
+# 批量哈希：按工作者数切块并行计算，结果顺序与输入一致。每块按密码数计入排队上限（块大小不超过上限），
+# 排队已满时等待空位而不是返回 503：导入不因登录高峰失败，同时排队中的哈希总数仍受上限约束
+async def hash_passwords_async(pws: list[str]) -> list[str]:
+    if not pws:
+        return []
+    if config.PASSWORD_HASH_MAX_PENDING <= 0:
+        raise HTTPException(status_code=503, detail="系统繁忙，请稍后重试")
+    size = min(-(-len(pws) // _workers()), config.PASSWORD_HASH_MAX_PENDING)
+    futures = []
+    for i in range(0, len(pws), size):
+        chunk = pws[i:i + size]
+        while (fut := _try_submit(_hash_many_in_worker, chunk, weight=len(chunk))) is None:
+            await asyncio.sleep(0.05)
+        futures.append(asyncio.wrap_future(fut))
+    parts = await asyncio.gather(*futures)
+    return [h for part in parts for h in part]
+
+# 校验密码；返回 (是否正确, 需要更新时的新哈希)
+async def verify_and_update_async(pw: str, hashed: str) -> tuple[bool, str | None]:
+    return await asyncio.wrap_future(_submit(_verify_and_update_in_worker, pw, hashed))
 
 def create_access_token(data: dict, minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     to_encode = data.copy()
     to_encode["exp"] = datetime.utcnow() + timedelta(minutes=minutes)
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2)) -> dict:
+# ========== 令牌校验 ==========
+
+# 已校验令牌的 claims（键为令牌摘要，条目在令牌 exp 时过期）：命中时跳过签名校验与解码。
+# 吊销检查不进缓存，每次请求都做（见 revocation.py）
+_verified = TTLCache("tokens", config.AUTH_TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def _decode(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        if "account_no" not in payload or "role" not in payload:
-            raise HTTPException(status_code=401, detail="无效token")
-        return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="无效token")
+    if "account_no" not in payload or "role" not in payload:
+        raise HTTPException(status_code=401, detail="无效token")
+    return payload
+
+# 认证依赖声明为 async：JWT 校验开销很小，直接在事件循环中执行，避免占用线程池
+async def get_current_user(token: str = Depends(oauth2)) -> dict:
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    claims = _verified.get(key)
+    # 缓存条目按单调时钟过期，命中时仍以 exp（墙上时间）为准
+    if claims is MISS or claims["exp"] <= time.time():
+        claims = _decode(token)
+        if "exp" in claims:
+            _verified.put(key, claims, _verified.token(key), claims["exp"] - time.time())
+    if revocation.is_revoked(claims["account_no"], claims.get("ver", 0)):
+        raise HTTPException(status_code=401, detail="token已失效，请重新登录")
+    return dict(claims)
+
+def token_stats() -> dict:
+    return {**_verified.stats(), "revocation": revocation.stats()}
 
 def require_role(roles: list[str]):
-    def dep(current=Depends(get_current_user)):
+    async def dep(current=Depends(get_current_user)):
         if current.get("role") not in roles:
             raise HTTPException(status_code=403, detail="权限不足")
         return current
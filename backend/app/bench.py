@@ -0,0 +1,784 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import NamedTuple
+from . import config
+from .pagination import MAX_LIMIT
+from .seed import ADMIN, DEPTS, student_no, teacher_no
+
+# 压测：python -m app.bench [--http http://127.0.0.1:8000] [--scenario enroll] [--save NAME] [--compare NAME]
+# 默认在进程内驱动 app.main:app（httpx ASGITransport，含 lifespan），--http 时压测已启动的服务。
+# 数据需先由 python -m app.seed 生成（账号按 seed 的编号规则登录）。选课风暴选课成功后立即退课，
+# 成绩录入会改写成绩，请勿对正式数据运行。
+# 每个场景以 --users 个虚拟用户并发运行 --duration 秒，按 "方法 路由模板" 输出吞吐与 p50/p95/p99。
+# 基线保存在 bench/baselines/NAME.json；--compare 时 p95 上升或吞吐下降超过 --tolerance 记为回退。
+# --suite NAME 运行对比套件（见 SUITES）：同一场景在不同配置下各跑一遍，结果并列输出。
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+BASELINE_DIR = config.ROOT_DIR / "bench" / "baselines"
+QUANTILES = (50, 95, 99)
+
+# 最近秩百分位；values 已升序
+def quantile(values: list[float], q: float) -> float:
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+        self.bytes: Counter = Counter()   # 响应体字节数
+
+    def add(self, label: str, status: int | str, elapsed: float, ok: bool, size: int = 0):
+        self.latencies[label].append(elapsed)
+        self.statuses[label][status] += 1
+        self.bytes[label] += size
+        if not ok:
+            self.errors[label] += 1
+
+    def report(self, seconds: float) -> dict[str, dict]:
+        out = {}
+        for label, values in sorted(self.latencies.items()):
+            values.sort()
+            out[label] = {
+                "count": len(values), "errors": self.errors[label],
+                "status": {str(k): v for k, v in sorted(self.statuses[label].items(), key=str)},
+                "rps": round(len(values) / seconds, 1),
+                **{f"p{q}_ms": round(quantile(values, q) * 1000, 2) for q in QUANTILES},
+                "max_ms": round(values[-1] * 1000, 2),
+                "kib": round(self.bytes[label] / 1024, 1),
+            }
+        return out
+
+class Client:
+    # local：进程内驱动应用（可直接读库、签发令牌）
+    def __init__(self, http, rec: Recorder, local: bool = False):
+        self.http, self.rec, self.local = http, rec, local
+
+    # expect：视为正常的状态码；其余状态码与网络错误计入 errors
+    async def call(self, label: str, method: str, url: str, *, token: str | None = None,
+                   expect=(200,), headers: dict | None = None, **kw):
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        t0 = time.perf_counter()
+        try:
+            r = await self.http.request(method, url, headers=headers, **kw)
+        except httpx.HTTPError as e:
+            self.rec.add(label, type(e).__name__, time.perf_counter() - t0, False)
+            return None
+        self.rec.add(label, r.status_code, time.perf_counter() - t0, r.status_code in expect, len(r.content))
+        return r
+
+    async def login(self, account_no: str, password: str, label: str = "POST /api/auth/login") -> str | None:
+        r = await self.call(label, "POST", "/api/auth/login", data={"username": account_no, "password": password})
+        return r.json()["access_token"] if r is not None and r.status_code == 200 else None
+
+# ========== 数据集 ==========
+
+class Dataset:
+    def __init__(self, students: int, teachers: int, courses: list[dict], admin_token: str, hot: int = 10):
+        self.students, self.teachers, self.courses, self.admin_token = students, teachers, courses, admin_token
+        # 选课风暴集中在少数课程上（优先有容量限制的课程，以覆盖“课程已满”分支）
+        limited = [c for c in courses if c["Ccapacity"] is not None]
+        self.hot = (limited or courses)[:hot]
+
+async def discover(client: Client, admin_password: str, hot: int = 10) -> Dataset:
+    token = await client.login(ADMIN[0], admin_password, label="setup")
+    if token is None:
+        raise SystemExit("管理员登录失败，请先运行 python -m app.seed")
+
+    async def total(path: str) -> int:
+        r = await client.call("setup", "GET", path, token=token, params={"limit": 1, "with_total": True})
+        return r.json()["total"]
+
+    courses, cursor = [], None
+    while True:
+        params = {"limit": 200, **({"cursor": cursor} if cursor else {})}
+        page = (await client.call("setup", "GET", "/api/admin/courses", token=token, params=params)).json()
+        courses += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    ds = Dataset(await total("/api/admin/students"), await total("/api/admin/teachers"), courses, token, hot)
+    if not ds.students or not ds.teachers or not ds.courses:
+        raise SystemExit("数据库中没有学生 / 教师 / 课程，请先运行 python -m app.seed")
+    return ds
+
+# 各虚拟用户登录（不计入场景统计）；进程内运行时按库中的账号直接签发令牌，
+# 上千个账号的准备阶段不必逐个计算密码哈希
+async def login_many(client: Client, accounts: list[str], password: str) -> list[str]:
+    if client.local:
+        return _issue_tokens(accounts)
+    tokens = await asyncio.gather(*[client.login(a, password, label="setup") for a in accounts])
+    return [t for t in tokens if t]
+
+def _issue_tokens(accounts: list[str]) -> list[str]:
+    from . import auth, models
+    from .deps import SessionLocal
+    U, found = models.User, {}
+    with SessionLocal() as db:
+        for i in range(0, len(accounts), 500):
+            for a, role, ver in db.query(U.account_no, U.role, U.token_version).filter(
+                    U.account_no.in_(accounts[i:i + 500])):
+                found[a] = auth.create_access_token({"account_no": a, "role": role, "ver": ver or 0})
+    return [found[a] for a in accounts if a in found]
+
+# ========== 场景 ==========
+# 场景函数：(client, ds, args, rng) -> 虚拟用户协程工厂（参数为截止时间）
+
+async def scenario_login(client, ds, args, rng):
+    async def user(deadline):
+        while time.perf_counter() < deadline:
+            if rng.random() < 0.8:
+                await client.login(student_no(rng.randrange(ds.students)), args.password)
+            else:
+                await client.login(teacher_no(rng.randrange(ds.teachers)), args.password)
+    return user
+
+# 登录洪峰：每个虚拟用户用不同账号同时登录一次，随后轮询一个经线程池的轻量接口（本人档案）
+# 直到全部登录完成，观察密码哈希是否挤占其他请求
+async def scenario_loginburst(client, ds, args, rng):
+    accounts = [student_no(i) for i in range(min(args.users, ds.students))]
+    accounts += [teacher_no(i) for i in range(min(args.users - len(accounts), ds.teachers))]
+    remaining = len(accounts)
+
+    async def user(deadline):
+        nonlocal remaining
+        if not accounts:
+            return
+        account = accounts.pop()
+        token = await client.login(account, args.password)
+        remaining -= 1
+        if token is None:
+            return
+        url = "/api/teacher/profile" if account.startswith("000") else "/api/student/profile"
+        while remaining > 0 and time.perf_counter() < deadline:
+            await client.call(f"GET {url}", "GET", url, token=token)
+    return user
+
+# 条件 GET 轮询：携带上一次的 ETag，数据未变时服务端直接返回 304（etags 为 None 时不带，每次完整响应）
+async def _poll(client, label, url, token, etags):
+    r = await client.call(label, "GET", url, token=token, expect=(200, 304),
+                          headers={"If-None-Match": etags[url]} if etags and url in etags else None)
+    if r is not None and etags is not None and "etag" in r.headers:
+        etags[url] = r.headers["etag"]
+
+async def scenario_polling(client, ds, args, rng):
+    students = await login_many(client, [student_no(rng.randrange(ds.students)) for _ in range(args.users)],
+                                args.password)
+    teachers = await login_many(client, [teacher_no(rng.randrange(ds.teachers)) for _ in range(args.users // 4 + 1)],
+                                args.password)
+
+    async def user(deadline):
+        if rng.random() < 0.8:
+            token, urls = rng.choice(students), ("/api/student/courses", "/api/student/enrollments")
+        else:
+            token, urls = rng.choice(teachers), ("/api/teacher/courses", "/api/teacher/enrollments")
+        etags: dict[str, str] | None = None if args.no_etag else {}
+        while time.perf_counter() < deadline:
+            for url in urls:
+                await _poll(client, f"GET {url}", url, token, etags)
+            await client.call("GET /api/auth/me", "GET", "/api/auth/me", token=token)
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000)
+    return user
+
+# 热点只读接口：不带 If-None-Match，每次都完整查询与序列化（对比同步 / 异步接口的吞吐）
+async def scenario_hotreads(client, ds, args, rng):
+    students = await login_many(client, [student_no(rng.randrange(ds.students)) for _ in range(args.users)],
+                                args.password)
+    teachers = await login_many(client, [teacher_no(rng.randrange(ds.teachers)) for _ in range(args.users // 4 + 1)],
+                                args.password)
+
+    async def user(deadline):
+        if rng.random() < 0.8:
+            token, urls = rng.choice(students), ("/api/student/courses", "/api/student/enrollments", "/api/auth/me")
+        else:
+            token, urls = rng.choice(teachers), ("/api/teacher/enrollments", "/api/auth/me")
+        while time.perf_counter() < deadline:
+            for url in urls:
+                await client.call(f"GET {url}", "GET", url, token=token)
+    return user
+
+# 认证开销：/api/auth/me 只做 token 校验（JWT 解码 + 吊销检查）并原样返回声明；
+# 同时请求不带 token 的 /api/auth/me（直接 401），作为不含认证的框架开销下限，两者之差即每次请求的认证开销
+async def scenario_auth(client, ds, args, rng):
+    tokens = await login_many(client, [student_no(rng.randrange(ds.students)) for _ in range(args.users)],
+                              args.password)
+
+    async def user(deadline):
+        token = rng.choice(tokens)
+        while time.perf_counter() < deadline:
+            await client.call("GET /api/auth/me", "GET", "/api/auth/me", token=token)
+            await client.call("GET /api/auth/me 401", "GET", "/api/auth/me", expect=(401,))
+    return user
+
+# 大列表接口（不带 ETag，每次完整编码）：管理端学生 / 教师 / 选课分页取满一页，学生与教师的选课列表，
+# 用于对比 response_model 校验与快速 JSON 编码（FAST_JSON）的差别
+async def scenario_lists(client, ds, args, rng):
+    students = await login_many(client, [student_no(rng.randrange(ds.students)) for _ in range(args.users)],
+                                args.password)
+    teachers = await login_many(client, [teacher_no(rng.randrange(ds.teachers)) for _ in range(args.users // 4 + 1)],
+                                args.password)
+    admin = [("/api/admin/students", {"limit": MAX_LIMIT}), ("/api/admin/teachers", {"limit": MAX_LIMIT}),
+             ("/api/admin/enrollments", {"limit": MAX_LIMIT})]
+
+    async def user(deadline):
+        while time.perf_counter() < deadline:
+            for url, params in admin:
+                await client.call(f"GET {url}", "GET", url, token=ds.admin_token, params=params)
+            for token, url in ((rng.choice(students), "/api/student/enrollments"),
+                               (rng.choice(teachers), "/api/teacher/enrollments")):
+                await client.call(f"GET {url}", "GET", url, token=token)
+    return user
+
+# 同步版本的热点只读接口（--sync-routes）：与 main 中的异步接口输出一致，改用同步会话与 crud，
+# 经线程池执行；注册在已有路由之前，同一路径优先匹配
+def use_sync_hot_routes(app):
+    from typing import List
+    from fastapi import APIRouter, Depends
+    from . import auth, crud, http_cache, schemas, versions
+    from .auth import require_role
+    from .deps import get_db
+    from .main import _normalize_grade
+    router = APIRouter()
+
+    @router.get("/api/auth/me")
+    def me(current=Depends(auth.get_current_user)):
+        return current
+
+    @router.get("/api/student/courses", response_model=List[schemas.CourseOut])
+    def student_courses(current=Depends(require_role(["student"])),
+                        _etag=Depends(http_cache.conditional(versions.COURSES, versions.ENROLLMENTS,
+                                                             cache_control=http_cache.CATALOG)),
+                        db=Depends(get_db)):
+        selected = {(x.Cno, x.Tno) for x in crud.list_student_selected(db, current["account_no"])}
+        counts = crud.get_enrolled_counts(db)
+        return [{"Cno": c.Cno, "Ctno": c.Ctno, "Cname": c.Cname, "Ccredit": c.Ccredit,
+                 "enrolled": counts.get((c.Cno, c.Ctno), 0), "selected": (c.Cno, c.Ctno) in selected,
+                 "Ccapacity": c.Ccapacity} for c in crud.list_courses(db)]
+
+    @router.get("/api/student/enrollments", response_model=List[schemas.StudentEnrollmentOut])
+    def student_enrollments(current=Depends(require_role(["student"])),
+                            _etag=Depends(http_cache.conditional(versions.ENROLLMENTS, versions.COURSES,
+                                                                 versions.TEACHERS, cache_control=http_cache.PER_USER)),
+                            db=Depends(get_db)):
+        return [_normalize_grade({"Cno": sc.Cno, "Tno": sc.Tno, "Tname": tname, "Cname": cname,
+                                  "Ccredit": ccredit, "grade": sc.grade})
+                for sc, cname, ccredit, tname in crud.list_enrollments_by_student(db, current["account_no"])]
+
+    @router.get("/api/teacher/enrollments", response_model=List[schemas.TeacherEnrollmentOut])
+    def teacher_enrollments(current=Depends(require_role(["teacher"])),
+                            _etag=Depends(http_cache.conditional(versions.ENROLLMENTS, versions.COURSES,
+                                                                 versions.STUDENTS, cache_control=http_cache.PER_USER)),
+                            db=Depends(get_db)):
+        return [_normalize_grade({"Sno": sc.Sno, "Sname": sname, "Cno": sc.Cno, "Cname": cname,
+                                  "grade": sc.grade})
+                for sc, sname, cname in crud.list_enrollments_by_teacher(db, current["account_no"])]
+
+    app.router.routes[:0] = router.routes
+
+# 选课风暴：大量学生同时抢少数热门课程；成功后退课以保持数据不变，409（已选 / 已满）属正常结果
+async def scenario_enroll(client, ds, args, rng):
+    accounts = [student_no(i) for i in rng.sample(range(ds.students), min(args.users, ds.students))]
+    tokens = await login_many(client, accounts, args.password)
+    free = list(tokens)
+
+    # 每个虚拟用户独占一个学生账号（账号不足时才共用）
+    async def user(deadline):
+        token = free.pop() if free else rng.choice(tokens)
+        while time.perf_counter() < deadline:
+            c = rng.choice(ds.hot)
+            r = await client.call("POST /api/student/enroll", "POST", "/api/student/enroll", token=token,
+                                  expect=(200, 409), json={"Cno": c["Cno"], "Tno": c["Ctno"]})
+            if r is not None and r.status_code == 200:
+                await client.call("DELETE /api/student/enroll/{Cno}/{Tno}", "DELETE",
+                                  f"/api/student/enroll/{c['Cno']}/{c['Ctno']}", token=token, expect=(200, 404))
+    return user
+
+# 成绩录入：教师逐条修改成绩，间或整批提交
+async def scenario_grades(client, ds, args, rng):
+    teachers = []
+    accounts = [teacher_no(i) for i in rng.sample(range(ds.teachers), min(args.users, ds.teachers))]
+    for token in await login_many(client, accounts, args.password):
+        r = await client.call("setup", "GET", "/api/teacher/enrollments", token=token)
+        if r is not None and r.status_code == 200 and r.json():
+            teachers.append((token, r.json()))
+    if not teachers:
+        raise SystemExit("没有教师名下有选课记录")
+
+    async def user(deadline):
+        token, rows = rng.choice(teachers)
+        while time.perf_counter() < deadline:
+            if rng.random() < 0.9:
+                row = rng.choice(rows)
+                await client.call("PUT /api/teacher/enrollments/{Sno}/{Cno}/grade", "PUT",
+                                  f"/api/teacher/enrollments/{row['Sno']}/{row['Cno']}/grade", token=token,
+                                  json={"grade": str(rng.randint(40, 100))})
+            else:
+                items = [{"Sno": row["Sno"], "Cno": row["Cno"], "grade": str(rng.randint(40, 100))}
+                         for row in rng.sample(rows, min(50, len(rows)))]
+                await client.call("PUT /api/teacher/grades", "PUT", "/api/teacher/grades", token=token,
+                                  json={"items": items})
+    return user
+
+# 管理端：分页列表、检索与统计
+async def scenario_admin(client, ds, args, rng):
+    token = ds.admin_token
+
+    async def user(deadline):
+        while time.perf_counter() < deadline:
+            pick = rng.random()
+            if pick < 0.3:
+                await client.call("GET /api/admin/students", "GET", "/api/admin/students", token=token,
+                                  params={"limit": 50, **({"Sdept": rng.choice(DEPTS)} if rng.random() < 0.5 else {})})
+            elif pick < 0.5:
+                await client.call("GET /api/admin/enrollments", "GET", "/api/admin/enrollments", token=token,
+                                  params={"limit": 100, "Cno": rng.choice(ds.courses)["Cno"]})
+            elif pick < 0.7:
+                await client.call("GET /api/admin/students/search", "GET", "/api/admin/students/search",
+                                  token=token, params={"q": str(rng.randint(100, 999))})
+            elif pick < 0.85:
+                await client.call("GET /api/admin/analytics/courses", "GET", "/api/admin/analytics/courses",
+                                  token=token, params={"Cno": rng.choice(ds.courses)["Cno"]})
+            else:
+                await client.call("GET /api/admin/analytics/students", "GET", "/api/admin/analytics/students",
+                                  token=token, params={"limit": 50, "sort": "gpa", "order": "desc"})
+    return user
+
+# 混合：按角色比例混合以上场景
+async def scenario_mixed(client, ds, args, rng):
+    parts = [(0.6, await scenario_polling(client, ds, args, rng)),
+             (0.2, await scenario_enroll(client, ds, args, rng)),
+             (0.1, await scenario_grades(client, ds, args, rng)),
+             (0.1, await scenario_admin(client, ds, args, rng))]
+
+    async def user(deadline):
+        x = rng.random()
+        for weight, factory in parts:
+            x -= weight
+            if x <= 0:
+                break
+        await factory(deadline)
+    return user
+
+# 选课人数推送：--connections 个连接订阅 /api/student/courses/stream，同时运行选课风暴，
+# 按事件中的发布时间（服务端时钟，--http 压测其他主机时两端时钟须同步）统计送达延迟。
+# 进程内运行时 ASGITransport 不能流式读取响应，连接直接订阅本进程的 seats.broadcaster。
+SEATS_LABEL = "SSE seats (送达延迟)"
+
+def _seats_events(text: str):
+    for block in text.split("\n\n"):
+        event = data = None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = line[6:]
+        if event in ("seats", "resync"):
+            yield event, json.loads(data)
+
+async def scenario_seats(client, ds, args, rng):
+    storm = await scenario_enroll(client, ds, args, rng)
+    tokens = await login_many(client, [student_no(i) for i in range(min(args.connections, 100, ds.students))],
+                              args.password)
+    decoded: dict[bytes, list] = {}   # 各连接收到的是同一份帧，只解析一次
+
+    def record(event: str, data: dict):
+        if event == "seats":
+            client.rec.add(SEATS_LABEL, "event", max(time.time() - data["ts"], 0), True)
+        else:
+            client.rec.add(SEATS_LABEL, "resync", 0, False)
+
+    async def listen_local(deadline):
+        from . import seats
+        sub = seats.broadcaster.subscribe()
+        try:
+            while (left := deadline - time.perf_counter()) > 0:
+                try:
+                    await asyncio.wait_for(sub.wakeup.wait(), left)
+                except asyncio.TimeoutError:
+                    break
+                sub.wakeup.clear()
+                while sub.frames:
+                    frame = sub.frames.popleft()
+                    if frame not in decoded:
+                        decoded[frame] = list(_seats_events(frame.decode()))
+                    for event, data in decoded[frame]:
+                        record(event, data)
+        finally:
+            seats.broadcaster.unsubscribe(sub)
+
+    async def listen_http(deadline, token):
+        label = "GET /api/student/courses/stream"
+        t0 = time.perf_counter()
+        try:
+            async with client.http.stream("GET", "/api/student/courses/stream",
+                                          headers={"Authorization": f"Bearer {token}"}) as r:
+                client.rec.add(label, r.status_code, time.perf_counter() - t0, r.status_code == 200)
+                if r.status_code != 200:
+                    return
+                buf = ""
+                chunks = r.aiter_text()
+                while (left := deadline - time.perf_counter()) > 0:
+                    try:
+                        buf += await asyncio.wait_for(chunks.__anext__(), left)
+                    except (asyncio.TimeoutError, StopAsyncIteration):
+                        break
+                    head, sep, buf = buf.rpartition("\n\n")
+                    for event, data in _seats_events(head):
+                        record(event, data)
+        except httpx.HTTPError as e:
+            client.rec.add(label, type(e).__name__, time.perf_counter() - t0, False)
+
+    started = False
+
+    # 第一个虚拟用户负责建立全部订阅连接，其余用户只运行选课风暴
+    async def user(deadline):
+        nonlocal started
+        if started:
+            return await storm(deadline)
+        started = True
+        if args.http:
+            listeners = [listen_http(deadline, tokens[i % len(tokens)]) for i in range(args.connections)]
+        else:
+            from . import seats
+            if not seats.running():
+                raise SystemExit("选课人数推送未开启（SEATS_PUSH=0）")
+            listeners = [listen_local(deadline) for _ in range(args.connections)]
+        await asyncio.gather(storm(deadline), *listeners)
+    return user
+
+SCENARIOS = {
+    "login": scenario_login, "loginburst": scenario_loginburst, "polling": scenario_polling,
+    "hotreads": scenario_hotreads, "auth": scenario_auth, "lists": scenario_lists, "enroll": scenario_enroll, "grades": scenario_grades, "admin": scenario_admin, "mixed": scenario_mixed, "seats": scenario_seats,
+}
+
+# 返回 (各接口统计, 资源用量)；进程内运行时 CPU 时间包含服务端与压测客户端
+async def run_scenario(client: Client, ds: Dataset, name: str, args, rng) -> tuple[dict, dict]:
+    factory = await SCENARIOS[name](client, ds, args, rng)
+    client.rec = Recorder()
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    deadline = t0 + args.duration
+    await asyncio.gather(*[factory(deadline) for _ in range(args.users)])
+    wall = time.perf_counter() - t0
+    usage = {"wall_s": round(wall, 2), "cpu_s": round(time.process_time() - cpu0, 2),
+             "kib": round(sum(client.rec.bytes.values()) / 1024, 1)}
+    return client.rec.report(wall), usage
+
+# ========== 基线 ==========
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=config.ROOT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _meta(args, ds: Dataset) -> dict:
+    meta = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"), "git": _git_rev(),
+        "target": args.http or "in-process", "users": args.users, "duration_s": args.duration,
+        "connections": args.connections, "hot": args.hot,
+        "dataset": {"students": ds.students, "teachers": ds.teachers, "courses": len(ds.courses)},
+    }
+    if not args.http:
+        from .deps import engine
+        meta["dialect"] = engine.dialect.name
+        meta["config"] = {k: getattr(config, k) for k in (
+            "SELECTION_MODE", "CACHE_ENABLED", "FAST_JSON", "METRICS_ENABLED", "AUTH_TOKEN_CACHE_SIZE",
+            "PASSWORD_HASH_WORKERS", "SEATS_TICK_MS")}
+        meta["sync_routes"] = args.sync_routes
+    meta["no_etag"] = args.no_etag
+    return meta
+
+# 返回回退项（场景, 接口, 说明）
+def compare(results: dict, baseline: dict, tolerance: float) -> list[tuple[str, str, str]]:
+    regressions = []
+    for scenario, endpoints in results.items():
+        for label, now in endpoints.items():
+            old = baseline.get(scenario, {}).get(label)
+            if not old:
+                continue
+            if old["p95_ms"] > 0 and now["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                regressions.append((scenario, label, f"p95 {old['p95_ms']} -> {now['p95_ms']} ms"))
+            if now["rps"] < old["rps"] * (1 - tolerance):
+                regressions.append((scenario, label, f"rps {old['rps']} -> {now['rps']}"))
+    return regressions
+
+def _usage_line(usage: dict) -> str:
+    return f"墙钟 {usage['wall_s']} s，CPU {usage['cpu_s']} s，响应体 {usage['kib']} KiB"
+
+def print_report(name: str, report: dict, baseline: dict | None = None, usage: dict | None = None):
+    print(f"\n== {name} ==")
+    print(f"{'接口':<52}{'请求':>8}{'错误':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'KiB':>10}")
+    for label, r in report.items():
+        old = (baseline or {}).get(label)
+        delta = f"  (p95 基线 {old['p95_ms']})" if old else ""
+        print(f"{label:<54}{r['count']:>8}{r['errors']:>6}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['max_ms']:>9}{r.get('kib', 0):>10}{delta}")
+    if usage:
+        print(_usage_line(usage))
+
+# ========== 对比套件 ==========
+# 同一场景在不同配置下的对比。配置在导入时读取，每个变体在独立子进程中运行（进程内驱动应用），
+# 变体的环境变量覆盖当前环境；结果按 "套件/变体/场景" 汇总，可与其他结果一样 --save / --compare。
+
+class Variant(NamedTuple):
+    label: str
+    env: dict
+    argv: tuple = ()
+
+class Suite(NamedTuple):
+    about: str
+    argv: tuple          # 场景与默认参数，命令行给出的 --users / --duration 优先
+    variants: tuple
+
+SUITES = {
+    "storm5k": Suite(
+        "选课风暴：5000 名学生同时抢 3 门热门课程，逐条写入 vs 选课队列（SELECTION_MODE，分批组提交）",
+        ("--scenario", "enroll", "--users", "5000", "--hot", "3", "--duration", "20"),
+        (Variant("direct", {"SELECTION_MODE": "0"}), Variant("queue", {"SELECTION_MODE": "1"}))),
+    "wal": Suite(
+        "SQLite 混合读写：默认参数（回滚日志、synchronous=FULL）vs 存储参数（WAL、NORMAL、缓存与 mmap）",
+        ("--scenario", "mixed", "--users", "50", "--duration", "20"),
+        (Variant("rollback", {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+                              "SQLITE_CACHE_SIZE": "-2000", "SQLITE_MMAP_SIZE": "0", "SQLITE_TEMP_STORE": "DEFAULT"}),
+         Variant("wal", {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"}))),
+    "async500": Suite(
+        "热点只读接口 500 个并发客户端：同步接口（线程池 + 同步会话）vs 异步接口（事件循环 + AsyncSession）",
+        ("--scenario", "hotreads", "--users", "500", "--duration", "20"),
+        (Variant("sync", {}, ("--sync-routes",)), Variant("async", {}))),
+    "login1k": Suite(
+        "1000 个账号同时登录（排队上限放宽到 1000，只看延迟）：哈希进程池 vs 线程池（PASSWORD_HASH_WORKERS=0）",
+        ("--scenario", "loginburst", "--users", "1000", "--duration", "120"),
+        (Variant("process-pool", {"PASSWORD_HASH_MAX_PENDING": "1000"}),
+         Variant("thread-pool", {"PASSWORD_HASH_WORKERS": "0", "PASSWORD_HASH_MAX_PENDING": "1000"}))),
+    "etag": Suite(
+        "轮询风暴：不带 If-None-Match（每次完整查询与序列化）vs 条件请求（数据未变时 304），对比响应字节与 CPU",
+        ("--scenario", "polling", "--users", "200", "--duration", "20"),
+        (Variant("no-etag", {}, ("--no-etag",)), Variant("etag", {}))),
+    "json": Suite(
+        "大列表接口（lists，每页 500 条）：response_model 逐行校验 vs 快速 JSON 编码（FAST_JSON=1，需安装 orjson）",
+        ("--scenario", "lists", "--users", "20", "--duration", "20"),
+        (Variant("pydantic", {"FAST_JSON": "0"}), Variant("orjson", {"FAST_JSON": "1"}))),
+    "auth": Suite(
+        "每次请求的认证开销（auth）：每次完整校验 JWT（AUTH_TOKEN_CACHE_SIZE=0）vs 已校验声明缓存（默认）",
+        ("--scenario", "auth", "--users", "50", "--duration", "20"),
+        (Variant("no-cache", {"AUTH_TOKEN_CACHE_SIZE": "0"}), Variant("cached", {}))),
+}
+
+def _suite_summary(name: str, variants: dict[str, dict], usages: dict[str, dict]):
+    labels = sorted({label for res in variants.values() for rep in res.values() for label in rep})
+    print(f"\n== {name}：{SUITES[name].about} ==")
+    print(f"{'接口':<44}" + "".join(f"{v + ' rps/p99':>24}" for v in variants))
+    for label in labels:
+        cells = []
+        for res in variants.values():
+            r = next((rep[label] for rep in res.values() if label in rep), None)
+            cells.append(f"{r['rps']:>12}/{r['p99_ms']:<10}" if r else f"{'-':>23}")
+        print(f"{label:<46}" + " ".join(cells))
+    for label, usage in usages.items():
+        for scenario, u in usage.items():
+            print(f"{label} / {scenario}：{_usage_line(u)}")
+
+def run_suite(args) -> tuple[dict, dict]:
+    suite = SUITES[args.suite]
+    argv = list(suite.argv)
+    for flag, value in (("--users", args.users), ("--duration", args.duration), ("--seed", args.seed),
+                        ("--timeout", args.timeout), ("--password", args.password),
+                        ("--admin-password", args.admin_password)):
+        if value is not None:
+            argv += [flag, str(value)]
+    variants, metas = {}, {}
+    for v in suite.variants:
+        print(f"\n#### {args.suite} / {v.label}：{' '.join(f'{k}={x}' for k, x in v.env.items())}")
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            subprocess.run([sys.executable, "-m", "app.bench", *argv, *v.argv, "--json", path],
+                           env={**os.environ, **v.env}, cwd=config.ROOT_DIR / "backend", check=True)
+            out = json.loads(open(path, encoding="utf-8").read())
+        finally:
+            os.unlink(path)
+        variants[v.label], metas[v.label] = out["results"], out["meta"]
+    _suite_summary(args.suite, variants, {label: m.get("usage", {}) for label, m in metas.items()})
+    results = {f"{args.suite}/{label}/{scenario}": rep
+               for label, res in variants.items() for scenario, rep in res.items()}
+    return results, {"suite": args.suite, "variants": metas}
+
+# ========== 序列化微基准 ==========
+
+# --serialize：各大列表接口按接口的查询各取一次数据（列元组），重复编码计时，不含查询与 HTTP：
+# response_model 路径（按 schema 逐行校验后转为 JSON 值，标准库编码，与 FastAPI + JSONResponse 一致）
+# vs 快速路径（fastjson.Encoder + orjson）。两条路径都从同一组列元组开始，并校验输出一致。
+def _time_per_call(fn, budget: float) -> float:
+    n, t0 = 0, time.perf_counter()
+    while n < 3 or time.perf_counter() - t0 < budget:
+        fn()
+        n += 1
+    return (time.perf_counter() - t0) / n
+
+async def run_serialize(args) -> int:
+    from pydantic import TypeAdapter
+    from . import crud, crud_async, deps, fastjson, schemas
+    from .main import (ADMIN_ENROLLMENT_JSON, STUDENT_ENROLLMENT_JSON, STUDENT_JSON, TEACHER_ENROLLMENT_JSON,
+                       TEACHER_JSON)
+    if fastjson.orjson is None:
+        print("序列化微基准需要 orjson：pip install orjson")
+        return 2
+    with deps.SessionLocal() as db:
+        pages = [("GET /api/admin/students", schemas.StudentOut, STUDENT_JSON, crud.page_students),
+                 ("GET /api/admin/teachers", schemas.TeacherOut, TEACHER_JSON, crud.page_teachers),
+                 ("GET /api/admin/enrollments", schemas.AdminEnrollmentOut, ADMIN_ENROLLMENT_JSON,
+                  crud.page_enrollments)]
+        cases = [(label, schemas.Page[schema], enc, fn(db, limit=MAX_LIMIT, as_rows=True)[0], True)
+                 for label, schema, enc, fn in pages]
+    try:
+        async with deps.get_async_sessionmaker()() as db:
+            cases += [
+                ("GET /api/student/enrollments", list[schemas.StudentEnrollmentOut], STUDENT_ENROLLMENT_JSON,
+                 await crud_async.list_enrollments_by_student(db, student_no(0), as_rows=True), False),
+                ("GET /api/teacher/enrollments", list[schemas.TeacherEnrollmentOut], TEACHER_ENROLLMENT_JSON,
+                 await crud_async.list_enrollments_by_teacher(db, teacher_no(0), as_rows=True), False)]
+    finally:
+        await deps.dispose_async_engine()
+
+    budget = 1.0 if args.duration is None else args.duration
+    print(f"{'接口':<44}{'行数':>6}{'response_model ms':>20}{'orjson ms':>12}{'倍数':>8}")
+    for label, model, enc, rows, paged in cases:
+        adapter = TypeAdapter(model)
+
+        def content():
+            items = enc.items(rows)
+            return {"items": items, "next_cursor": None, "total": None} if paged else items
+
+        def via_model():
+            value = adapter.dump_python(adapter.validate_python(content()), mode="json")
+            return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+        def via_orjson():
+            return fastjson.orjson.dumps(content())
+
+        if json.loads(via_model()) != json.loads(via_orjson()):
+            print(f"  输出不一致：{label}")
+        slow, fast = _time_per_call(via_model, budget), _time_per_call(via_orjson, budget)
+        print(f"{label:<46}{len(rows):>6}{slow * 1000:>20.3f}{fast * 1000:>12.3f}{slow / fast:>8.1f}")
+    return 0
+
+# ========== 入口 ==========
+
+async def _run(args) -> int:
+    rng = random.Random(args.seed)
+    if args.http:
+        http = httpx.AsyncClient(base_url=args.http, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.users * 2 + args.connections))
+        lifespan = None
+    else:
+        from .main import app
+        if args.sync_routes:
+            use_sync_hot_routes(app)
+        # 接口异常按 500 计入错误（与 --http 时一致），不中断压测
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                                 base_url="http://bench", timeout=args.timeout)
+        lifespan = app.router.lifespan_context(app)
+    baseline = _baseline(args)
+    results = {}
+    try:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        client = Client(http, Recorder(), local=not args.http)
+        ds = await discover(client, args.admin_password, args.hot)
+        names = list(SCENARIOS) if args.scenario == ["all"] else args.scenario
+        usage = {}
+        for name in names:
+            results[name], usage[name] = await run_scenario(client, ds, name, args, rng)
+            print_report(name, results[name], (baseline or {}).get("results", {}).get(name), usage[name])
+        meta = {**_meta(args, ds), "usage": usage}
+    finally:
+        await http.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return _finish(args, results, meta)
+
+def _baseline(args) -> dict | None:
+    return json.loads((BASELINE_DIR / f"{args.compare}.json").read_text("utf-8")) if args.compare else None
+
+def _finish(args, results: dict, meta: dict) -> int:
+    baseline = _baseline(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, ensure_ascii=False)
+    if args.save:
+        BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps({"meta": meta, "results": results}, ensure_ascii=False, indent=2), "utf-8")
+        print(f"\n基线已保存：{path}")
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.tolerance)
+        print(f"\n与基线 {args.compare}（{baseline['meta'].get('git')}，{baseline['meta'].get('time')}）对比：")
+        for scenario, label, what in regressions:
+            print(f"  回退  {scenario:<8} {label:<52} {what}")
+        if not regressions:
+            print("  无回退")
+        return 1 if regressions else 0
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="接口压测（进程内或 HTTP）")
+    parser.add_argument("--http", metavar="URL", help="压测已启动的服务，如 http://127.0.0.1:8000；默认进程内运行")
+    parser.add_argument("--scenario", nargs="+", choices=["all", *SCENARIOS], default=["all"])
+    parser.add_argument("--suite", choices=sorted(SUITES), help="运行对比套件（忽略 --scenario，仅进程内）")
+    parser.add_argument("--users", type=int, help="每个场景的并发虚拟用户数（默认 20）")
+    parser.add_argument("--duration", type=float, help="每个场景的运行秒数（默认 10）")
+    parser.add_argument("--serialize", action="store_true",
+                        help="大列表接口的序列化微基准（--duration 为每项计时秒数，默认 1）")
+    parser.add_argument("--hot", type=int, default=10, help="选课风暴集中的热门课程数")
+    parser.add_argument("--sync-routes", action="store_true",
+                        help="进程内运行时热点只读接口改用同步实现（与异步接口对比）")
+    parser.add_argument("--think-ms", type=float, default=0, help="轮询场景每轮之间的等待（毫秒）")
+    parser.add_argument("--no-etag", action="store_true", help="轮询场景不带 If-None-Match（每次完整响应）")
+    parser.add_argument("--connections", type=int, default=1000, help="seats 场景的推送订阅连接数")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default=config.DEFAULT_PASSWORD, help="学生 / 教师账号密码（与 seed 一致）")
+    parser.add_argument("--admin-password", default=ADMIN[1])
+    parser.add_argument("--save", metavar="NAME", help="保存结果为基线 bench/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="与基线对比，有回退时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回退判定阈值（比例，默认 0.2）")
+    parser.add_argument("--json", metavar="PATH", help=argparse.SUPPRESS)   # 对比套件的子进程输出结果
+    args = parser.parse_args(argv)
+    if httpx is None:
+        print("压测需要 httpx：pip install httpx")
+        return 2
+    if args.compare and not (BASELINE_DIR / f"{args.compare}.json").exists():
+        print(f"基线不存在：{BASELINE_DIR / args.compare}.json")
+        return 2
+    if args.serialize:
+        return asyncio.run(run_serialize(args))
+    if args.suite:
+        if args.http:
+            print("对比套件需在进程内运行（各变体使用不同的服务端配置），不支持 --http")
+            return 2
+        results, meta = run_suite(args)
+        return _finish(args, results, {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "git": _git_rev(), **meta})
+    args.users = 20 if args.users is None else args.users
+    args.duration = 10 if args.duration is None else args.duration
+    return asyncio.run(_run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
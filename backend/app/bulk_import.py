@@ -0,0 +1,153 @@
+from __future__ import annotations
+import codecs
+import csv
+import json
+from typing import AsyncIterator
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, auth, config, crud_async
+
+# 批量导入用户及档案：逐行流式解析请求体（CSV 或 NDJSON），按批校验、并行哈希并批量插入
+
+ROLES = ("admin", "teacher", "student")
+CSV_FIELDS = ["account_no", "password", "role", "Sname", "Ssex", "Sdept", "Sage", "Tname", "Tdept", "Tsex"]
+
+# 账号数据校验，返回错误信息（与单个创建接口一致）
+def account_error(body: schemas.AdminCreateUser) -> str | None:
+    if body.role not in ROLES:
+        return "角色无效"
+    if body.role == "student" and not (body.Sname and body.Ssex and body.Sdept):
+        return "学生需提供 Sname/Ssex/Sdept"
+    if body.role == "teacher" and not body.Tname:
+        return "教师需提供 Tname"
+    return None
+
+# 按行切分字节流（增量解码，不缓存整个请求体）
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    async for chunk in stream:
+        buf += decoder.decode(chunk)
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buf += decoder.decode(b"", final=True)
+    if buf:
+        yield buf.rstrip("\r")
+
+# 解析为 (行号, 记录, 错误)；CSV 首行为表头，字段不支持跨行
+async def iter_records(stream: AsyncIterator[bytes], fmt: str):
+    header = None
+    lineno = 0
+    async for line in iter_lines(stream):
+        lineno += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [h.strip() for h in values]
+                unknown = set(header) - set(CSV_FIELDS)
+                if unknown or "account_no" not in header:
+                    raise ValueError(f"无效表头：{','.join(header)}")
+                continue
+            if len(values) != len(header):
+                yield lineno, None, "列数与表头不一致"
+                continue
+            yield lineno, {k: (v.strip() or None) for k, v in zip(header, values)}, None
+        else:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                yield lineno, None, "JSON 格式错误"
+                continue
+            if not isinstance(rec, dict):
+                yield lineno, None, "每行需为 JSON 对象"
+                continue
+            yield lineno, rec, None
+
+class _Importer:
+    def __init__(self, db: AsyncSession, default_role: str | None):
+        self.db = db
+        self.default_role = default_role
+        self.created = 0
+        self.errors: list[dict] = []
+        self.batch: list[tuple[int, schemas.AdminCreateUser]] = []
+
+    def error(self, lineno: int, account_no, msg: str):
+        self.errors.append({"line": lineno, "account_no": account_no, "error": msg})
+
+    async def add(self, lineno: int, rec: dict):
+        if self.default_role and not rec.get("role"):
+            rec = {**rec, "role": self.default_role}
+        try:
+            body = schemas.AdminCreateUser(**rec)
+        except ValidationError as e:
+            self.error(lineno, rec.get("account_no"), "; ".join(
+                f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in e.errors()))
+            return
+        msg = account_error(body)
+        if msg:
+            self.error(lineno, body.account_no, msg)
+            return
+        self.batch.append((lineno, body))
+        if len(self.batch) >= config.IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        # 批内去重 + 与库中已有账号比对
+        res = await self.db.execute(select(models.User.account_no).where(
+            models.User.account_no.in_([b.account_no for _, b in batch])))
+        taken = set(res.scalars().all())
+        rows = []
+        for lineno, body in batch:
+            if body.account_no in taken:
+                self.error(lineno, body.account_no, "账号已存在")
+                continue
+            taken.add(body.account_no)
+            rows.append((lineno, body))
+        if not rows:
+            return
+        hashes = await auth.hash_passwords_async([b.password or config.DEFAULT_PASSWORD for _, b in rows])
+        accounts = [_account_rows(b, h) for (_, b), h in zip(rows, hashes)]
+        try:
+            await crud_async.bulk_create_accounts(self.db, accounts)
+            self.created += len(accounts)
+        except IntegrityError:
+            # 与并发写入冲突时退回逐条插入，定位失败行
+            await self.db.rollback()
+            for (lineno, body), acc in zip(rows, accounts):
+                try:
+                    await crud_async.bulk_create_accounts(self.db, [acc])
+                    self.created += 1
+                except IntegrityError:
+                    await self.db.rollback()
+                    self.error(lineno, body.account_no, "账号已存在")
+
+# 一个账号对应的 (users 行, students 行或 None, teachers 行或 None)
+def _account_rows(body: schemas.AdminCreateUser, password_hash: str):
+    user = {"account_no": body.account_no, "password_hash": password_hash, "role": body.role}
+    student = teacher = None
+    if body.role == "student":
+        student = {"Sno": body.account_no, "Sname": body.Sname, "Ssex": body.Ssex,
+                   "Sdept": body.Sdept, "Sage": body.Sage}
+    elif body.role == "teacher":
+        teacher = {"Tno": body.account_no, "Tname": body.Tname, "Tdept": body.Tdept, "Tsex": body.Tsex}
+    return user, student, teacher
+
+# 执行导入；单行错误只记录不中断，返回统计与逐行错误
+async def import_users(db: AsyncSession, stream: AsyncIterator[bytes], fmt: str,
+                       default_role: str | None = None) -> dict:
+    imp = _Importer(db, default_role)
+    async for lineno, rec, err in iter_records(stream, fmt):
+        if err:
+            imp.error(lineno, None, err)
+            continue
+        await imp.add(lineno, rec)
+    await imp.flush()
+    return {"created": imp.created, "failed": len(imp.errors), "errors": imp.errors}
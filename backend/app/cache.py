@@ -0,0 +1,161 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import inspect
+from . import config
+
+# 进程内读穿透缓存：档案、课程目录与学生已选记录读多写少，命中时不访问数据库。
+# 每类数据一个 TTLCache（TTL 过期 + LRU 淘汰，条目数有上限），由 crud 写函数在提交后精确失效。
+# 缓存的是与会话无关的对象副本，调用方只读，不得修改或 add 到会话。
+
+MISS = object()
+
+# 失效代数分片数：读者在查询前记下所在分片的代数，写入缓存时若已变化则放弃，
+# 避免"读到旧值 → 写者提交并失效 → 读者回填旧值"
+_STRIPES = 64
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()   # key -> (过期时刻, 值)
+        self._gens = [0] * _STRIPES
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return MISS
+
+    def token(self, key) -> int:
+        return self._gens[hash(key) % _STRIPES]
+
+    # ttl 给定时覆盖该条目的默认过期时间
+    def put(self, key, value, token: int, ttl: float | None = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if self._gens[hash(key) % _STRIPES] != token:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._gens[hash(key) % _STRIPES] += 1
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._gens = [g + 1 for g in self._gens]
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations, "invalidations": self.invalidations}
+
+_size = config.CACHE_MAX_ENTRIES if config.CACHE_ENABLED else 0
+students = TTLCache("students", _size, config.CACHE_TTL_S)    # Sno -> Student
+teachers = TTLCache("teachers", _size, config.CACHE_TTL_S)    # Tno -> Teacher
+courses = TTLCache("courses", _size, config.CACHE_TTL_S)      # Ctno 或 None（全部）-> (Course, ...)
+selected = TTLCache("selected", _size, config.CACHE_TTL_S)    # Sno -> (SC, ...)
+CACHES = (students, teachers, courses, selected)
+
+# ORM 对象的脱离会话副本（仅列属性）
+def snapshot(obj):
+    if obj is None:
+        return None
+    return type(obj)(**{a.key: getattr(obj, a.key) for a in inspect(obj).mapper.column_attrs})
+
+# 读穿透：命中直接返回，否则调用 load() 并回填（None 不缓存）
+def read_through(cache: TTLCache, key, load):
+    value = cache.get(key)
+    if value is not MISS:
+        return value
+    token = cache.token(key)
+    value = load()
+    if value is not None:
+        cache.put(key, value, token)
+    return value
+
+async def read_through_async(cache: TTLCache, key, load):
+    value = cache.get(key)
+    if value is not MISS:
+        return value
+    token = cache.token(key)
+    value = await load()
+    if value is not None:
+        cache.put(key, value, token)
+    return value
+
+# ---------- 写路径失效（在事务提交之后调用）----------
+# 变更以 (实体, 键列表) 描述：student / teacher / selected 的键为学号或工号，
+# course 的键为任课教师号，None 表示全部课程。本进程立即失效，再通知 listeners（跨进程总线）。
+
+listeners: list = []
+# 按实体订阅变更的其他模块（本进程提交与远端事件都会通知，可能在总线线程中调用）
+subscribers: dict[str, list] = {}
+
+def apply(entity: str, keys) -> None:
+    if entity == "course":
+        if None in keys:
+            courses.clear()
+        else:
+            courses.invalidate(None, *keys)
+    elif entity == "student":
+        students.invalidate(*keys)
+    elif entity == "teacher":
+        teachers.invalidate(*keys)
+    elif entity == "selected":
+        selected.invalidate(*keys)
+    for fn in subscribers.get(entity, ()):
+        fn(keys)
+
+def _changed(entity: str, keys: tuple):
+    if not keys:
+        return
+    apply(entity, keys)
+    for fn in listeners:
+        fn(entity, keys)
+
+def student_changed(Sno: str):
+    _changed("student", (Sno,))
+
+def teacher_changed(Tno: str):
+    _changed("teacher", (Tno,))
+
+def courses_changed(Ctno: str | None = None):
+    _changed("course", (Ctno,))
+
+def enrollments_changed(*Snos: str):
+    _changed("selected", Snos)
+
+# 课程人数变化（键为 (Cno, Ctno)），不对应缓存，只通知订阅者（seats）
+def seats_changed(*pairs: tuple[str, str]):
+    _changed("seats", pairs)
+
+def clear():
+    for c in CACHES:
+        c.clear()
+
+def stats() -> dict:
+    return {c.name: c.stats() for c in CACHES}
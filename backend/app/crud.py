@@ -1,9 +1,16 @@
 from __future__ import annotations
+from collections import Counter
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, or_, tuple_, select, update, insert, delete, case, bindparam
 from sqlalchemy.exc import IntegrityError
-from . import models
+from . import models, cache, versions, analytics, revocation, seats
+from . import search as search_mod
 from .auth import get_password_hash
+from .pagination import order_columns, keyset_page
+
+# 选课时课程已满
+class CourseFullError(Exception):
+    pass
 
 # ========== 用户相关 ==========
 
@@ -17,13 +24,37 @@ def create_user(db: Session, account_no: str, password: str, role: str):
     db.add(u); db.commit(); db.refresh(u)
     return u
 
-# 设置用户新密码
+# 创建账号及对应档案（同一事务提交）；student / teacher 为档案字段
+def create_account(db: Session, account_no: str, password: str, role: str, *,
+                   student: dict | None = None, teacher: dict | None = None):
+    u = models.User(account_no=account_no, password_hash=get_password_hash(password), role=role)
+    db.add(u)
+    try:
+        db.flush()
+        if student is not None:
+            db.add(models.Student(Sno=account_no, **student))
+            db.add(models.StudentSummary(**_summary_row(account_no, _ZERO)))
+            versions.touch(db, versions.STUDENTS)
+        if teacher is not None:
+            db.add(models.Teacher(Tno=account_no, **teacher))
+            versions.touch(db, versions.TEACHERS)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
+    return u
+
+# 设置用户新密码（修改 / 重置密码）
 def set_user_password(db: Session, account_no: str, new_password: str):
     u = get_user_by_account(db, account_no)
     if not u:
         return None
     u.password_hash = get_password_hash(new_password)
+    # 吊销该账号此前签发的全部令牌
+    u.token_version = (u.token_version or 0) + 1
+    versions.touch(db, versions.TOKENS)
     db.add(u); db.commit(); db.refresh(u)
+    revocation.note(account_no, u.token_version)
     return u
 
 # 删除用户（级联删除其档案与相关记录）
@@ -31,7 +62,35 @@ def delete_user(db: Session, account_no: str) -> bool:
     u = get_user_by_account(db, account_no)
     if not u:
         return False
-    db.delete(u); db.commit()
+    role = u.role
+    if role == "student":
+        # 先锁定学生行：并发选课的外键检查须等待本事务结束（随后因学生已删除而失败），
+        # 不会在删除选课记录之后、级联删除之前插入新记录（PostgreSQL；SQLite 的写事务本身互斥）
+        db.query(models.Student.Sno).filter(models.Student.Sno == account_no).with_for_update().first()
+        # 删除其选课记录并按实际删除的记录扣减课程计数（汇总行随学生级联删除）
+        _, removed = _delete_enrollments(db, models.SC.Sno == account_no)
+        for (Cno, Tno), n in removed.items():
+            _bump_enrolled(db, Cno, Tno, -n)
+        versions.touch(db, versions.STUDENTS, versions.ENROLLMENTS)
+        seats.touch(db, *removed)
+    elif role == "teacher":
+        # 所授课程及其选课记录随教师级联删除
+        deltas, _ = _delete_enrollments(db, models.SC.Tno == account_no)
+        affected = list(deltas)
+        versions.touch(db, versions.TEACHERS, versions.COURSES, versions.ENROLLMENTS)
+        seats.touch(db, *(tuple(r) for r in db.query(models.Course.Cno, models.Course.Ctno)
+                                               .filter(models.Course.Ctno == account_no).all()))
+    db.delete(u)
+    if role == "teacher":
+        _apply_summary_deltas(db, deltas)
+    db.commit()
+    if role == "student":
+        cache.student_changed(account_no)
+        cache.enrollments_changed(account_no)
+    elif role == "teacher":
+        cache.teacher_changed(account_no)
+        cache.courses_changed(account_no)
+        cache.enrollments_changed(*affected)
     return True
 
 # ========== 学生 / 教师档案 ==========
@@ -39,22 +98,29 @@ def delete_user(db: Session, account_no: str) -> bool:
 # 创建学生档案
 def create_student(db: Session, Sno: str, Sname: str, Ssex: str, Sdept: str, Sage: int | None):
     s = models.Student(Sno=Sno, Sname=Sname, Ssex=Ssex, Sdept=Sdept, Sage=Sage)
-    db.add(s); db.commit()
+    db.add(s)
+    db.add(models.StudentSummary(**_summary_row(Sno, _ZERO)))
+    versions.touch(db, versions.STUDENTS)
+    db.commit()
     return s
 
 # 创建教师档案
 def create_teacher(db: Session, Tno: str, Tname: str, Tdept: str | None, Tsex: str | None):
     t = models.Teacher(Tno=Tno, Tname=Tname, Tdept=Tdept, Tsex=Tsex)
-    db.add(t); db.commit()
+    db.add(t)
+    versions.touch(db, versions.TEACHERS)
+    db.commit()
     return t
 
-# 获取学生档案
+# 获取学生档案（经缓存，返回只读副本）
 def get_student(db: Session, Sno: str):
-    return db.query(models.Student).filter(models.Student.Sno == Sno).first()
+    return cache.read_through(cache.students, Sno, lambda: cache.snapshot(
+        db.query(models.Student).filter(models.Student.Sno == Sno).first()))
 
-# 获取教师档案
+# 获取教师档案（经缓存，返回只读副本）
 def get_teacher(db: Session, Tno: str):
-    return db.query(models.Teacher).filter(models.Teacher.Tno == Tno).first()
+    return cache.read_through(cache.teachers, Tno, lambda: cache.snapshot(
+        db.query(models.Teacher).filter(models.Teacher.Tno == Tno).first()))
 
 # 列出所有学生
 def list_students(db: Session):
@@ -64,40 +130,107 @@ def list_students(db: Session):
 def list_teachers(db: Session):
     return db.query(models.Teacher).all()
 
+# 列元组查询（as_rows=True，供快速 JSON 输出）：列顺序与 schemas 中对应输出模型的字段顺序一致
+STUDENT_ROW = (models.Student.Sno, models.Student.Sname, models.Student.Ssex,
+               models.Student.Sdept, models.Student.Sage)                           # StudentOut
+TEACHER_ROW = (models.Teacher.Tno, models.Teacher.Tname, models.Teacher.Tdept, models.Teacher.Tsex)  # TeacherOut
+ENROLLMENT_ROW = (models.SC.Sno, models.Student.Sname, models.SC.Cno,
+                  models.Course.Cname, models.SC.Tno, models.SC.grade)              # AdminEnrollmentOut
+
+# 学生分页列表（键集分页，可按专业过滤、按姓名前缀搜索）
+STUDENT_SORTS = {"Sno": models.Student.Sno, "Sname": models.Student.Sname, "Sdept": models.Student.Sdept}
+
+def page_students(db: Session, *, limit: int, cursor: str | None = None, sort: str | None = None,
+                  desc: bool = False, with_total: bool = False,
+                  Sdept: str | None = None, Sname: str | None = None, as_rows: bool = False):
+    q = db.query(*STUDENT_ROW) if as_rows else db.query(models.Student)
+    if Sdept:
+        q = q.filter(models.Student.Sdept == Sdept)
+    if Sname:
+        q = q.filter(*search_mod.prefix_range(models.Student.Sname, Sname))
+    cols = order_columns(STUDENT_SORTS, [models.Student.Sno], sort)
+    return keyset_page(q, cols, lambda s, c: getattr(s, c.key), limit=limit,
+                       cursor=cursor, desc=desc, with_total=with_total)
+
+# 教师分页列表（键集分页，可按院系过滤、按姓名前缀搜索）
+TEACHER_SORTS = {"Tno": models.Teacher.Tno, "Tname": models.Teacher.Tname}
+
+def page_teachers(db: Session, *, limit: int, cursor: str | None = None, sort: str | None = None,
+                  desc: bool = False, with_total: bool = False,
+                  Tdept: str | None = None, Tname: str | None = None, as_rows: bool = False):
+    q = db.query(*TEACHER_ROW) if as_rows else db.query(models.Teacher)
+    if Tdept:
+        q = q.filter(models.Teacher.Tdept == Tdept)
+    if Tname:
+        q = q.filter(*search_mod.prefix_range(models.Teacher.Tname, Tname))
+    cols = order_columns(TEACHER_SORTS, [models.Teacher.Tno], sort)
+    return keyset_page(q, cols, lambda t, c: getattr(t, c.key), limit=limit,
+                       cursor=cursor, desc=desc, with_total=with_total)
+
 # 更新学生档案（部分字段）
 def update_student(db: Session, Sno: str, *, Sname=None, Ssex=None, Sdept=None, Sage=None):
-    s = get_student(db, Sno)
+    s = db.get(models.Student, Sno)
     if not s:
         return None
     if Sname is not None: s.Sname = Sname
     if Ssex is not None: s.Ssex = Ssex
     if Sdept is not None: s.Sdept = Sdept
     if Sage is not None: s.Sage = Sage
+    versions.touch(db, versions.STUDENTS)
     db.add(s); db.commit(); db.refresh(s)
+    cache.student_changed(Sno)
     return s
 
 # 更新教师档案（部分字段）
 def update_teacher(db: Session, Tno: str, *, Tname=None, Tdept=None, Tsex=None):
-    t = get_teacher(db, Tno)
+    t = db.get(models.Teacher, Tno)
     if not t:
         return None
     if Tname is not None: t.Tname = Tname
     if Tdept is not None: t.Tdept = Tdept
     if Tsex is not None: t.Tsex = Tsex
+    versions.touch(db, versions.TEACHERS)
     db.add(t); db.commit(); db.refresh(t)
+    cache.teacher_changed(Tno)
     return t
 
 # ========== 课程相关 ==========
 
 # 创建课程
-def create_course(db: Session, Cno: str, Ctno: str, Cname: str, Ccredit: float):
-    c = models.Course(Cno=Cno, Ctno=Ctno, Cname=Cname, Ccredit=Ccredit)
-    db.add(c); db.commit()
+def create_course(db: Session, Cno: str, Ctno: str, Cname: str, Ccredit: float, Ccapacity: int | None = None):
+    c = models.Course(Cno=Cno, Ctno=Ctno, Cname=Cname, Ccredit=Ccredit, Ccapacity=Ccapacity)
+    db.add(c)
+    db.add(models.CourseStat(Cno=Cno, Ctno=Ctno, enrolled=0))
+    versions.touch(db, versions.COURSES)
+    seats.touch(db, (Cno, Ctno))
+    db.commit()
+    cache.courses_changed(Ctno)
     return c
 
-# 列出全部课程
-def list_courses(db: Session):
-    return db.query(models.Course).all()
+# 列出课程（Ctno 给定时只列该教师开设的课程；经缓存，返回只读副本）
+def list_courses(db: Session, Ctno: str | None = None):
+    def load():
+        q = db.query(models.Course)
+        if Ctno:
+            q = q.filter(models.Course.Ctno == Ctno)
+        return tuple(cache.snapshot(c) for c in q.order_by(models.Course.Cno, models.Course.Ctno).all())
+    return list(cache.read_through(cache.courses, Ctno or None, load))
+
+# 课程分页列表（键集分页，主键为 (Cno, Ctno)，可按课程号/任课教师过滤）
+COURSE_SORTS = {"Cno": models.Course.Cno, "Ctno": models.Course.Ctno,
+                "Cname": models.Course.Cname, "Ccredit": models.Course.Ccredit}
+
+def page_courses(db: Session, *, limit: int, cursor: str | None = None, sort: str | None = None,
+                 desc: bool = False, with_total: bool = False,
+                 Cno: str | None = None, Ctno: str | None = None):
+    q = db.query(models.Course)
+    if Cno:
+        q = q.filter(models.Course.Cno == Cno)
+    if Ctno:
+        q = q.filter(models.Course.Ctno == Ctno)
+    cols = order_columns(COURSE_SORTS, [models.Course.Cno, models.Course.Ctno], sort)
+    return keyset_page(q, cols, lambda c, col: getattr(c, col.key), limit=limit,
+                       cursor=cursor, desc=desc, with_total=with_total)
 
 # 判断课程是否存在
 def course_exists(db: Session, Cno: str, Ctno: str) -> bool:
@@ -105,72 +238,390 @@ def course_exists(db: Session, Cno: str, Ctno: str) -> bool:
         models.Course.Cno == Cno, models.Course.Ctno == Ctno
     ).first() is not None
 
+# 设置课程容量（None 表示不限；不会踢出已选学生）
+def set_course_capacity(db: Session, Cno: str, Ctno: str, Ccapacity: int | None):
+    c = db.query(models.Course).filter(models.Course.Cno == Cno, models.Course.Ctno == Ctno).first()
+    if not c:
+        return None
+    c.Ccapacity = Ccapacity
+    versions.touch(db, versions.COURSES)
+    seats.touch(db, (Cno, Ctno))
+    db.add(c); db.commit(); db.refresh(c)
+    cache.courses_changed(Ctno)
+    return c
+
 # 删除课程（级联删除选课记录）
 def delete_course(db: Session, Cno: str, Ctno: str) -> bool:
     c = db.query(models.Course).filter(models.Course.Cno == Cno, models.Course.Ctno == Ctno).first()
     if not c:
         return False
-    db.delete(c); db.commit()
+    deltas, _ = _delete_enrollments(db, models.SC.Cno == Cno, models.SC.Tno == Ctno)
+    affected = list(deltas)
+    versions.touch(db, versions.COURSES, versions.ENROLLMENTS)
+    seats.touch(db, (Cno, Ctno))
+    db.delete(c)
+    _apply_summary_deltas(db, deltas)
+    db.commit()
+    cache.courses_changed(Ctno)
+    cache.enrollments_changed(*affected)
+    return True
+
+# 获取课程的已选人数（读取计数器表；pairs 给定时只取这些 (Cno, Tno)）
+def get_enrolled_counts(db: Session, pairs: list[tuple[str, str]] | None = None) -> dict[tuple[str, str], int]:
+    q = db.query(models.CourseStat.Cno, models.CourseStat.Ctno, models.CourseStat.enrolled)
+    if pairs is not None:
+        if not pairs:
+            return {}
+        q = q.filter(tuple_(models.CourseStat.Cno, models.CourseStat.Ctno).in_(pairs))
+    return {(r[0], r[1]): r[2] for r in q.all()}
+
+# 计数行缺失时按 sc 现状补建，返回是否新建
+def _ensure_course_stat(db: Session, Cno: str, Tno: str) -> bool:
+    if db.query(models.CourseStat.Cno).filter(
+        models.CourseStat.Cno == Cno, models.CourseStat.Ctno == Tno
+    ).first() is not None:
+        return False
+    db.flush()
+    actual = db.query(func.count('*')).filter(models.SC.Cno == Cno, models.SC.Tno == Tno).scalar()
+    db.add(models.CourseStat(Cno=Cno, Ctno=Tno, enrolled=actual))
+    db.flush()
     return True
 
-# 获取所有课程的已选人数（批量聚合）
-def get_enrolled_counts(db: Session) -> dict[tuple[str, str], int]:
+# 调整课程计数（在调用方事务内执行，不提交）；cond 为附加的 UPDATE 条件，返回是否更新成功
+def _bump_enrolled(db: Session, Cno: str, Tno: str, delta: int, cond=None) -> bool:
+    q = db.query(models.CourseStat).filter(
+        models.CourseStat.Cno == Cno, models.CourseStat.Ctno == Tno
+    )
+    if cond is not None:
+        q = q.filter(cond)
+    values = {models.CourseStat.enrolled: models.CourseStat.enrolled + delta}
+    n = q.update(values, synchronize_session=False)
+    if not n and _ensure_course_stat(db, Cno, Tno):
+        n = q.update(values, synchronize_session=False)
+    if n:
+        seats.touch(db, (Cno, Tno))
+    return n > 0
+
+# 占用一个名额：单条条件 UPDATE 保证容量检查与计数递增原子完成
+def _reserve_seat(db: Session, Cno: str, Tno: str) -> bool:
+    cap = select(models.Course.Ccapacity).where(
+        models.Course.Cno == Cno, models.Course.Ctno == Tno
+    ).scalar_subquery()
+    return _bump_enrolled(db, Cno, Tno, 1, or_(cap.is_(None), models.CourseStat.enrolled < cap))
+
+# 按 sc 表实际选课人数统计（全表 GROUP BY，仅供校验/修复使用）
+def _count_enrolled_from_sc(db: Session) -> dict[tuple[str, str], int]:
     rows = db.query(models.SC.Cno, models.SC.Tno, func.count('*')).group_by(models.SC.Cno, models.SC.Tno).all()
     return {(r[0], r[1]): r[2] for r in rows}
 
+# 校验计数器：返回 {(Cno, Ctno): (计数器值, 实际值)}，仅包含不一致的课程
+def verify_enrolled_counts(db: Session) -> dict[tuple[str, str], tuple[int | None, int]]:
+    actual = _count_enrolled_from_sc(db)
+    stored = get_enrolled_counts(db)
+    out = {}
+    for Cno, Ctno in db.query(models.Course.Cno, models.Course.Ctno).all():
+        key = (Cno, Ctno)
+        if stored.get(key) != actual.get(key, 0):
+            out[key] = (stored.get(key), actual.get(key, 0))
+    return out
+
+# 修复计数器：按 sc 表重算全部课程计数，返回被修正的课程
+def repair_enrolled_counts(db: Session) -> dict[tuple[str, str], tuple[int | None, int]]:
+    diff = verify_enrolled_counts(db)
+    for (Cno, Ctno), (old, new) in diff.items():
+        if old is None:
+            db.add(models.CourseStat(Cno=Cno, Ctno=Ctno, enrolled=new))
+        else:
+            db.query(models.CourseStat).filter(
+                models.CourseStat.Cno == Cno, models.CourseStat.Ctno == Ctno
+            ).update({models.CourseStat.enrolled: new}, synchronize_session=False)
+    if diff:
+        versions.touch(db, versions.ENROLLMENTS)
+        seats.touch(db, *diff)
+    db.commit()
+    return diff
+
+# ========== 学生成绩汇总 ==========
+
+# 汇总表中按 sc 增量累加的列；与 _contribution 返回值一一对应
+SUMMARY_SUMS = ("courses", "graded", "credits_attempted", "credits_graded",
+                "credits_earned", "weighted_sum", "points_sum")
+_ZERO = (0, 0, 0.0, 0.0, 0.0, 0.0, 0.0)
+_EPS = 1e-9
+
+# 单条选课记录对汇总的贡献
+def _contribution(credit: float, grade: int | None) -> tuple:
+    if grade is None:
+        return (1, 0, credit, 0.0, 0.0, 0.0, 0.0)
+    return (1, 1, credit, credit, credit if grade >= analytics.PASS_GRADE else 0.0,
+            credit * grade, credit * analytics.grade_points(grade))
+
+def _add(deltas: dict, Sno: str, vec: tuple, sign: int = 1):
+    cur = deltas.get(Sno, _ZERO)
+    deltas[Sno] = tuple(a + sign * b for a, b in zip(cur, vec))
+
+def _grade_delta(credit: float, old: int | None, new: int | None) -> tuple:
+    return tuple(b - a for a, b in zip(_contribution(credit, old), _contribution(credit, new)))
+
+# 删除满足条件的选课记录，返回 (各学生汇总应扣除的量, 各课程删除的记录数)（级联删除课程 / 教师 / 学生之前调用）：
+# 以 DELETE ... RETURNING 取回被删除记录的成绩，增量与删除出自同一条语句，不受并发改成绩影响
+def _delete_enrollments(db: Session, *conds) -> tuple[dict[str, tuple], Counter]:
+    t = models.SC.__table__
+    rows = db.execute(delete(t).where(*conds).returning(t.c.Sno, t.c.Cno, t.c.Tno, t.c.grade)).all()
+    keys = list({(Cno, Tno) for _, Cno, Tno, _ in rows})
+    credits = {}
+    for i in range(0, len(keys), 500):
+        credits.update(((Cno, Ctno), credit) for Cno, Ctno, credit in db.query(
+            models.Course.Cno, models.Course.Ctno, models.Course.Ccredit
+        ).filter(tuple_(models.Course.Cno, models.Course.Ctno).in_(keys[i:i + 500])).all())
+    deltas = {}
+    for Sno, Cno, Tno, grade in rows:
+        _add(deltas, Sno, _contribution(credits.get((Cno, Tno)) or 0.0, grade), -1)
+    return deltas, Counter((Cno, Tno) for _, Cno, Tno, _ in rows)
+
+# 以读到的旧成绩为条件写入（比较并交换）：汇总增量依赖旧成绩，而读旧成绩的 SELECT 不在写锁内
+# （SQLite 的读在写事务开始之前，PostgreSQL 为读已提交）；并发修改同一记录时条件不成立，重读后重试
+def _same_grade(old: int | None):
+    return models.SC.grade.is_(None) if old is None else models.SC.grade == old
+
+def _credit_of(db: Session, Cno: str, Tno: str) -> float:
+    return db.query(models.Course.Ccredit).filter(
+        models.Course.Cno == Cno, models.Course.Ctno == Tno).scalar() or 0.0
+
+# 按 sc 表计算汇总（Snos 给定时只算这些学生；没有选课记录的学生不出现在结果中）
+def _summaries_from_sc(db: Session, Snos=None) -> dict[str, tuple]:
+    SC, credit = models.SC, models.Course.Ccredit
+    graded = SC.grade.isnot(None)
+    q = db.query(
+        SC.Sno, func.count(), func.count(SC.grade), func.sum(credit),
+        func.sum(case((graded, credit), else_=0.0)),
+        func.sum(case((SC.grade >= analytics.PASS_GRADE, credit), else_=0.0)),
+        func.sum(case((graded, credit * SC.grade), else_=0.0)),
+        func.sum(case((graded, credit * analytics.POINTS_EXPR), else_=0.0)),
+    ).join(models.Course, and_(models.Course.Cno == SC.Cno, models.Course.Ctno == SC.Tno))
+    if Snos is not None:
+        q = q.filter(SC.Sno.in_(Snos))
+    return {r[0]: (r[1], r[2], *(float(v or 0) for v in r[3:])) for r in q.group_by(SC.Sno).all()}
+
+def _summary_row(Sno: str, sums: tuple) -> dict:
+    row = dict(zip(SUMMARY_SUMS, sums), Sno=Sno)
+    denom = row["credits_graded"]
+    row["weighted_avg"] = row["weighted_sum"] / denom if denom > _EPS else 0.0
+    row["gpa"] = row["points_sum"] / denom if denom > _EPS else 0.0
+    return row
+
+# 应用汇总增量（在调用方事务内执行，不提交；须在选课记录变更之后调用）：
+# 已有汇总行按主键一次 executemany 累加并重算均分 / 绩点；缺失的行按 sc 现状补建
+def _apply_summary_deltas(db: Session, deltas: dict[str, tuple]):
+    deltas = {k: v for k, v in deltas.items() if any(abs(x) > _EPS for x in v)}
+    if not deltas:
+        return
+    db.flush()
+    S = models.StudentSummary
+    existing = {r[0] for r in db.query(S.Sno).filter(S.Sno.in_(list(deltas))).all()}
+    if existing:
+        t = S.__table__
+        new = {c: t.c[c] + bindparam(f"d_{c}") for c in SUMMARY_SUMS}
+        denom = new["credits_graded"]
+        stmt = update(t).where(t.c.Sno == bindparam("b_Sno")).values(
+            **new,
+            weighted_avg=case((denom > _EPS, new["weighted_sum"] / denom), else_=0.0),
+            gpa=case((denom > _EPS, new["points_sum"] / denom), else_=0.0),
+        )
+        db.execute(stmt, [{"b_Sno": Sno, **{f"d_{c}": v for c, v in zip(SUMMARY_SUMS, deltas[Sno])}}
+                          for Sno in existing])
+    missing = [Sno for Sno in deltas if Sno not in existing]
+    if missing:
+        actual = _summaries_from_sc(db, missing)
+        for Sno in missing:
+            db.add(S(**_summary_row(Sno, actual.get(Sno, _ZERO))))
+        db.flush()
+
+# 读取单个学生的汇总（列元组，见 STUDENT_SUMMARY_ROW）；学生不存在返回 None，尚无汇总行按零计
+STUDENT_SUMMARY_ROW = (models.Student.Sno, models.Student.Sname, models.Student.Sdept,
+                       models.StudentSummary.courses, models.StudentSummary.graded,
+                       models.StudentSummary.credits_attempted, models.StudentSummary.credits_graded,
+                       models.StudentSummary.credits_earned, models.StudentSummary.weighted_avg,
+                       models.StudentSummary.gpa)
+
+def get_student_summary(db: Session, Sno: str):
+    row = db.query(*STUDENT_SUMMARY_ROW).outerjoin(
+        models.StudentSummary, models.StudentSummary.Sno == models.Student.Sno
+    ).filter(models.Student.Sno == Sno).first()
+    if row is None:
+        return None
+    return tuple(row[:3]) + tuple(0 if v is None else v for v in row[3:])
+
+# 学生汇总分页 / 排名列表（键集分页；sort=gpa&order=desc 即按绩点排名）
+SUMMARY_SORTS = {"Sno": models.StudentSummary.Sno, "gpa": models.StudentSummary.gpa,
+                 "weighted_avg": models.StudentSummary.weighted_avg,
+                 "credits_earned": models.StudentSummary.credits_earned}
+
+def page_student_summaries(db: Session, *, limit: int, cursor: str | None = None, sort: str | None = None,
+                           desc: bool = False, with_total: bool = False,
+                           Sdept: str | None = None, graded_only: bool = False):
+    q = db.query(*STUDENT_SUMMARY_ROW).join(
+        models.StudentSummary, models.StudentSummary.Sno == models.Student.Sno)
+    if Sdept:
+        q = q.filter(models.Student.Sdept == Sdept)
+    if graded_only:
+        q = q.filter(models.StudentSummary.graded > 0)
+    cols = order_columns(SUMMARY_SORTS, [models.StudentSummary.Sno], sort)
+    return keyset_page(q, cols, lambda r, c: getattr(r, c.key), limit=limit,
+                       cursor=cursor, desc=desc, with_total=with_total)
+
+# 校验汇总表：返回 {Sno: (汇总行值或 None, 实际值)}，仅包含不一致的学生
+def verify_student_summaries(db: Session) -> dict[str, tuple[tuple | None, tuple]]:
+    S = models.StudentSummary
+    actual = _summaries_from_sc(db)
+    stored = {r[0]: tuple(r[1:]) for r in db.query(S.Sno, *[getattr(S, c) for c in SUMMARY_SUMS]).all()}
+    out = {}
+    for (Sno,) in db.query(models.Student.Sno).all():
+        want, have = actual.get(Sno, _ZERO), stored.get(Sno)
+        if have is None or any(abs(a - b) > 1e-6 for a, b in zip(have, want)):
+            out[Sno] = (have, want)
+    return out
+
+# 全量重建汇总表：按 sc 表重算所有学生（包括没有选课记录的学生），返回写入行数
+def rebuild_student_summaries(db: Session) -> int:
+    actual = _summaries_from_sc(db)
+    rows = [_summary_row(Sno, actual.get(Sno, _ZERO)) for (Sno,) in db.query(models.Student.Sno).all()]
+    db.query(models.StudentSummary).delete(synchronize_session=False)
+    for i in range(0, len(rows), 1000):
+        db.execute(insert(models.StudentSummary), rows[i:i + 1000])
+    versions.touch(db, versions.ENROLLMENTS)
+    db.commit()
+    return len(rows)
+
 # ========== 选课与成绩 ==========
 
-# 列出某学生已选记录（SC 行）
+# 列出某学生已选记录（SC 行；经缓存，返回只读副本）
 def list_student_selected(db: Session, Sno: str):
-    return db.query(models.SC).filter(models.SC.Sno == Sno).all()
+    return list(cache.read_through(cache.selected, Sno, lambda: tuple(
+        cache.snapshot(sc) for sc in db.query(models.SC).filter(models.SC.Sno == Sno).all())))
 
-# 学生选课
-def enroll(db: Session, Sno: str, Cno: str, Tno: str):
+# 获取单条选课记录
+def get_enrollment(db: Session, Sno: str, Cno: str, Tno: str):
+    return db.query(models.SC).filter(
+        models.SC.Sno == Sno, models.SC.Cno == Cno, models.SC.Tno == Tno
+    ).first()
+
+# 选课（在调用方事务内执行，不提交）；课程已满抛 CourseFullError，重复选课在 flush 时抛 IntegrityError
+def enroll_in_tx(db: Session, Sno: str, Cno: str, Tno: str):
+    if not _reserve_seat(db, Cno, Tno):
+        raise CourseFullError(f"{Cno}/{Tno}")
     sc = models.SC(Sno=Sno, Cno=Cno, Tno=Tno)
     db.add(sc)
+    db.flush()
+    _apply_summary_deltas(db, {Sno: _contribution(_credit_of(db, Cno, Tno), None)})
+    versions.touch(db, versions.ENROLLMENTS)
+    return sc
+
+# 学生选课
+def enroll(db: Session, Sno: str, Cno: str, Tno: str):
     try:
+        sc = enroll_in_tx(db, Sno, Cno, Tno)
         db.commit()
-    except IntegrityError:
+    except (IntegrityError, CourseFullError):
         db.rollback()
         raise
+    cache.enrollments_changed(Sno)
     return sc
 
+# 退课（在调用方事务内执行，不提交）；未选该课返回 False
+def unenroll_in_tx(db: Session, Sno: str, Cno: str, Tno: str) -> bool:
+    key = (models.SC.Sno == Sno, models.SC.Cno == Cno, models.SC.Tno == Tno)
+    while True:
+        row = db.query(models.SC.grade).filter(*key).first()
+        if not row:
+            return False
+        if db.query(models.SC).filter(*key, _same_grade(row.grade)).delete(synchronize_session="fetch"):
+            break
+    _bump_enrolled(db, Cno, Tno, -1)
+    _apply_summary_deltas(db, {Sno: tuple(-x for x in _contribution(_credit_of(db, Cno, Tno), row.grade))})
+    versions.touch(db, versions.ENROLLMENTS)
+    return True
+
 # 学生退课
 def unenroll(db: Session, Sno: str, Cno: str, Tno: str) -> bool:
-    row = db.query(models.SC).filter(
-        models.SC.Sno == Sno, models.SC.Cno == Cno, models.SC.Tno == Tno
-    ).first()
-    if not row:
+    if not unenroll_in_tx(db, Sno, Cno, Tno):
         return False
-    db.delete(row); db.commit()
+    db.commit()
+    cache.enrollments_changed(Sno)
     return True
 
 # 管理员代退课
 def admin_unenroll(db: Session, Sno: str, Cno: str, Tno: str) -> bool:
-    sc = db.query(models.SC).filter(
-        models.SC.Sno == Sno, models.SC.Cno == Cno, models.SC.Tno == Tno
-    ).first()
-    if not sc:
-        return False
-    db.delete(sc); db.commit()
-    return True
+    return unenroll(db, Sno, Cno, Tno)
 
 # 设置成绩（教师或管理员使用，grade 为 0-100 或 None）
 def set_grade(db: Session, Sno: str, Cno: str, Tno: str, grade: int | None):
-    sc = db.query(models.SC).filter(
-        models.SC.Sno == Sno,
-        models.SC.Cno == Cno,
-        models.SC.Tno == Tno
-    ).first()
-    if not sc:
-        return None
-    sc.grade = grade
-    db.add(sc); db.commit(); db.refresh(sc)
+    key = (models.SC.Sno == Sno, models.SC.Cno == Cno, models.SC.Tno == Tno)
+    while True:
+        sc = db.query(models.SC).filter(*key).first()
+        if not sc:
+            return None
+        old = sc.grade
+        if db.query(models.SC).filter(*key, _same_grade(old)).update(
+                {models.SC.grade: grade}, synchronize_session=False):
+            break
+        db.expire(sc)
+    versions.touch(db, versions.ENROLLMENTS)
+    _apply_summary_deltas(db, {Sno: _grade_delta(_credit_of(db, Cno, Tno), old, grade)})
+    db.commit(); db.refresh(sc)
+    cache.enrollments_changed(Sno)
     return sc
 
+# 批量设置成绩：rows 为 [(Sno, Cno, Tno, grade)]，一次查询确认记录存在，
+# 一次 executemany 按主键更新，同一事务提交；返回与 rows 对应的是否找到记录
+# before_commit：提交之前以命中结果调用（调用方据此登记响应，见 idempotency.respond）
+def set_grades(db: Session, rows: list[tuple[str, str, str, int | None]], before_commit=None) -> list[bool]:
+    keys = list({(Sno, Cno, Tno) for Sno, Cno, Tno, _ in rows})
+    t = models.SC.__table__
+    cas = update(t).where(t.c.Sno == bindparam("b_Sno"), t.c.Cno == bindparam("b_Cno"),
+                          t.c.Tno == bindparam("b_Tno"),
+                          t.c.grade.is_not_distinct_from(bindparam("old", type_=t.c.grade.type))
+                          ).values(grade=bindparam("new"))
+    while True:
+        found = {}   # (Sno, Cno, Tno) -> [学分, 当前成绩]
+        for i in range(0, len(keys), 500):
+            for Sno, Cno, Tno, credit, grade in db.query(
+                models.SC.Sno, models.SC.Cno, models.SC.Tno, models.Course.Ccredit, models.SC.grade
+            ).join(
+                models.Course, and_(models.Course.Cno == models.SC.Cno, models.Course.Ctno == models.SC.Tno)
+            ).filter(
+                # 另加学号 IN：SQLite 不会对行值 IN 使用主键索引，先按主键前缀定位
+                models.SC.Sno.in_({k[0] for k in keys[i:i + 500]}),
+                tuple_(models.SC.Sno, models.SC.Cno, models.SC.Tno).in_(keys[i:i + 500]),
+            ).all():
+                found[(Sno, Cno, Tno)] = [credit, grade]
+        hits = [(Sno, Cno, Tno) in found for Sno, Cno, Tno, _ in rows]
+        # 同一记录出现多次时以最后一次为准，增量与比较条件按相邻两次成绩累计
+        params, deltas = [], {}
+        for (Sno, Cno, Tno, grade), hit in zip(rows, hits):
+            if hit:
+                cur = found[(Sno, Cno, Tno)]
+                params.append({"b_Sno": Sno, "b_Cno": Cno, "b_Tno": Tno, "old": cur[1], "new": grade})
+                _add(deltas, Sno, _grade_delta(cur[0], cur[1], grade))
+                cur[1] = grade
+        if not params or db.execute(cas, params).rowcount == len(params):
+            break
+        # 有记录在读取之后被并发修改：整批回滚后重读
+        db.rollback()
+    if params:
+        _apply_summary_deltas(db, deltas)
+        versions.touch(db, versions.ENROLLMENTS)
+    if before_commit is not None:
+        before_commit(hits)
+    db.commit()
+    cache.enrollments_changed(*{p["b_Sno"] for p in params})
+    return hits
+
 # 通用选课记录联合查询（管理员使用，可按学生/课程/教师过滤）
-def list_enrollments(db: Session, Sno: str | None = None, Cno: str | None = None, Tno: str | None = None):
-    q = db.query(models.SC, models.Student.Sname, models.Course.Cname).join(
+def _enrollments_query(db: Session, Sno: str | None = None, Cno: str | None = None, Tno: str | None = None,
+                       as_rows: bool = False):
+    cols = ENROLLMENT_ROW if as_rows else (models.SC, models.Student.Sname, models.Course.Cname)
+    q = db.query(*cols).join(
         models.Student, models.Student.Sno == models.SC.Sno
     ).join(
         models.Course, and_(models.Course.Cno == models.SC.Cno, models.Course.Ctno == models.SC.Tno)
@@ -181,19 +632,39 @@ def list_enrollments(db: Session, Sno: str | None = None, Cno: str | None = None
         q = q.filter(models.SC.Cno == Cno)
     if Tno:
         q = q.filter(models.SC.Tno == Tno)
-    return q.all()
+    return q
+
+def list_enrollments(db: Session, Sno: str | None = None, Cno: str | None = None, Tno: str | None = None):
+    return _enrollments_query(db, Sno=Sno, Cno=Cno, Tno=Tno).all()
+
+# 按主键顺序逐批读取选课记录（列元组，服务端游标），内存占用与结果规模无关；用于导出
+def iter_enrollments(db: Session, Sno: str | None = None, Cno: str | None = None, Tno: str | None = None,
+                     batch_size: int = 1000):
+    q = _enrollments_query(db, Sno=Sno, Cno=Cno, Tno=Tno, as_rows=True)
+    return q.order_by(models.SC.Sno, models.SC.Cno, models.SC.Tno).yield_per(batch_size)
 
-# 学生视角：列出自身选课（附课程名/学分/教师名）
+# 选课记录分页列表（键集分页，主键为 (Sno, Cno, Tno)）
+ENROLLMENT_SORTS = {"Sno": models.SC.Sno, "Cno": models.SC.Cno, "Tno": models.SC.Tno}
+
+def page_enrollments(db: Session, *, limit: int, cursor: str | None = None, sort: str | None = None,
+                     desc: bool = False, with_total: bool = False,
+                     Sno: str | None = None, Cno: str | None = None, Tno: str | None = None,
+                     as_rows: bool = False):
+    q = _enrollments_query(db, Sno=Sno, Cno=Cno, Tno=Tno, as_rows=as_rows)
+    cols = order_columns(ENROLLMENT_SORTS, [models.SC.Sno, models.SC.Cno, models.SC.Tno], sort)
+    key_of = (lambda r, c: getattr(r, c.key)) if as_rows else (lambda r, c: getattr(r[0], c.key))
+    return keyset_page(q, cols, key_of, limit=limit,
+                       cursor=cursor, desc=desc, with_total=with_total)
+
+# 学生视角：列出自身选课（附课程名/学分/教师名，单条联合查询）
 def list_enrollments_by_student(db: Session, Sno: str):
-    rows = list_enrollments(db, Sno=Sno)
-    out = []
-    for sc, _sname, cname in rows:
-        course = db.query(models.Course).filter(
-            models.Course.Cno == sc.Cno, models.Course.Ctno == sc.Tno
-        ).first()
-        teacher = get_teacher(db, sc.Tno)
-        out.append((sc, cname, course.Ccredit if course else None, teacher.Tname if teacher else None))
-    return out
+    return db.query(
+        models.SC, models.Course.Cname, models.Course.Ccredit, models.Teacher.Tname
+    ).join(
+        models.Course, and_(models.Course.Cno == models.SC.Cno, models.Course.Ctno == models.SC.Tno)
+    ).outerjoin(
+        models.Teacher, models.Teacher.Tno == models.SC.Tno
+    ).filter(models.SC.Sno == Sno).order_by(models.SC.Cno, models.SC.Tno).all()
 
 # 教师视角：查看自己授课的选课记录（支持课程号与搜索学号/姓名）
 def list_enrollments_by_teacher(db: Session, Tno: str, Cno: str | None = None, search: str | None = None):
@@ -205,9 +676,8 @@ def list_enrollments_by_teacher(db: Session, Tno: str, Cno: str | None = None, s
     if Cno:
         q = q.filter(models.SC.Cno == Cno)
     if search:
-        like = f"%{search}%"
-        q = q.filter((models.Student.Sno.like(like)) | (models.Student.Sname.like(like)))
-    return q.all()
+        q = q.filter(search_mod.student_filter(db, search))
+    return q.order_by(models.SC.Cno, models.SC.Sno).all()
 
 def update_user_password(db: Session, user, new_hashed: str):
     """
@@ -0,0 +1,121 @@
+from __future__ import annotations
+from sqlalchemy import select, and_, insert, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, cache, versions
+from . import search as search_mod
+
+# crud.py 中热点只读查询的异步版本（AsyncSession），返回结构与同步版本一致
+
+# 根据账号获取用户
+async def get_user_by_account(db: AsyncSession, account_no: str):
+    res = await db.execute(select(models.User).where(models.User.account_no == account_no))
+    return res.scalars().first()
+
+# 更新密码哈希（登录时透明重算旧哈希）
+async def update_password_hash(db: AsyncSession, user, new_hash: str):
+    user.password_hash = new_hash
+    await db.commit()
+    return user
+
+# 批量创建账号及档案：accounts 为 [(users 行, students 行或 None, teachers 行或 None)]，
+# 三张表各一次 executemany，同一事务提交
+async def bulk_create_accounts(db: AsyncSession, accounts: list[tuple[dict, dict | None, dict | None]]):
+    users = [u for u, _, _ in accounts]
+    students = [s for _, s, _ in accounts if s]
+    teachers = [t for _, _, t in accounts if t]
+    await db.execute(insert(models.User), users)
+    if students:
+        await db.execute(insert(models.Student), students)
+        await db.execute(insert(models.StudentSummary), [{"Sno": s["Sno"]} for s in students])
+    if teachers:
+        await db.execute(insert(models.Teacher), teachers)
+    versions.touch(db.sync_session, *([versions.STUDENTS] if students else []),
+                   *([versions.TEACHERS] if teachers else []))
+    await db.commit()
+
+# 获取学生档案（与同步版本共用缓存）
+async def get_student(db: AsyncSession, Sno: str):
+    async def load():
+        return cache.snapshot(await db.get(models.Student, Sno))
+    return await cache.read_through_async(cache.students, Sno, load)
+
+# 获取教师档案（与同步版本共用缓存）
+async def get_teacher(db: AsyncSession, Tno: str):
+    async def load():
+        return cache.snapshot(await db.get(models.Teacher, Tno))
+    return await cache.read_through_async(cache.teachers, Tno, load)
+
+# 列出课程（Ctno 给定时只列该教师开设的课程；与同步版本共用缓存）
+async def list_courses(db: AsyncSession, Ctno: str | None = None):
+    async def load():
+        q = select(models.Course)
+        if Ctno:
+            q = q.where(models.Course.Ctno == Ctno)
+        res = await db.execute(q.order_by(models.Course.Cno, models.Course.Ctno))
+        return tuple(cache.snapshot(c) for c in res.scalars().all())
+    return list(await cache.read_through_async(cache.courses, Ctno or None, load))
+
+# 获取课程的已选人数（读取计数器表）；pairs 为 None 时返回全部课程
+async def get_enrolled_counts(db: AsyncSession, pairs: list[tuple[str, str]] | None = None) -> dict[tuple[str, str], int]:
+    q = select(models.CourseStat.Cno, models.CourseStat.Ctno, models.CourseStat.enrolled)
+    if pairs is not None:
+        if not pairs:
+            return {}
+        q = q.where(tuple_(models.CourseStat.Cno, models.CourseStat.Ctno).in_(pairs))
+    res = await db.execute(q)
+    return {(r[0], r[1]): r[2] for r in res.all()}
+
+# 列出某学生已选记录（SC 行；与同步版本共用缓存）
+async def list_student_selected(db: AsyncSession, Sno: str):
+    async def load():
+        res = await db.execute(select(models.SC).where(models.SC.Sno == Sno))
+        return tuple(cache.snapshot(sc) for sc in res.scalars().all())
+    return list(await cache.read_through_async(cache.selected, Sno, load))
+
+# 列元组查询（as_rows=True，供快速 JSON 输出）：列顺序与对应输出模型的字段顺序一致
+STUDENT_ENROLLMENT_ROW = (models.SC.Cno, models.SC.Tno, models.Teacher.Tname, models.Course.Cname,
+                          models.Course.Ccredit, models.SC.grade)                      # StudentEnrollmentOut
+TEACHER_ENROLLMENT_ROW = (models.SC.Sno, models.Student.Sname, models.SC.Cno,
+                          models.Course.Cname, models.SC.grade)                        # TeacherEnrollmentOut
+
+# 学生视角：列出自身选课（附课程名/学分/教师名，单条联合查询）
+async def list_enrollments_by_student(db: AsyncSession, Sno: str, as_rows: bool = False):
+    cols = STUDENT_ENROLLMENT_ROW if as_rows else \
+        (models.SC, models.Course.Cname, models.Course.Ccredit, models.Teacher.Tname)
+    res = await db.execute(
+        select(*cols).join(
+            models.Course, and_(models.Course.Cno == models.SC.Cno, models.Course.Ctno == models.SC.Tno)
+        ).outerjoin(
+            models.Teacher, models.Teacher.Tno == models.SC.Tno
+        ).where(models.SC.Sno == Sno).order_by(models.SC.Cno, models.SC.Tno)
+    )
+    return res.all()
+
+# 教师视角：查看自己授课的选课记录（支持课程号与搜索学号/姓名）
+async def list_enrollments_by_teacher(db: AsyncSession, Tno: str, Cno: str | None = None, search: str | None = None,
+                                      as_rows: bool = False):
+    cols = TEACHER_ENROLLMENT_ROW if as_rows else (models.SC, models.Student.Sname, models.Course.Cname)
+    q = select(*cols).join(
+        models.Student, models.Student.Sno == models.SC.Sno
+    ).join(
+        models.Course, and_(models.Course.Cno == models.SC.Cno, models.Course.Ctno == models.SC.Tno)
+    ).where(models.SC.Tno == Tno)
+    if Cno:
+        q = q.where(models.SC.Cno == Cno)
+    if search:
+        q = q.where(search_mod.student_filter(db, search))
+    res = await db.execute(q.order_by(models.SC.Cno, models.SC.Sno))
+    return res.all()
+
+# 全局计数（学生 / 教师 / 课程 / 选课记录 / 已录成绩），各表计数作为标量子查询一次取回
+async def count_totals(db: AsyncSession) -> dict[str, int]:
+    def n(*cols):
+        return select(func.count(*cols)).scalar_subquery()
+    res = await db.execute(select(
+        n().select_from(models.Student.__table__).label("students"),
+        n().select_from(models.Teacher.__table__).label("teachers"),
+        n().select_from(models.Course.__table__).label("courses"),
+        n().select_from(models.SC.__table__).label("enrollments"),
+        n(models.SC.grade).label("graded"),
+    ))
+    return dict(res.one()._mapping)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import typing
+from collections import Counter
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import analytics, crud, crud_async, fastjson, schemas
+
+# 各角色首页聚合（/api/{student,teacher,admin}/dashboard）：一次请求返回首页所需的全部区块，
+# 与 ETag 依赖共用同一个 AsyncSession，令牌只解码一次。区块之间重叠的查询只执行一次：
+# 学生课程的“已选”标记由选课明细推出，教师课程的选课人数由选课名单推出；
+# 同步实现的统计（analytics）经 run_sync 在同一连接上执行。
+# fields 为逗号分隔的“区块”或“区块.字段”，只返回、也只查询选中的部分，
+# 例如 fields=me,profile.Sname,courses；不传时返回全部区块。
+
+DASHBOARDS = {"student": schemas.StudentDashboard, "teacher": schemas.TeacherDashboard,
+              "admin": schemas.AdminDashboard}
+
+STUDENT_ENROLLMENTS = fastjson.Encoder(schemas.StudentEnrollmentOut, {"grade": fastjson.grade_str})
+TEACHER_ENROLLMENTS = fastjson.Encoder(schemas.TeacherEnrollmentOut, {"grade": fastjson.grade_str})
+
+# Optional[List[X]] / Optional[X] -> X
+def _model_of(annotation) -> type[BaseModel] | None:
+    for arg in typing.get_args(annotation):
+        if isinstance(arg, type) and issubclass(arg, BaseModel):
+            return arg
+        found = _model_of(arg)
+        if found is not None:
+            return found
+    return None
+
+# 区块 -> 可选字段
+SECTIONS = {role: {name: tuple(_model_of(f.annotation).model_fields) for name, f in model.model_fields.items()}
+            for role, model in DASHBOARDS.items()}
+
+# 解析 fields：返回 {区块: 字段集合，None 表示全部字段}；未知区块 / 字段抛 ValueError
+def parse_fields(role: str, spec: str | None) -> dict[str, frozenset | None]:
+    sections = SECTIONS[role]
+    if not spec:
+        return dict.fromkeys(sections)
+    out: dict[str, set | None] = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, field = part.partition(".")
+        if name not in sections or (field and field not in sections[name]):
+            raise ValueError(part)
+        if not field:
+            out[name] = None
+        elif out.get(name, ()) is not None:
+            out.setdefault(name, set()).add(field)
+    if not out:
+        raise ValueError(spec)
+    return {k: None if v is None else frozenset(v) for k, v in out.items()}
+
+def _pick(value, fields: frozenset | None):
+    if fields is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [{k: v for k, v in item.items() if k in fields} for item in value]
+    return {k: v for k, v in value.items() if k in fields}
+
+def _select(out: dict, fields: dict) -> dict:
+    return {name: _pick(value, fields[name]) for name, value in out.items()}
+
+def _me(current: dict) -> dict:
+    return {"account_no": current["account_no"], "role": current["role"]}
+
+def _course(c, enrolled: int, selected: bool = False) -> dict:
+    return {"Cno": c.Cno, "Ctno": c.Ctno, "Cname": c.Cname, "Ccredit": c.Ccredit,
+            "enrolled": enrolled, "selected": selected, "Ccapacity": c.Ccapacity}
+
+# ========== 学生 ==========
+
+async def student(db: AsyncSession, current: dict, fields: dict) -> dict:
+    Sno = current["account_no"]
+    out = {}
+    if "me" in fields:
+        out["me"] = _me(current)
+    if "profile" in fields:
+        s = await crud_async.get_student(db, Sno)
+        out["profile"] = s and {"Sno": s.Sno, "Sname": s.Sname, "Ssex": s.Ssex, "Sdept": s.Sdept, "Sage": s.Sage}
+    rows = None
+    if "enrollments" in fields:
+        rows = await crud_async.list_enrollments_by_student(db, Sno, as_rows=True)
+        out["enrollments"] = STUDENT_ENROLLMENTS.items(rows)
+    if "courses" in fields:
+        # 已取选课明细时直接由其得到已选课程，不再读取已选记录
+        if rows is not None:
+            selected = {(r[0], r[1]) for r in rows}
+        else:
+            selected = {(x.Cno, x.Tno) for x in await crud_async.list_student_selected(db, Sno)}
+        courses = await crud_async.list_courses(db)
+        counts = await crud_async.get_enrolled_counts(db)
+        out["courses"] = [_course(c, counts.get((c.Cno, c.Ctno), 0), (c.Cno, c.Ctno) in selected)
+                          for c in courses]
+    if "summary" in fields:
+        row = await db.run_sync(crud.get_student_summary, Sno)
+        out["summary"] = row and analytics.summary_out(row)
+    return _select(out, fields)
+
+# ========== 教师 ==========
+
+async def teacher(db: AsyncSession, current: dict, fields: dict) -> dict:
+    Tno = current["account_no"]
+    out = {}
+    if "me" in fields:
+        out["me"] = _me(current)
+    if "profile" in fields:
+        t = await crud_async.get_teacher(db, Tno)
+        out["profile"] = t and {"Tno": t.Tno, "Tname": t.Tname, "Tdept": t.Tdept, "Tsex": t.Tsex}
+    rows = None
+    if "enrollments" in fields:
+        rows = await crud_async.list_enrollments_by_teacher(db, Tno, as_rows=True)
+        out["enrollments"] = TEACHER_ENROLLMENTS.items(rows)
+    if "courses" in fields:
+        courses = await crud_async.list_courses(db, Ctno=Tno)
+        # 已取选课名单时按名单计数（与计数器表一致），不再查询计数器
+        if rows is not None:
+            per_course = Counter(r[2] for r in rows)
+            counts = {(c.Cno, c.Ctno): per_course[c.Cno] for c in courses}
+        else:
+            counts = await crud_async.get_enrolled_counts(db, [(c.Cno, c.Ctno) for c in courses])
+        out["courses"] = [_course(c, counts.get((c.Cno, c.Ctno), 0)) for c in courses]
+    if "stats" in fields:
+        out["stats"] = await db.run_sync(analytics.course_stats, None, Tno)
+    return _select(out, fields)
+
+# ========== 管理员 ==========
+
+async def admin(db: AsyncSession, current: dict, fields: dict) -> dict:
+    out = {}
+    if "me" in fields:
+        out["me"] = _me(current)
+    if "totals" in fields:
+        out["totals"] = await crud_async.count_totals(db)
+    if "departments" in fields:
+        out["departments"] = await db.run_sync(analytics.department_stats)
+    return _select(out, fields)
@@ -1,14 +1,79 @@
+import threading
 from pathlib import Path
 from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from . import config
 
-ROOT_DIR = Path(__file__).resolve().parents[2]
-DB_PATH = ROOT_DIR / "db" / "app.db"
-DATABASE_URL = f"sqlite:///{DB_PATH.as_posix()}"
+ROOT_DIR = config.ROOT_DIR
+DATABASE_URL = config.DATABASE_URL
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def _fk_pragma_on_connect(dbapi_con, con_record):
+    try:
+        cur = dbapi_con.cursor()
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.close()
+    except Exception:
+        pass
+
+# SQLite 存储参数：每个新连接设置一次（journal_mode=WAL 持久化在库文件中）
+def _sqlite_pragmas_on_connect(dbapi_con, con_record):
+    cur = dbapi_con.cursor()
+    try:
+        cur.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+        cur.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA cache_size={int(config.SQLITE_CACHE_SIZE)}")
+        cur.execute(f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}")
+        cur.execute(f"PRAGMA temp_store={config.SQLITE_TEMP_STORE}")
+    finally:
+        cur.close()
+
+def _sqlite_pool_args(u) -> dict:
+    # 内存库使用 SQLAlchemy 默认的单连接池，不适用连接池大小参数
+    if u.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+    }
+
+# 按连接串创建引擎：SQLite 挂接 PRAGMA 钩子，其余数据库（如 PostgreSQL）使用带预检与回收的 QueuePool
+def make_engine(url: str):
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        eng = create_engine(u, connect_args={"check_same_thread": False}, **_sqlite_pool_args(u))
+        event.listen(eng, "connect", _fk_pragma_on_connect)
+        event.listen(eng, "connect", _sqlite_pragmas_on_connect)
+        return eng
+    return create_engine(
+        u,
+        poolclass=QueuePool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        pool_recycle=config.DB_POOL_RECYCLE_S,
+    )
+
+engine = make_engine(DATABASE_URL)
+IS_SQLITE = engine.dialect.name == "sqlite"
+DB_PATH = Path(engine.url.database) if IS_SQLITE and engine.url.database not in (None, "", ":memory:") else None
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# IntegrityError 是否为唯一键 / 主键冲突（外键、非空等其他约束失败返回 False）
+def is_unique_violation(e) -> bool:
+    orig = getattr(e, "orig", e)
+    code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if code is not None:
+        return code == "23505"
+    name = getattr(orig, "sqlite_errorname", None)
+    if name is not None:
+        return name in ("SQLITE_CONSTRAINT_UNIQUE", "SQLITE_CONSTRAINT_PRIMARYKEY")
+    return "UNIQUE constraint failed" in str(orig)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -16,9 +81,106 @@ def get_db():
     finally:
         db.close()
 
-@event.listens_for(engine, "connect")
-def _fk_pragma_on_connect(dbapi_con, con_record):
-    try:
-        dbapi_con.execute("PRAGMA foreign_keys=ON")
-    except Exception:
-        pass
\ No newline at end of file
+# ========== 异步引擎（热点只读接口使用） ==========
+
+# 同步连接串对应的异步驱动：sqlite -> aiosqlite，postgresql -> psycopg(3) 或 asyncpg
+def async_url(url: str):
+    if config.ASYNC_DATABASE_URL:
+        return make_url(config.ASYNC_DATABASE_URL)
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql":
+        return u.set(drivername="postgresql+psycopg" if u.get_driver_name() == "psycopg" else "postgresql+asyncpg")
+    return u
+
+def make_async_engine(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    u = async_url(url)
+    if u.get_backend_name() == "sqlite":
+        eng = create_async_engine(u, **_sqlite_pool_args(u))
+        event.listen(eng.sync_engine, "connect", _fk_pragma_on_connect)
+        event.listen(eng.sync_engine, "connect", _sqlite_pragmas_on_connect)
+        return eng
+    return create_async_engine(
+        u,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        pool_recycle=config.DB_POOL_RECYCLE_S,
+    )
+
+# 异步引擎按需创建，未安装异步驱动时不影响同步接口
+_async_engine = None
+_AsyncSessionLocal = None
+
+def get_async_sessionmaker():
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_engine = make_async_engine(DATABASE_URL)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def dispose_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _AsyncSessionLocal = None
+
+# 改为连接另一个数据库（测试按数据库参数化时使用）；须在没有进行中的请求时调用
+def rebind(url: str):
+    global DATABASE_URL, engine, IS_SQLITE, DB_PATH, _async_engine, _AsyncSessionLocal
+    engine.dispose()
+    if _async_engine is not None:
+        _async_engine.sync_engine.dispose()
+    DATABASE_URL = url
+    engine = make_engine(url)
+    IS_SQLITE = engine.dialect.name == "sqlite"
+    DB_PATH = Path(engine.url.database) if IS_SQLITE and engine.url.database not in (None, "", ":memory:") else None
+    SessionLocal.configure(bind=engine)
+    _async_engine = _AsyncSessionLocal = None
+
+# ========== 周期维护 ==========
+
+# 执行一次维护：回收 WAL 并让 SQLite 按需更新统计信息
+def run_maintenance():
+    if not IS_SQLITE:
+        return
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+        conn.execute(text("PRAGMA optimize"))
+
+class _MaintenanceThread(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="db-maintenance", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                run_maintenance()
+            except Exception:
+                pass
+
+_maintenance: _MaintenanceThread | None = None
+
+def start_maintenance():
+    global _maintenance
+    if not IS_SQLITE or config.DB_MAINTENANCE_INTERVAL_S <= 0 or _maintenance is not None:
+        return
+    _maintenance = _MaintenanceThread(config.DB_MAINTENANCE_INTERVAL_S)
+    _maintenance.start()
+
+def stop_maintenance():
+    global _maintenance
+    if _maintenance is not None:
+        _maintenance.stopped.set()
+        _maintenance = None
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from sqlalchemy.exc import IntegrityError
+from . import crud, config, cache, deps
+from .deps import SessionLocal
+
+# 选课高峰模式：所有选课/退课请求进入同一队列，由单个写线程分批合并提交（group commit），
+# 避免 SQLite 多写者争抢写锁导致 "database is locked"，并保证容量检查的原子性。
+
+SELECTION_MODE = config.SELECTION_MODE
+BATCH_SIZE = config.ENROLL_BATCH_SIZE
+BATCH_LINGER_MS = config.ENROLL_BATCH_LINGER_MS
+QUEUE_MAXSIZE = config.ENROLL_QUEUE_MAXSIZE
+RESULT_TIMEOUT_S = config.ENROLL_RESULT_TIMEOUT_S
+
+# 单个请求的处理结果
+OK = "ok"
+NOT_FOUND = "not_found"        # 课程不存在
+DUPLICATE = "duplicate"        # 重复选课
+FULL = "full"                  # 课程已满
+NOT_ENROLLED = "not_enrolled"  # 退课时未选该课
+BUSY = "busy"                  # 队列已满或等待超时
+
+class EnrollQueue:
+    def __init__(self, session_factory=SessionLocal, *, batch_size: int = BATCH_SIZE,
+                 linger_ms: float = BATCH_LINGER_MS, maxsize: int = QUEUE_MAXSIZE):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="enroll-queue", daemon=True)
+                self._thread.start()
+
+    # 排队中的请求数
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    # 提交一个请求，返回 Future；队列已满时抛 queue.Full
+    def submit(self, op: str, Sno: str, Cno: str, Tno: str) -> Future:
+        self.start()
+        fut: Future = Future()
+        self._q.put_nowait((fut, op, Sno, Cno, Tno))
+        return fut
+
+    # 提交并等待结果；超时前未开始处理的请求会被取消，保证调用方等待时间有上限
+    def submit_and_wait(self, op: str, Sno: str, Cno: str, Tno: str,
+                        timeout: float = RESULT_TIMEOUT_S) -> str:
+        try:
+            fut = self.submit(op, Sno, Cno, Tno)
+        except queue.Full:
+            return BUSY
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            if fut.cancel():
+                return BUSY
+            return fut.result()
+
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                wait = deadline - time.monotonic()
+                try:
+                    batch.append(self._q.get(timeout=wait) if wait > 0 else self._q.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+
+    # 整批在一个事务内执行并只提交一次；若提交失败则退回逐条提交，
+    # 每条在自己提交成功或失败后立即返回结果（已提交的请求不会因后面的失败而报错）
+    def _process(self, batch: list):
+        db = self.session_factory()
+        try:
+            try:
+                results = [self._apply(db, op, Sno, Cno, Tno) for _fut, op, Sno, Cno, Tno in batch]
+                db.commit()
+            except Exception:
+                db.rollback()
+            else:
+                cache.enrollments_changed(*{Sno for (_f, _op, Sno, *_), res in zip(batch, results) if res == OK})
+                for (fut, *_), res in zip(batch, results):
+                    fut.set_result(res)
+                return
+            for fut, op, Sno, Cno, Tno in batch:
+                self._process_one(db, fut, op, Sno, Cno, Tno)
+        finally:
+            db.close()
+
+    # 逐条提交：只有唯一键冲突（并发的重复选课）视为 DUPLICATE，其余错误只作用于本条请求
+    def _process_one(self, db, fut: Future, op: str, Sno: str, Cno: str, Tno: str):
+        try:
+            res = self._apply(db, op, Sno, Cno, Tno)
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if not deps.is_unique_violation(e):
+                fut.set_exception(e)
+                return
+            res = DUPLICATE
+        except Exception as e:
+            db.rollback()
+            fut.set_exception(e)
+            return
+        if res == OK:
+            cache.enrollments_changed(Sno)
+        fut.set_result(res)
+
+    # 单个请求：预先检查冲突，使批内一条失败不会中断整批事务
+    @staticmethod
+    def _apply(db, op: str, Sno: str, Cno: str, Tno: str) -> str:
+        if op == "enroll":
+            if not crud.course_exists(db, Cno, Tno):
+                return NOT_FOUND
+            if crud.get_enrollment(db, Sno, Cno, Tno) is not None:
+                return DUPLICATE
+            try:
+                crud.enroll_in_tx(db, Sno, Cno, Tno)
+            except crud.CourseFullError:
+                return FULL
+            return OK
+        if op == "unenroll":
+            return OK if crud.unenroll_in_tx(db, Sno, Cno, Tno) else NOT_ENROLLED
+        raise ValueError(f"unknown op: {op}")
+
+pipeline = EnrollQueue()
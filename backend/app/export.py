@@ -0,0 +1,67 @@
+from __future__ import annotations
+import csv
+import io
+import json
+import zlib
+from typing import Iterator
+from . import crud, config
+from .deps import SessionLocal
+
+# 流式导出选课记录（CSV / NDJSON，可选 gzip）：按批读取、边编码边输出，
+# 响应以分块传输发送，内存占用与结果规模无关。
+
+FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+GZIP = "application/gzip"
+FIELDS = ("Sno", "Sname", "Cno", "Cname", "Tno", "grade")   # 与 crud.ENROLLMENT_ROW 一致
+
+try:
+    import orjson
+    def _json_line(obj) -> bytes:
+        return orjson.dumps(obj) + b"\n"
+except ImportError:
+    def _json_line(obj) -> bytes:
+        return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+def _encode_csv(rows) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")   # BOM，便于 Excel 正确识别 UTF-8
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= config.EXPORT_CHUNK_BYTES:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+# 每行一个对象，字段与 /api/admin/enrollments 的列表项一致（成绩为字符串）
+def _encode_ndjson(rows) -> Iterator[bytes]:
+    chunk = bytearray()
+    for Sno, Sname, Cno, Cname, Tno, grade in rows:
+        chunk += _json_line({"Sno": Sno, "Sname": Sname, "Cno": Cno, "Cname": Cname, "Tno": Tno,
+                             "grade": None if grade is None else str(grade)})
+        if len(chunk) >= config.EXPORT_CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk.clear()
+    yield bytes(chunk)
+
+# 逐块压缩；每块 SYNC_FLUSH，客户端可边收边解压
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield z.flush()
+
+# 生成导出内容；使用独立会话，随响应迭代结束（或客户端断开）关闭
+def stream_enrollments(fmt: str, *, Sno: str | None = None, Cno: str | None = None, Tno: str | None = None,
+                       gzip: bool = False) -> Iterator[bytes]:
+    db = SessionLocal()
+    try:
+        rows = crud.iter_enrollments(db, Sno=Sno, Cno=Cno, Tno=Tno, batch_size=config.EXPORT_BATCH_SIZE)
+        chunks = _encode_csv(rows) if fmt == "csv" else _encode_ndjson(rows)
+        yield from (_gzip(chunks) if gzip else chunks)
+    finally:
+        db.close()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import typing
+from fastapi import Response
+from pydantic import BaseModel
+from . import config
+
+# 大列表的快速 JSON 输出（FAST_JSON=1 且已安装 orjson 时启用）：查询直接返回按 schema 字段顺序
+# 排列的列元组，逐行 zip 成 dict 后由 orjson 一次编码为字节，跳过 ORM 实体构造、
+# 中间 dict 拷贝与 response_model 的逐行校验。输出与常规路径逐字段一致。
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENABLED = config.FAST_JSON and orjson is not None
+
+def _float(v):
+    return None if v is None else float(v)
+
+# 成绩统一输出为字符串，空值 / 空串为 null（与 main._normalize_grade 一致）
+def grade_str(v):
+    return None if v is None or v == "" else str(v)
+
+def _converter(annotation):
+    args = typing.get_args(annotation)
+    if annotation is float or (float in args and str not in args):
+        return _float
+    return None
+
+class Encoder:
+    # 按 schema 预先确定字段顺序与需要转换的列；converters 可覆盖个别字段
+    def __init__(self, schema: type[BaseModel], converters: dict | None = None):
+        self.fields = tuple(schema.model_fields)
+        conv = {name: _converter(f.annotation) for name, f in schema.model_fields.items()}
+        conv.update(converters or {})
+        self._conv = [(i, conv[name]) for i, name in enumerate(self.fields) if conv.get(name)]
+
+    def items(self, rows) -> list[dict]:
+        fields = self.fields
+        if not self._conv:
+            return [dict(zip(fields, r)) for r in rows]
+        out = []
+        for r in rows:
+            r = list(r)
+            for i, fn in self._conv:
+                r[i] = fn(r[i])
+            out.append(dict(zip(fields, r)))
+        return out
+
+    def list_response(self, rows, sub: Response | None = None) -> Response:
+        return _respond(self.items(rows), sub)
+
+    def page_response(self, rows, next_cursor, total, sub: Response | None = None) -> Response:
+        return _respond({"items": self.items(rows), "next_cursor": next_cursor, "total": total}, sub)
+
+# sub 为接口注入的 Response（依赖项设置的 ETag 等响应头），直接返回 Response 时需手动带上
+def _respond(content, sub: Response | None) -> Response:
+    resp = Response(orjson.dumps(content), media_type="application/json")
+    if sub is not None:
+        for k, v in sub.headers.items():
+            if k not in ("content-length", "content-type"):
+                resp.headers[k] = v
+    return resp
@@ -0,0 +1,45 @@
+from __future__ import annotations
+import hashlib
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import versions
+from .auth import get_current_user
+from .deps import get_async_db
+
+# 条件 GET：ETag 由数据版本号（versions.py）、请求路径与参数、当前账号计算，不对响应体做哈希。
+# If-None-Match 命中时在执行接口函数之前直接返回 304，不做任何列表查询与序列化。
+
+# Cache-Control 策略：每个接口显式选择其一。两者都不给新鲜期——前端在每次操作后立即重新拉取，
+# 任何 max-age 都会让它拿到操作前的人数 / 选中状态；靠 ETag 把每次验证降为一个 304。
+# 课程目录（各角色的课程列表）：只是浏览用的人数与容量，选课本身在服务器端校验，
+# 服务器出错时允许浏览器在 60 秒内继续展示上一次的结果
+CATALOG = "private, max-age=0, stale-if-error=60"
+# 按账号的列表与首页（选课记录、成绩、名单、管理端列表）：每次使用前都须验证，出错时不展示旧数据
+PER_USER = "private, no-cache"
+
+def make_etag(request: Request, account_no: str, scopes: tuple[str, ...], vers: tuple[int, ...]) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    raw = "|".join([request.url.path, query, account_no] + [f"{s}={v}" for s, v in zip(scopes, vers)])
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+# 接口依赖：声明在角色校验之后；命中则抛出 304，否则为响应加上 ETag / Cache-Control
+def conditional(*scopes: str, cache_control: str):
+    async def dep(request: Request, response: Response,
+                  current=Depends(get_current_user),
+                  db: AsyncSession = Depends(get_async_db)):
+        vers = await versions.get_async(db, *scopes)
+        headers = {"ETag": make_etag(request, current["account_no"], scopes, vers),
+                   "Cache-Control": cache_control, "Vary": "Authorization"}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            raise HTTPException(304, headers=headers)
+        response.headers.update(headers)
+    return dep
@@ -0,0 +1,152 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import time
+import anyio.to_thread
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+from . import cache, config, models
+from .auth import get_current_user
+from .deps import get_db
+
+# 写接口的幂等键：客户端超时重试时携带同一个 Idempotency-Key，服务端返回首次执行的结果，
+# 不再执行写入（不会出现重复选课的 409，也不会为重试再占用一次写事务）。
+# - 接口在写入之前用 respond() 登记成功时的响应，结果行在提交前插入 idempotency_keys，
+#   与写入同时生效；写入失败（事务回滚）时不保存，重试会重新执行
+# - 重试先查进程内缓存，再按主键查询 idempotency_keys（其他 worker 保存的结果），只读不写
+# - 同一 worker 上相同键的请求并发到达时，后到的等待先到的结束后再查结果
+# - 不同 worker 上相同键的请求会同时执行：后提交的一方因写入冲突（重复选课、账号已存在）或
+#   idempotency_keys 主键冲突而失败，此时回滚并重新查询，返回先提交一方保存的结果
+# - 同一键用于不同的请求（方法、路径或请求体不同）时返回 422
+# 键按账号区分；结果保留 IDEMPOTENCY_TTL_S，过期行在之后的保存事务中顺带删除。
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+_INFO_KEY = "idempotency"
+_PURGE_INTERVAL_S = 300
+
+recent = cache.TTLCache("idempotency", config.IDEMPOTENCY_CACHE_SIZE, config.IDEMPOTENCY_TTL_S)
+_inflight: dict[str, asyncio.Event] = {}
+_next_purge = 0.0
+
+class Replay(Exception):
+    def __init__(self, status: int, body: str):
+        self.status, self.body = status, body
+
+class Pending:
+    __slots__ = ("key", "fingerprint", "status", "body", "saved", "committed")
+
+    def __init__(self, key: str, fingerprint: str):
+        self.key, self.fingerprint = key, fingerprint
+        self.status = self.body = None
+        self.saved = self.committed = False
+
+def _digest(*parts: bytes) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        h.update(len(p).to_bytes(4, "big"))
+        h.update(p)
+    return h.hexdigest()
+
+# 已保存的结果：(fingerprint, status, body) 或 None
+def lookup(db: Session, key: str):
+    hit = recent.get(key)
+    if hit is not cache.MISS:
+        return hit
+    token = recent.token(key)
+    M = models.IdempotencyKey
+    row = db.execute(select(M.fingerprint, M.status, M.body).where(
+        M.key == key, M.created_at >= time.time() - config.IDEMPOTENCY_TTL_S)).first()
+    if row is None:
+        return None
+    found = tuple(row)
+    recent.put(key, found, token)
+    return found
+
+# 接口依赖（声明在角色校验之后）：无请求头时返回 None；已有结果时直接返回该结果（抛出 Replay）
+async def guard(request: Request, current=Depends(get_current_user), db: Session = Depends(get_db)):
+    raw = request.headers.get(HEADER)
+    if raw is None or config.IDEMPOTENCY_TTL_S <= 0:
+        yield None
+        return
+    if not 0 < len(raw) <= MAX_KEY_LENGTH:
+        raise HTTPException(400, f"{HEADER} 长度应为 1-{MAX_KEY_LENGTH}")
+    key = _digest(current["account_no"].encode(), raw.encode())
+    fingerprint = _digest(request.method.encode(), request.url.path.encode(), await request.body())
+    while True:
+        found = await anyio.to_thread.run_sync(lookup, db, key)
+        if found is not None:
+            if found[0] != fingerprint:
+                raise HTTPException(422, f"{HEADER} 已用于其他请求")
+            raise Replay(found[1], found[2])
+        running = _inflight.get(key)
+        if running is None:
+            break
+        try:
+            await asyncio.wait_for(running.wait(), config.IDEMPOTENCY_WAIT_S)
+        except asyncio.TimeoutError:
+            raise HTTPException(409, f"相同 {HEADER} 的请求正在处理")
+    done = _inflight[key] = asyncio.Event()
+    pending = db.info[_INFO_KEY] = Pending(key, fingerprint)
+    try:
+        yield pending
+    except Exception:
+        found = await anyio.to_thread.run_sync(_recheck, db, key)
+        if found is not None and found[0] == fingerprint:
+            raise Replay(found[1], found[2])
+        raise
+    finally:
+        if db.info.get(_INFO_KEY) is pending:
+            del db.info[_INFO_KEY]
+        del _inflight[key]
+        done.set()
+
+# 请求失败后重新查询（丢弃本次未提交的写入）：其他 worker 上的同一请求可能已保存结果
+def _recheck(db: Session, key: str):
+    db.rollback()
+    return lookup(db, key)
+
+# 登记成功时的响应（在写入提交之前调用）；未携带幂等键时不做任何事。返回 body 以便直接 return
+def respond(db: Session, body, status: int = 200):
+    pending = db.info.get(_INFO_KEY)
+    if pending is not None:
+        pending.status = status
+        pending.body = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+    return body
+
+# 写入不经过本会话提交时（选课队列）单独保存结果
+def save(db: Session, body, status: int = 200):
+    respond(db, body, status)
+    if db.info.get(_INFO_KEY) is not None:
+        db.commit()
+    return body
+
+@event.listens_for(Session, "before_commit")
+def _save_on_commit(session: Session):
+    global _next_purge
+    pending = session.info.get(_INFO_KEY)
+    if pending is None or pending.body is None or pending.saved:
+        return
+    now = time.time()
+    M = models.IdempotencyKey
+    if now >= _next_purge:
+        _next_purge = now + _PURGE_INTERVAL_S
+        session.execute(delete(M).where(M.created_at < now - config.IDEMPOTENCY_TTL_S))
+    session.execute(insert(M).values(key=pending.key, fingerprint=pending.fingerprint,
+                                     status=pending.status, body=pending.body, created_at=now))
+    pending.saved = True
+
+@event.listens_for(Session, "after_commit")
+def _remember_on_commit(session: Session):
+    pending = session.info.get(_INFO_KEY)
+    if pending is not None and pending.saved and not pending.committed:
+        pending.committed = True
+        recent.put(pending.key, (pending.fingerprint, pending.status, pending.body), recent.token(pending.key))
+
+@event.listens_for(Session, "after_rollback")
+def _unsave_on_rollback(session: Session):
+    pending = session.info.get(_INFO_KEY)
+    if pending is not None and not pending.committed:
+        pending.saved = False
@@ -1,10 +1,43 @@
+import argparse
 from pathlib import Path
+from sqlalchemy import inspect, text
 from .deps import engine, SessionLocal, DB_PATH
-from . import models, crud
+from . import models, crud, search, versions
+
+# 为旧库补齐后续新增的可空列（create_all 不会修改已存在的表）
+ADDED_COLUMNS = {
+    "courses": {"Ccapacity": "INTEGER"},
+    "users": {"token_version": "INTEGER"},
+}
+
+def upgrade_columns():
+    insp = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for table, cols in ADDED_COLUMNS.items():
+            existing = {c["name"] for c in insp.get_columns(table)}
+            for name, ddl in cols.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(name)} {ddl}"))
+
+# 为旧库补建模型中新增的索引（create_all 只在建表时创建索引）
+def upgrade_indexes():
+    for table in models.Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(bind=engine, checkfirst=True)
 
 def main():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    parser = argparse.ArgumentParser(description="初始化 / 升级数据库")
+    parser.add_argument("--rebuild-summaries", action="store_true", help="按选课记录全量重建学生成绩汇总表")
+    args = parser.parse_args()
+    if DB_PATH is not None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     models.Base.metadata.create_all(bind=engine)
+    upgrade_columns()
+    upgrade_indexes()
+    versions.install(engine)
+    search.install(engine)
+    search.rebuild(engine)
     db = SessionLocal()
     try:
         if not crud.get_user_by_account(db, "12345678"):
@@ -12,6 +45,12 @@ def main():
             print("已创建管理员：12345678 / admin123")
         else:
             print("管理员已存在")
+        repaired = crud.repair_enrolled_counts(db)
+        if repaired:
+            print(f"已修复 {len(repaired)} 门课程的选课人数计数")
+        if args.rebuild_summaries or crud.verify_student_summaries(db):
+            n = crud.rebuild_student_summaries(db)
+            print(f"已重建 {n} 名学生的成绩汇总")
     finally:
         db.close()
 
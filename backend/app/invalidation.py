@@ -0,0 +1,200 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from . import cache, config
+
+# 跨进程缓存失效总线：多 worker 部署时，某个进程提交写操作后，把实体级变更事件
+# (实体, 键列表) 广播给其余进程，各进程据此失效本地缓存（见 cache.apply）。
+# 传输方式（CACHE_BUS）：
+# - sqlite：本机共享的事件日志文件，订阅线程以 PRAGMA data_version 低成本轮询新事件
+# - redis：Redis（或兼容服务）发布订阅，可跨主机
+# - none：单进程部署，不广播
+# 事件可能丢失时（总线断开、日志已被清理）各进程整体清空缓存，失效窗口不超过轮询间隔或 TTL。
+
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+def encode(entity: str, keys) -> str:
+    return json.dumps({"o": ORIGIN, "e": entity, "k": list(keys)}, ensure_ascii=False, separators=(",", ":"))
+
+# 处理一条远端消息；本进程发出的事件已在本地生效，直接忽略
+def deliver(payload: str | bytes):
+    msg = json.loads(payload)
+    if msg["o"] != ORIGIN:
+        cache.apply(msg["e"], tuple(msg["k"]))
+
+class SqliteTransport:
+    def __init__(self, path: str, poll_interval: float, retention_s: float):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_s = retention_s
+        self._pub: sqlite3.Connection | None = None
+        self._pub_lock = threading.Lock()
+        self._published = 0
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._pub = self._connect()
+        self._pub.execute("""CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, payload TEXT NOT NULL)""")
+        self._pub.execute("CREATE INDEX IF NOT EXISTS ix_events_ts ON events (ts)")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-bus", daemon=True)
+        self._thread.start()
+
+    def publish(self, payload: str):
+        with self._pub_lock:
+            self._pub.execute("INSERT INTO events (ts, payload) VALUES (?, ?)", (time.time(), payload))
+            self._published += 1
+            if self._published % 1000 == 0:
+                self._pub.execute("DELETE FROM events WHERE ts < ?", (time.time() - self.retention_s,))
+
+    def _run(self):
+        conn = self._connect()
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        last_id = row[0] if row else 0
+        version = None
+        try:
+            while not self._stopped.wait(self.poll_interval):
+                try:
+                    # data_version 只在其他连接提交后变化，无变化时不查询事件表
+                    v = conn.execute("PRAGMA data_version").fetchone()[0]
+                    if v == version:
+                        continue
+                    version = v
+                    rows = conn.execute("SELECT id, payload FROM events WHERE id > ? ORDER BY id",
+                                        (last_id,)).fetchall()
+                    # 自增 id 按提交顺序连续分配，出现空洞说明中间事件已被清理
+                    if rows and rows[0][0] > last_id + 1:
+                        cache.clear()
+                    for row_id, payload in rows:
+                        deliver(payload)
+                        last_id = row_id
+                except Exception:
+                    cache.clear()
+                    version = None
+        finally:
+            conn.close()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self._pub is not None:
+            self._pub.close()
+            self._pub = None
+
+class RedisTransport:
+    # client 可传入任意兼容 redis-py 接口的客户端（如测试用的 fakeredis）
+    def __init__(self, url: str, channel: str, client=None):
+        self.url = url
+        self.channel = channel
+        self.client = client
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self.client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CACHE_BUS=redis 需要安装 redis 包：pip install redis")
+            self.client = redis.Redis.from_url(self.url)
+        self._stopped.clear()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="cache-bus", daemon=True)
+        self._thread.start()
+        ready.wait(timeout=5)
+
+    def publish(self, payload: str):
+        self.client.publish(self.channel, payload)
+
+    def _run(self, ready: threading.Event):
+        while not self._stopped.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                ready.set()
+                while not self._stopped.is_set():
+                    msg = pubsub.get_message(timeout=0.5)
+                    if msg and msg["type"] == "message":
+                        deliver(msg["data"])
+            except Exception:
+                # 断线期间的事件无法补发：清空缓存后重连
+                cache.clear()
+                self._stopped.wait(1)
+            finally:
+                pubsub.close()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+class Bus:
+    def __init__(self, transport):
+        self.transport = transport
+        self.published = 0
+        self.publish_errors = 0
+
+    def start(self):
+        self.transport.start()
+        cache.listeners.append(self.on_change)
+
+    def stop(self):
+        if self.on_change in cache.listeners:
+            cache.listeners.remove(self.on_change)
+        self.transport.stop()
+
+    # 写请求已提交，广播失败不影响请求结果，其他进程最迟在 TTL 后读到新值
+    def on_change(self, entity: str, keys):
+        try:
+            self.transport.publish(encode(entity, keys))
+            self.published += 1
+        except Exception:
+            self.publish_errors += 1
+
+    def stats(self) -> dict:
+        return {"transport": type(self.transport).__name__, "origin": ORIGIN,
+                "published": self.published, "publish_errors": self.publish_errors}
+
+def make_transport(kind: str = config.CACHE_BUS):
+    if kind == "sqlite":
+        return SqliteTransport(config.CACHE_BUS_PATH, config.CACHE_BUS_POLL_MS / 1000, config.CACHE_BUS_RETENTION_S)
+    if kind == "redis":
+        return RedisTransport(config.CACHE_BUS_REDIS_URL, config.CACHE_BUS_CHANNEL)
+    if kind == "none":
+        return None
+    raise ValueError(f"未知的 CACHE_BUS：{kind}")
+
+bus: Bus | None = None
+
+def start():
+    global bus
+    if bus is not None or not config.CACHE_ENABLED:
+        return
+    transport = make_transport()
+    if transport is not None:
+        bus = Bus(transport)
+        bus.start()
+
+def stop():
+    global bus
+    if bus is not None:
+        bus.stop()
+        bus = None
@@ -1,17 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from contextlib import asynccontextmanager
+import anyio.to_thread
 from typing import List, Optional
-from . import models, crud, auth, schemas
-from .deps import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, crud, crud_async, auth, schemas, enroll_queue, deps, config, bulk_import, search, cache, invalidation, http_cache, versions, fastjson, export, analytics, revocation, metrics, dashboard, seats, idempotency
+from .deps import get_db, get_async_db
 from .auth import require_role
-
-app = FastAPI(title="学生信息管理系统 API")
+from .pagination import PageParams, encode_cursor, decode_cursor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    deps.start_maintenance()
+    invalidation.start()
+    revocation.start()
+    await seats.start()
+    yield
+    await seats.stop()
+    revocation.stop()
+    invalidation.stop()
+    deps.stop_maintenance()
+    auth.shutdown_hash_pool()
+    await deps.dispose_async_engine()
+
+app = FastAPI(title="学生信息管理系统 API", lifespan=lifespan)
+
+# 运行指标：路由类须在注册接口之前替换
+if config.METRICS_ENABLED:
+    app.router.route_class = metrics.Route
+    metrics.install()
 
 # 默认初始 / 重置密码
-DEFAULT_PASSWORD = "123456"
+DEFAULT_PASSWORD = config.DEFAULT_PASSWORD
+
+# 大列表的快速 JSON 编码器（FAST_JSON 开启时使用，输出与 response_model 一致）
+STUDENT_JSON = fastjson.Encoder(schemas.StudentOut)
+TEACHER_JSON = fastjson.Encoder(schemas.TeacherOut)
+ADMIN_ENROLLMENT_JSON = fastjson.Encoder(schemas.AdminEnrollmentOut, {"grade": fastjson.grade_str})
+STUDENT_ENROLLMENT_JSON = fastjson.Encoder(schemas.StudentEnrollmentOut, {"grade": fastjson.grade_str})
+TEACHER_ENROLLMENT_JSON = fastjson.Encoder(schemas.TeacherEnrollmentOut, {"grade": fastjson.grade_str})
 
 # CORS
 app.add_middleware(
@@ -24,17 +55,45 @@ app.add_middleware(
 
 # ========== 认证与通用 ==========
 
+# 携带已执行过的 Idempotency-Key 时直接返回首次执行的结果（见 idempotency.py）
+@app.exception_handler(idempotency.Replay)
+async def idempotent_replay(request: Request, exc: idempotency.Replay):
+    return Response(exc.body, status_code=exc.status, media_type="application/json",
+                    headers={"Idempotent-Replayed": "true"})
+
+# Prometheus 抓取接口（本进程的指标）
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not config.METRICS_ENABLED:
+        raise HTTPException(404)
+    pool = anyio.to_thread.current_default_thread_limiter().statistics()
+    text = metrics.render({
+        "threadpool_threads_busy": ("同步接口线程池占用数", pool.borrowed_tokens),
+        "threadpool_threads_max": ("同步接口线程池大小", pool.total_tokens),
+        "threadpool_queue_depth": ("等待线程池的任务数", pool.tasks_waiting),
+        "enroll_queue_depth": ("选课队列排队数", enroll_queue.pipeline.depth()),
+        "password_hash_pending": ("密码哈希进程池排队数", auth.pending_hashes()),
+        "seats_stream_clients": ("选课人数推送连接数", len(seats.broadcaster.subscribers)),
+    })
+    return Response(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/api/auth/login")
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     account_no = form.username.strip()
-    user = crud.get_user_by_account(db, account_no)
-    if not user or not auth.verify_password(form.password, user.password_hash):
+    user = await crud_async.get_user_by_account(db, account_no)
+    if not user:
+        raise HTTPException(401, "账号或密码错误")
+    ok, new_hash = await auth.verify_and_update_async(form.password, user.password_hash)
+    if not ok:
         raise HTTPException(401, "账号或密码错误")
-    token = auth.create_access_token({"account_no": user.account_no, "role": user.role})
+    if new_hash:
+        await crud_async.update_password_hash(db, user, new_hash)
+    token = auth.create_access_token({"account_no": user.account_no, "role": user.role,
+                                      "ver": user.token_version or 0})
     return {"access_token": token, "token_type": "bearer"}
 
 @app.get("/api/auth/me")
-def me(current=Depends(auth.get_current_user)):
+async def me(current=Depends(auth.get_current_user)):
     return current
 
 # ========== 管理员：用户与档案 ==========
@@ -42,20 +101,45 @@ def me(current=Depends(auth.get_current_user)):
 @app.post("/api/admin/users", response_model=schemas.UserOut)
 def admin_create_user(body: schemas.AdminCreateUser,
                       current=Depends(require_role(["admin"])),
+                      _idem=Depends(idempotency.guard),
                       db: Session = Depends(get_db)):
     if crud.get_user_by_account(db, body.account_no):
         raise HTTPException(400, "账号已存在")
+    err = bulk_import.account_error(body)
+    if err:
+        raise HTTPException(400, err)
     pwd = body.password or DEFAULT_PASSWORD
-    user = crud.create_user(db, body.account_no, pwd, body.role)
+    student = teacher = None
     if body.role == "student":
-        if not (body.Sname and body.Ssex and body.Sdept):
-            raise HTTPException(400, "学生需提供 Sname/Ssex/Sdept")
-        crud.create_student(db, user.account_no, body.Sname, body.Ssex, body.Sdept, body.Sage)
+        student = {"Sname": body.Sname, "Ssex": body.Ssex, "Sdept": body.Sdept, "Sage": body.Sage}
     elif body.role == "teacher":
-        if not body.Tname:
-            raise HTTPException(400, "教师需提供 Tname")
-        crud.create_teacher(db, user.account_no, body.Tname, body.Tdept, body.Tsex)
-    return {"account_no": user.account_no, "role": user.role}
+        teacher = {"Tname": body.Tname, "Tdept": body.Tdept, "Tsex": body.Tsex}
+    out = idempotency.respond(db, {"account_no": body.account_no, "role": body.role})
+    try:
+        crud.create_account(db, body.account_no, pwd, body.role, student=student, teacher=teacher)
+    except IntegrityError:
+        raise HTTPException(400, "账号已存在")
+    return out
+
+# 批量导入账号：请求体为 CSV（首行表头）或 NDJSON（每行一个 JSON 对象），流式解析
+@app.post("/api/admin/users/import", response_model=schemas.ImportResult)
+async def admin_import_users(request: Request,
+                             role: Optional[str] = Query(None),
+                             current=Depends(require_role(["admin"])),
+                             db: AsyncSession = Depends(get_async_db)):
+    ctype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if ctype in ("text/csv", "application/csv"):
+        fmt = "csv"
+    elif ctype in ("application/x-ndjson", "application/jsonl", "application/json-lines"):
+        fmt = "ndjson"
+    else:
+        raise HTTPException(415, "仅支持 text/csv 或 application/x-ndjson")
+    if role is not None and role not in bulk_import.ROLES:
+        raise HTTPException(400, "角色无效")
+    try:
+        return await bulk_import.import_users(db, request.stream(), fmt, default_role=role)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 @app.post("/api/admin/users/reset-password")
 def admin_reset_password(body: schemas.AdminResetPassword,
@@ -79,10 +163,39 @@ def admin_delete_user(account_no: str,
     return {"ok": True}
 
 # 学生档案
-@app.get("/api/admin/students", response_model=List[schemas.StudentOut])
-def admin_list_students(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
-    return [schemas.StudentOut(Sno=s.Sno, Sname=s.Sname, Ssex=s.Ssex, Sdept=s.Sdept, Sage=s.Sage)
-            for s in crud.list_students(db)]
+@app.get("/api/admin/students", response_model=schemas.Page[schemas.StudentOut])
+def admin_list_students(response: Response,
+                        Sdept: Optional[str] = Query(None),
+                        Sname: Optional[str] = Query(None),
+                        page: PageParams = Depends(),
+                        current=Depends(require_role(["admin"])),
+                        _etag=Depends(http_cache.conditional(versions.STUDENTS, cache_control=http_cache.PER_USER)),
+                        db: Session = Depends(get_db)):
+    if fastjson.ENABLED:
+        rows, next_cursor, total = _paged(crud.page_students, db, page, Sdept=Sdept, Sname=Sname, as_rows=True)
+        return STUDENT_JSON.page_response(rows, next_cursor, total, response)
+    rows, next_cursor, total = _paged(crud.page_students, db, page, Sdept=Sdept, Sname=Sname)
+    return {"items": [{"Sno": s.Sno, "Sname": s.Sname, "Ssex": s.Ssex, "Sdept": s.Sdept, "Sage": s.Sage}
+                      for s in rows],
+            "next_cursor": next_cursor, "total": total}
+
+# 学生检索：学号/姓名子串匹配，按相关度排序
+@app.get("/api/admin/students/search", response_model=schemas.Page[schemas.StudentOut])
+def admin_search_students(q: str = Query(..., min_length=1, max_length=64),
+                          limit: int = Query(20, ge=1, le=100),
+                          cursor: Optional[str] = Query(None),
+                          current=Depends(require_role(["admin"])),
+                          db: Session = Depends(get_db)):
+    try:
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+    except ValueError:
+        raise HTTPException(400, "分页参数无效")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(400, "分页参数无效")
+    rows, has_more = search.search_students(db, q.strip(), limit=limit, offset=offset)
+    return {"items": [{"Sno": s.Sno, "Sname": s.Sname, "Ssex": s.Ssex, "Sdept": s.Sdept, "Sage": s.Sage}
+                      for s in rows],
+            "next_cursor": encode_cursor([offset + limit]) if has_more else None}
 
 @app.get("/api/admin/students/{Sno}", response_model=schemas.StudentOut)
 def admin_get_student(Sno: str, current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
@@ -101,10 +214,20 @@ def admin_update_student(Sno: str, body: schemas.StudentUpdate,
     return {"Sno": s.Sno, "Sname": s.Sname, "Ssex": s.Ssex, "Sdept": s.Sdept, "Sage": s.Sage}
 
 # 教师档案
-@app.get("/api/admin/teachers", response_model=List[schemas.TeacherOut])
-def admin_list_teachers(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
-    return [schemas.TeacherOut(Tno=t.Tno, Tname=t.Tname, Tdept=t.Tdept, Tsex=t.Tsex)
-            for t in crud.list_teachers(db)]
+@app.get("/api/admin/teachers", response_model=schemas.Page[schemas.TeacherOut])
+def admin_list_teachers(response: Response,
+                        Tdept: Optional[str] = Query(None),
+                        Tname: Optional[str] = Query(None),
+                        page: PageParams = Depends(),
+                        current=Depends(require_role(["admin"])),
+                        _etag=Depends(http_cache.conditional(versions.TEACHERS, cache_control=http_cache.PER_USER)),
+                        db: Session = Depends(get_db)):
+    if fastjson.ENABLED:
+        rows, next_cursor, total = _paged(crud.page_teachers, db, page, Tdept=Tdept, Tname=Tname, as_rows=True)
+        return TEACHER_JSON.page_response(rows, next_cursor, total, response)
+    rows, next_cursor, total = _paged(crud.page_teachers, db, page, Tdept=Tdept, Tname=Tname)
+    return {"items": [{"Tno": t.Tno, "Tname": t.Tname, "Tdept": t.Tdept, "Tsex": t.Tsex} for t in rows],
+            "next_cursor": next_cursor, "total": total}
 
 @app.get("/api/admin/teachers/{Tno}", response_model=schemas.TeacherOut)
 def admin_get_teacher(Tno: str, current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
@@ -124,14 +247,20 @@ def admin_update_teacher(Tno: str, body: schemas.TeacherUpdate,
 
 # ========== 管理员：课程与选课成绩 ==========
 
-@app.get("/api/admin/courses", response_model=List[schemas.CourseOut])
-def admin_list_courses(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
-    courses = crud.list_courses(db)
-    counts = crud.get_enrolled_counts(db)
-    return [{
+@app.get("/api/admin/courses", response_model=schemas.Page[schemas.CourseOut])
+def admin_list_courses(Cno: Optional[str] = Query(None),
+                       Ctno: Optional[str] = Query(None),
+                       page: PageParams = Depends(),
+                       current=Depends(require_role(["admin"])),
+                       _etag=Depends(http_cache.conditional(versions.COURSES, versions.ENROLLMENTS,
+                                                            cache_control=http_cache.CATALOG)),
+                       db: Session = Depends(get_db)):
+    courses, next_cursor, total = _paged(crud.page_courses, db, page, Cno=Cno, Ctno=Ctno)
+    counts = crud.get_enrolled_counts(db, [(c.Cno, c.Ctno) for c in courses])
+    return {"items": [{
         "Cno": c.Cno, "Ctno": c.Ctno, "Cname": c.Cname, "Ccredit": c.Ccredit,
-        "enrolled": counts.get((c.Cno, c.Ctno), 0), "selected": False
-    } for c in courses]
+        "enrolled": counts.get((c.Cno, c.Ctno), 0), "selected": False, "Ccapacity": c.Ccapacity
+    } for c in courses], "next_cursor": next_cursor, "total": total}
 
 @app.post("/api/admin/courses", response_model=schemas.CourseOut)
 def admin_create_course(body: schemas.CourseCreate,
@@ -141,9 +270,18 @@ def admin_create_course(body: schemas.CourseCreate,
         raise HTTPException(400, "教师不存在")
     if crud.course_exists(db, body.Cno, body.Ctno):
         raise HTTPException(409, "该教师已开设该课程")
-    c = crud.create_course(db, body.Cno, body.Ctno, body.Cname, body.Ccredit)
+    c = crud.create_course(db, body.Cno, body.Ctno, body.Cname, body.Ccredit, body.Ccapacity)
     return {"Cno": c.Cno, "Ctno": c.Ctno, "Cname": c.Cname, "Ccredit": c.Ccredit,
-            "enrolled": 0, "selected": False}
+            "enrolled": 0, "selected": False, "Ccapacity": c.Ccapacity}
+
+@app.put("/api/admin/courses/{Cno}/{Ctno}/capacity")
+def admin_set_course_capacity(Cno: str, Ctno: str, body: schemas.CourseCapacityUpdate,
+                              current=Depends(require_role(["admin"])),
+                              db: Session = Depends(get_db)):
+    c = crud.set_course_capacity(db, Cno, Ctno, body.Ccapacity)
+    if not c:
+        raise HTTPException(404, "课程不存在")
+    return {"ok": True, "Ccapacity": c.Ccapacity}
 
 @app.delete("/api/admin/courses/{Cno}/{Ctno}")
 def admin_delete_course(Cno: str, Ctno: str,
@@ -154,30 +292,88 @@ def admin_delete_course(Cno: str, Ctno: str,
         raise HTTPException(404, "课程不存在")
     return {"ok": True}
 
-@app.get("/api/admin/enrollments", response_model=List[schemas.AdminEnrollmentOut])  # 改用 AdminEnrollmentOut
-def admin_list_enrollments(Sno: Optional[str] = Query(None),
+# 课程计数器校验 / 修复（按 sc 表重算）
+@app.get("/api/admin/maintenance/enrolled-counts")
+def admin_verify_enrolled_counts(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
+    diff = crud.verify_enrolled_counts(db)
+    return {"ok": not diff, "mismatches": _count_diff_rows(diff)}
+
+@app.post("/api/admin/maintenance/enrolled-counts/repair")
+def admin_repair_enrolled_counts(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
+    diff = crud.repair_enrolled_counts(db)
+    return {"ok": True, "repaired": _count_diff_rows(diff)}
+
+# 进程内缓存统计（命中 / 未命中 / 淘汰 / 过期 / 失效）与手动清空
+@app.get("/api/admin/maintenance/cache")
+def admin_cache_stats(current=Depends(require_role(["admin"]))):
+    out = cache.stats()
+    out["tokens"] = auth.token_stats()
+    if invalidation.bus is not None:
+        out["bus"] = invalidation.bus.stats()
+    if seats.running():
+        out["seats"] = seats.broadcaster.stats()
+    return out
+
+@app.post("/api/admin/maintenance/cache/clear")
+def admin_cache_clear(current=Depends(require_role(["admin"]))):
+    cache.clear()
+    return {"ok": True}
+
+# 导出选课记录：CSV 或 NDJSON，流式分块输出，过滤条件与列表接口相同。
+# gzip=true 时下载的是 .gz 文件本身（Content-Type: application/gzip，不设 Content-Encoding，
+# 否则客户端会自动解压，却以 .gz 文件名保存明文）
+@app.get("/api/admin/enrollments/export")
+def admin_export_enrollments(format: str = Query("csv", pattern="^(csv|ndjson)$"),
+                             gzip: bool = Query(False),
+                             Sno: Optional[str] = Query(None),
+                             Cno: Optional[str] = Query(None),
+                             Tno: Optional[str] = Query(None),
+                             current=Depends(require_role(["admin"]))):
+    filename = f"enrollments.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    return StreamingResponse(export.stream_enrollments(format, Sno=Sno, Cno=Cno, Tno=Tno, gzip=gzip),
+                             media_type=export.GZIP if gzip else export.FORMATS[format], headers=headers)
+
+@app.get("/api/admin/enrollments", response_model=schemas.Page[schemas.AdminEnrollmentOut])  # 改用 AdminEnrollmentOut
+def admin_list_enrollments(response: Response,
+                           Sno: Optional[str] = Query(None),
                            Cno: Optional[str] = Query(None),
                            Tno: Optional[str] = Query(None),
+                           page: PageParams = Depends(),
                            current=Depends(require_role(["admin"])),
+                           _etag=Depends(http_cache.conditional(versions.ENROLLMENTS, versions.COURSES, versions.STUDENTS,
+                                                                cache_control=http_cache.PER_USER)),
                            db: Session = Depends(get_db)):
-    rows = crud.list_enrollments(db, Sno=Sno, Cno=Cno, Tno=Tno)
-    return [ _normalize_grade({
+    if fastjson.ENABLED:
+        rows, next_cursor, total = _paged(crud.page_enrollments, db, page, Sno=Sno, Cno=Cno, Tno=Tno, as_rows=True)
+        return ADMIN_ENROLLMENT_JSON.page_response(rows, next_cursor, total, response)
+    rows, next_cursor, total = _paged(crud.page_enrollments, db, page, Sno=Sno, Cno=Cno, Tno=Tno)
+    return {"items": [ _normalize_grade({
         "Sno": sc.Sno, "Sname": sname,
         "Cno": sc.Cno, "Tno": sc.Tno, "Cname": cname,
         "grade": sc.grade
-    }) for sc, sname, cname in rows]
+    }) for sc, sname, cname in rows], "next_cursor": next_cursor, "total": total}
 
 @app.put("/api/admin/enrollments/{Sno}/{Cno}/{Tno}/grade")
 def admin_update_grade(Sno: str, Cno: str, Tno: str,
                        body: schemas.GradeUpdate,
                        current=Depends(require_role(["admin"])),
+                       _idem=Depends(idempotency.guard),
                        db: Session = Depends(get_db)):
     grade_val = None if (body.grade is None or body.grade == "") else int(body.grade)
+    idempotency.respond(db, {"ok": True})
     sc = crud.set_grade(db, Sno, Cno, Tno, grade_val)
     if not sc:
         raise HTTPException(404, "记录不存在")
     return {"ok": True}
 
+@app.put("/api/admin/grades", response_model=schemas.GradeBatchOut)
+def admin_update_grades(body: schemas.GradeBatchIn,
+                        current=Depends(require_role(["admin"])),
+                        _idem=Depends(idempotency.guard),
+                        db: Session = Depends(get_db)):
+    return _apply_grade_batch(db, body.items, None)
+
 @app.delete("/api/admin/enrollments/{Sno}/{Cno}/{Tno}")
 def admin_unenroll(Sno: str, Cno: str, Tno: str,
                    current=Depends(require_role(["admin"])),
@@ -187,6 +383,57 @@ def admin_unenroll(Sno: str, Cno: str, Tno: str,
         raise HTTPException(404, "记录不存在")
     return {"ok": True}
 
+# 成绩统计：按课程（均值 / 中位数 / 百分位 / 分段 / 及格率）、按院系汇总、单个学生绩点
+@app.get("/api/admin/analytics/courses", response_model=List[schemas.CourseGradeStats])
+def admin_course_analytics(Cno: Optional[str] = Query(None),
+                           Tno: Optional[str] = Query(None),
+                           current=Depends(require_role(["admin"])),
+                           db: Session = Depends(get_db)):
+    return analytics.course_stats(db, Cno=Cno, Tno=Tno)
+
+@app.get("/api/admin/analytics/departments", response_model=List[schemas.DepartmentGradeStats])
+def admin_department_analytics(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
+    return analytics.department_stats(db)
+
+# 学生成绩汇总：排名 / 分页列表（sort=gpa&order=desc 按绩点排名）与单个学生
+@app.get("/api/admin/analytics/students", response_model=schemas.Page[schemas.StudentSummaryOut])
+def admin_student_summaries(Sdept: Optional[str] = Query(None),
+                            graded_only: bool = Query(False),
+                            page: PageParams = Depends(),
+                            current=Depends(require_role(["admin"])),
+                            _etag=Depends(http_cache.conditional(versions.ENROLLMENTS, versions.STUDENTS,
+                                                                 cache_control=http_cache.PER_USER)),
+                            db: Session = Depends(get_db)):
+    rows, next_cursor, total = _paged(crud.page_student_summaries, db, page, Sdept=Sdept, graded_only=graded_only)
+    return {"items": [analytics.summary_out(r) for r in rows], "next_cursor": next_cursor, "total": total}
+
+@app.get("/api/admin/analytics/students/{Sno}", response_model=schemas.StudentSummaryOut)
+def admin_student_summary(Sno: str, current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
+    row = crud.get_student_summary(db, Sno)
+    if not row:
+        raise HTTPException(404, "学生不存在")
+    return analytics.summary_out(row)
+
+# 学生成绩汇总校验 / 全量重建（按 sc 表重算）
+@app.get("/api/admin/maintenance/student-summaries")
+def admin_verify_student_summaries(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
+    diff = crud.verify_student_summaries(db)
+    return {"ok": not diff, "mismatches": len(diff), "sample": sorted(diff)[:20]}
+
+@app.post("/api/admin/maintenance/student-summaries/rebuild")
+def admin_rebuild_student_summaries(current=Depends(require_role(["admin"])), db: Session = Depends(get_db)):
+    return {"ok": True, "rebuilt": crud.rebuild_student_summaries(db)}
+
+# 管理员首页：全局计数与院系汇总（fields 见 dashboard.py）
+@app.get("/api/admin/dashboard", response_model=None, responses={200: {"model": schemas.AdminDashboard}})
+async def admin_dashboard(fields: Optional[str] = Query(None, max_length=512),
+                          current=Depends(require_role(["admin"])),
+                          _etag=Depends(http_cache.conditional(versions.STUDENTS, versions.TEACHERS,
+                                                               versions.COURSES, versions.ENROLLMENTS,
+                                                               cache_control=http_cache.PER_USER)),
+                          db: AsyncSession = Depends(get_async_db)):
+    return await dashboard.admin(db, current, _dashboard_fields("admin", fields))
+
 # ========== 学生端 ==========
 
 @app.get("/api/student/profile", response_model=schemas.StudentOut)
@@ -208,43 +455,75 @@ def student_profile_update(body: schemas.StudentSelfUpdate,
     return {"Sno": s.Sno, "Sname": s.Sname, "Ssex": s.Ssex, "Sdept": s.Sdept, "Sage": s.Sage}
 
 @app.get("/api/student/courses", response_model=List[schemas.CourseOut])
-def student_courses(current=Depends(require_role(["student"])), db: Session = Depends(get_db)):
+async def student_courses(current=Depends(require_role(["student"])),
+                          _etag=Depends(http_cache.conditional(versions.COURSES, versions.ENROLLMENTS,
+                                                               cache_control=http_cache.CATALOG)),
+                          db: AsyncSession = Depends(get_async_db)):
     sno = current["account_no"]
-    selected_pairs = {(x.Cno, x.Tno) for x in crud.list_student_selected(db, sno)}
-    courses = crud.list_courses(db)
-    counts = crud.get_enrolled_counts(db)
+    selected_pairs = {(x.Cno, x.Tno) for x in await crud_async.list_student_selected(db, sno)}
+    courses = await crud_async.list_courses(db)
+    counts = await crud_async.get_enrolled_counts(db)
     return [{
         "Cno": c.Cno, "Ctno": c.Ctno, "Cname": c.Cname, "Ccredit": c.Ccredit,
         "enrolled": counts.get((c.Cno, c.Ctno), 0),
-        "selected": (c.Cno, c.Ctno) in selected_pairs
+        "selected": (c.Cno, c.Ctno) in selected_pairs, "Ccapacity": c.Ccapacity
     } for c in courses]
 
+# 选课人数推送（Server-Sent Events）：event: seats 为有变化课程的当前人数与容量，
+# event: resync 表示推送有遗漏，客户端应重新拉取 /api/student/courses；snapshot=1 时先推送全部课程
+@app.get("/api/student/courses/stream")
+async def student_courses_stream(snapshot: bool = Query(False),
+                                 current=Depends(require_role(["student"]))):
+    if not seats.running():
+        raise HTTPException(404, "未开启选课人数推送")
+    if seats.broadcaster.full():
+        raise HTTPException(503, "推送连接数已满，请稍后重试")
+    return StreamingResponse(seats.stream(snapshot), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
 @app.post("/api/student/enroll")
 def student_enroll(body: schemas.EnrollRequest,
                    current=Depends(require_role(["student"])),
+                   _idem=Depends(idempotency.guard),
                    db: Session = Depends(get_db)):
     sno = current["account_no"]
+    if enroll_queue.SELECTION_MODE:
+        # 队列在自己的事务中提交选课，幂等结果随后单独保存
+        return idempotency.save(db, _queue_result(
+            enroll_queue.pipeline.submit_and_wait("enroll", sno, body.Cno, body.Tno)))
     if not crud.course_exists(db, body.Cno, body.Tno):
         raise HTTPException(404, "课程不存在")
+    idempotency.respond(db, {"ok": True})
     try:
         crud.enroll(db, sno, body.Cno, body.Tno)
     except IntegrityError:
         raise HTTPException(409, "不能重复选课")
+    except crud.CourseFullError:
+        raise HTTPException(409, "课程已满")
     return {"ok": True}
 
 @app.delete("/api/student/enroll/{Cno}/{Tno}")
 def student_unenroll(Cno: str, Tno: str,
                      current=Depends(require_role(["student"])),
                      db: Session = Depends(get_db)):
+    if enroll_queue.SELECTION_MODE:
+        return _queue_result(enroll_queue.pipeline.submit_and_wait("unenroll", current["account_no"], Cno, Tno))
     ok = crud.unenroll(db, current["account_no"], Cno, Tno)
     if not ok:
         raise HTTPException(404, "未选该课")
     return {"ok": True}
 
 @app.get("/api/student/enrollments", response_model=List[schemas.StudentEnrollmentOut])
-def student_my_enrollments(current=Depends(require_role(["student"])), db: Session = Depends(get_db)):
+async def student_my_enrollments(response: Response,
+                                 current=Depends(require_role(["student"])),
+                                 _etag=Depends(http_cache.conditional(versions.ENROLLMENTS, versions.COURSES, versions.TEACHERS,
+                                                                      cache_control=http_cache.PER_USER)),
+                                 db: AsyncSession = Depends(get_async_db)):
     sno = current["account_no"]
-    rows = crud.list_enrollments_by_student(db, sno)
+    if fastjson.ENABLED:
+        rows = await crud_async.list_enrollments_by_student(db, sno, as_rows=True)
+        return STUDENT_ENROLLMENT_JSON.list_response(rows, response)
+    rows = await crud_async.list_enrollments_by_student(db, sno)
     return [ _normalize_grade({
         "Cno": sc.Cno,
         "Tno": sc.Tno,
@@ -254,6 +533,24 @@ def student_my_enrollments(current=Depends(require_role(["student"])), db: Sessi
         "grade": sc.grade
     }) for sc, cname, ccredit, tname in rows]
 
+# 本人学分加权平均成绩与绩点
+@app.get("/api/student/analytics/gpa", response_model=schemas.StudentSummaryOut)
+def student_gpa(current=Depends(require_role(["student"])), db: Session = Depends(get_db)):
+    row = crud.get_student_summary(db, current["account_no"])
+    if not row:
+        raise HTTPException(404, "学生信息不存在")
+    return analytics.summary_out(row)
+
+# 学生首页：身份、档案、可选课程、已选课程与成绩、学分绩点，一次返回（fields 见 dashboard.py）
+@app.get("/api/student/dashboard", response_model=None, responses={200: {"model": schemas.StudentDashboard}})
+async def student_dashboard(fields: Optional[str] = Query(None, max_length=512),
+                            current=Depends(require_role(["student"])),
+                            _etag=Depends(http_cache.conditional(versions.COURSES, versions.ENROLLMENTS,
+                                                                 versions.STUDENTS, versions.TEACHERS,
+                                                                 cache_control=http_cache.PER_USER)),
+                            db: AsyncSession = Depends(get_async_db)):
+    return await dashboard.student(db, current, _dashboard_fields("student", fields))
+
 # ========== 教师端 ==========
 
 @app.get("/api/teacher/profile", response_model=schemas.TeacherOut)
@@ -274,21 +571,31 @@ def teacher_profile_update(body: schemas.TeacherSelfUpdate,
     return {"Tno": t.Tno, "Tname": t.Tname, "Tdept": t.Tdept, "Tsex": t.Tsex}
 
 @app.get("/api/teacher/courses", response_model=List[schemas.CourseOut])
-def teacher_courses(current=Depends(require_role(["teacher"])), db: Session = Depends(get_db)):
+def teacher_courses(current=Depends(require_role(["teacher"])),
+                    _etag=Depends(http_cache.conditional(versions.COURSES, versions.ENROLLMENTS,
+                                                         cache_control=http_cache.CATALOG)),
+                    db: Session = Depends(get_db)):
     tno = current["account_no"]
-    courses = [c for c in crud.list_courses(db) if c.Ctno == tno]
-    counts = crud.get_enrolled_counts(db)
+    courses = crud.list_courses(db, Ctno=tno)
+    counts = crud.get_enrolled_counts(db, [(c.Cno, c.Ctno) for c in courses])
     return [{
         "Cno": c.Cno, "Ctno": c.Ctno, "Cname": c.Cname, "Ccredit": c.Ccredit,
-        "enrolled": counts.get((c.Cno, c.Ctno), 0), "selected": False
+        "enrolled": counts.get((c.Cno, c.Ctno), 0), "selected": False, "Ccapacity": c.Ccapacity
     } for c in courses]
 
 @app.get("/api/teacher/enrollments", response_model=List[schemas.TeacherEnrollmentOut])
-def teacher_enrollments(Cno: Optional[str] = Query(None),
-                        search: Optional[str] = Query(None),
-                        current=Depends(require_role(["teacher"])),
-                        db: Session = Depends(get_db)):
-    rows = crud.list_enrollments_by_teacher(db, current["account_no"], Cno=Cno, search=search)
+async def teacher_enrollments(response: Response,
+                              Cno: Optional[str] = Query(None),
+                              search: Optional[str] = Query(None),
+                              current=Depends(require_role(["teacher"])),
+                              _etag=Depends(http_cache.conditional(versions.ENROLLMENTS, versions.COURSES, versions.STUDENTS,
+                                                                   cache_control=http_cache.PER_USER)),
+                              db: AsyncSession = Depends(get_async_db)):
+    if fastjson.ENABLED:
+        rows = await crud_async.list_enrollments_by_teacher(db, current["account_no"], Cno=Cno, search=search,
+                                                            as_rows=True)
+        return TEACHER_ENROLLMENT_JSON.list_response(rows, response)
+    rows = await crud_async.list_enrollments_by_teacher(db, current["account_no"], Cno=Cno, search=search)
     return [ _normalize_grade({
         "Sno": sc.Sno, "Sname": sname,
         "Cno": sc.Cno, "Cname": cname,
@@ -299,14 +606,40 @@ def teacher_enrollments(Cno: Optional[str] = Query(None),
 def teacher_update_grade(Sno: str, Cno: str,
                          body: schemas.GradeUpdate,
                          current=Depends(require_role(["teacher"])),
+                         _idem=Depends(idempotency.guard),
                          db: Session = Depends(get_db)):
     grade_val = None if (body.grade is None or body.grade == "") else int(body.grade)
+    idempotency.respond(db, {"ok": True})
     sc = crud.set_grade(db, Sno, Cno, current["account_no"], grade_val)
     if not sc:
         raise HTTPException(404, "选课记录不存在")
     return {"ok": True}
 
 
+@app.put("/api/teacher/grades", response_model=schemas.GradeBatchOut)
+def teacher_update_grades(body: schemas.GradeBatchIn,
+                          current=Depends(require_role(["teacher"])),
+                          _idem=Depends(idempotency.guard),
+                          db: Session = Depends(get_db)):
+    return _apply_grade_batch(db, body.items, current["account_no"])
+
+# 本人所授课程的成绩统计
+@app.get("/api/teacher/analytics/courses", response_model=List[schemas.CourseGradeStats])
+def teacher_course_analytics(Cno: Optional[str] = Query(None),
+                             current=Depends(require_role(["teacher"])),
+                             db: Session = Depends(get_db)):
+    return analytics.course_stats(db, Cno=Cno, Tno=current["account_no"])
+
+# 教师首页：身份、档案、所授课程、选课名单与成绩统计，一次返回（fields 见 dashboard.py）
+@app.get("/api/teacher/dashboard", response_model=None, responses={200: {"model": schemas.TeacherDashboard}})
+async def teacher_dashboard(fields: Optional[str] = Query(None, max_length=512),
+                            current=Depends(require_role(["teacher"])),
+                            _etag=Depends(http_cache.conditional(versions.COURSES, versions.ENROLLMENTS,
+                                                                 versions.STUDENTS, versions.TEACHERS,
+                                                                 cache_control=http_cache.PER_USER)),
+                            db: AsyncSession = Depends(get_async_db)):
+    return await dashboard.teacher(db, current, _dashboard_fields("teacher", fields))
+
 @app.post("/api/auth/change-password")
 def change_password(
     payload: schemas.ChangePasswordIn,
@@ -333,4 +666,83 @@ def _normalize_grade(row: dict) -> dict:
     g = row.get("grade", None)
     if g is None or g == "":
         return {**row, "grade": None}
-    return {**row, "grade": str(g)}
\ No newline at end of file
+    return {**row, "grade": str(g)}
+
+# 调用 crud.page_* 分页查询；非法游标或排序字段返回 400
+def _paged(page_fn, db: Session, page: PageParams, **filters):
+    try:
+        return page_fn(db, limit=page.limit, cursor=page.cursor, sort=page.sort,
+                       desc=page.desc, with_total=page.with_total, **filters)
+    except ValueError:
+        raise HTTPException(400, "分页参数无效")
+
+# 解析首页聚合的 fields 参数；未知区块或字段返回 400
+def _dashboard_fields(role: str, fields: str | None) -> dict:
+    try:
+        return dashboard.parse_fields(role, fields)
+    except ValueError as e:
+        raise HTTPException(400, f"fields 参数无效：{e}")
+
+def _count_diff_rows(diff: dict) -> list[dict]:
+    return [{"Cno": Cno, "Ctno": Ctno, "stored": old, "actual": new}
+            for (Cno, Ctno), (old, new) in diff.items()]
+
+# 选课队列结果 -> HTTP 响应
+_QUEUE_ERRORS = {
+    enroll_queue.NOT_FOUND: (404, "课程不存在"),
+    enroll_queue.DUPLICATE: (409, "不能重复选课"),
+    enroll_queue.FULL: (409, "课程已满"),
+    enroll_queue.NOT_ENROLLED: (404, "未选该课"),
+    enroll_queue.BUSY: (503, "选课繁忙，请稍后重试"),
+}
+
+def _queue_result(result: str) -> dict:
+    if result in _QUEUE_ERRORS:
+        raise HTTPException(*_QUEUE_ERRORS[result])
+    return {"ok": True}
+
+# 解析成绩字符串：空串 / None 表示清空，其余须为 0-100 的整数
+def _parse_grade(g: str | None) -> int | None:
+    if g is None or g == "":
+        return None
+    v = int(g)
+    if not 0 <= v <= 100:
+        raise ValueError(g)
+    return v
+
+# 批量成绩：逐行校验成绩与归属（教师仅限本人 Tno），其余交给 crud.set_grades 一次提交
+def _apply_grade_batch(db: Session, items: list, tno: str | None) -> dict:
+    out = [{"Sno": it.Sno, "Cno": it.Cno, "Tno": it.Tno or tno, "ok": False, "error": None} for it in items]
+    rows, idx = [], []
+    for i, it in enumerate(items):
+        row = out[i]
+        if tno is not None and it.Tno not in (None, tno):
+            row["error"] = "无权修改其他教师的课程"
+        elif row["Tno"] is None:
+            row["error"] = "缺少 Tno"
+        else:
+            try:
+                rows.append((it.Sno, it.Cno, row["Tno"], _parse_grade(it.grade)))
+                idx.append(i)
+            except ValueError:
+                row["error"] = "成绩需为 0-100 的整数"
+
+    def result(hits: list[bool]) -> dict:
+        for i, hit in zip(idx, hits):
+            out[i]["ok"] = hit
+            if not hit:
+                out[i]["error"] = "选课记录不存在"
+        updated = sum(1 for r in out if r["ok"])
+        return {"updated": updated, "failed": len(out) - updated, "items": out}
+
+    if not rows:
+        return idempotency.save(db, result([]))
+    # 各条结果在提交之前即已确定：响应只构造、登记一次，幂等结果随写入一同提交
+    body = None
+
+    def register(hits: list[bool]):
+        nonlocal body
+        body = idempotency.respond(db, result(hits))
+
+    crud.set_grades(db, rows, before_commit=register)
+    return body
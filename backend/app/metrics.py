@@ -0,0 +1,193 @@
+from __future__ import annotations
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from . import config
+
+# 运行指标（Prometheus 文本格式，GET /metrics）：
+# - 接口：按 (方法, 路由模板) 的耗时直方图、按状态码的请求数、进行中请求数
+# - 线程池：同步接口所用 AnyIO 线程池的占用与排队数，选课队列与密码哈希进程池的排队数
+# - SQL：按发起查询的 crud 函数统计语句耗时；超过 SLOW_QUERY_MS 的语句写慢查询日志
+# 每次观测只是一次加锁的计数累加；指标按进程统计，多 worker 时每个进程各自上报。
+
+# 直方图上界（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+slow_log = logging.getLogger(__name__.rpartition(".")[0] + ".slow_sql")
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series: dict[tuple, list] = {}   # 标签值 -> [各桶计数..., +Inf 计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, values: tuple, v: float):
+        i = bisect_left(self.buckets, v)
+        with self._lock:
+            s = self._series.get(values)
+            if s is None:
+                s = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += v
+
+    def render(self, out: list[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            series = [(k, list(s)) for k, s in self._series.items()]
+        for values, s in series:
+            lbl = _labels(self.labels, values)
+            acc = 0
+            for le, n in zip(self.buckets, s):
+                acc += n
+                out.append(f'{self.name}_bucket{{{lbl}{"," if lbl else ""}le="{le}"}} {acc}')
+            acc += s[len(self.buckets)]
+            out.append(f'{self.name}_bucket{{{lbl}{"," if lbl else ""}le="+Inf"}} {acc}')
+            out.append(f"{self.name}_sum{{{lbl}}} {s[-1]}")
+            out.append(f"{self.name}_count{{{lbl}}} {acc}")
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values: tuple, n: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + n
+
+    def render(self, out: list[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        with self._lock:
+            items = list(self._values.items())
+        for values, v in items:
+            out.append(f"{self.name}{{{_labels(self.labels, values)}}} {v}")
+
+class Gauge(Counter):
+    kind = "gauge"
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+def _gauge(out: list[str], name: str, help: str, value):
+    out.append(f"# HELP {name} {help}")
+    out.append(f"# TYPE {name} gauge")
+    out.append(f"{name} {value}")
+
+# ========== 接口 ==========
+
+http_latency = Histogram("http_request_duration_seconds", "接口耗时", ("method", "route"), REQUEST_BUCKETS)
+http_requests = Counter("http_requests_total", "请求数", ("method", "route", "status"))
+http_in_flight = Gauge("http_requests_in_flight", "进行中的请求数", ("method", "route"))
+
+# 路由类：在路由匹配之后计时，标签使用路由模板（/api/admin/students/{Sno}），不随参数膨胀。
+# 须在注册接口之前设置：app.router.route_class = metrics.Route
+class Route(APIRoute):
+    async def handle(self, scope, receive, send):
+        labels = (scope["method"], self.path)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc(labels)
+        t0 = time.perf_counter()
+        try:
+            await super().handle(scope, receive, send_status)
+        finally:
+            http_latency.observe(labels, time.perf_counter() - t0)
+            http_in_flight.inc(labels, -1)
+            http_requests.inc(labels + (status,))
+
+# ========== SQL ==========
+
+sql_latency = Histogram("db_statement_duration_seconds", "SQL 语句耗时（按发起查询的函数）", ("op",), SQL_BUCKETS)
+slow_queries = Counter("db_slow_statements_total", "超过 SLOW_QUERY_MS 的语句数", ("op",))
+
+_PKG = __name__.rpartition(".")[0]
+# 统计到函数的模块：栈上属于这些模块的函数即为 op（见 _find_op）
+_TAGGED = {f"{_PKG}.{m}": m for m in ("crud", "crud_async", "analytics", "search", "versions",
+                                       "revocation", "enroll_queue", "bulk_import", "export", "dashboard",
+                                       "seats", "idempotency")}
+_MAX_DEPTH = 96
+
+try:
+    from greenlet import getcurrent as _getcurrent
+except ImportError:
+    _getcurrent = None
+
+# 返回 (op, 剩余深度, 私有函数备选)：优先最内层的公开函数，_ 开头的内部辅助函数只作备选
+def _find_op(f, budget: int, fallback: str | None = None):
+    while f is not None and budget > 0:
+        mod = _TAGGED.get(f.f_globals.get("__name__"))
+        if mod is not None:
+            name = getattr(f.f_code, "co_qualname", f.f_code.co_name).split(".<locals>")[0]
+            if not name.startswith("<"):
+                if not name.startswith("_"):
+                    return f"{mod}.{name}", 0, fallback
+                fallback = fallback or f"{mod}.{name}"
+        f = f.f_back
+        budget -= 1
+    return None, budget, fallback
+
+# 发起当前语句的函数；异步会话的语句在 greenlet 中执行，调用方协程位于父 greenlet 的栈上
+def caller_op() -> str:
+    op, budget, fallback = _find_op(sys._getframe(2), _MAX_DEPTH)
+    if op is None and _getcurrent is not None:
+        parent = _getcurrent().parent
+        if parent is not None:
+            op, _, fallback = _find_op(parent.gr_frame, budget, fallback)
+    return op or fallback or "other"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_t0 = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    t0 = getattr(context, "_metrics_t0", None)
+    if t0 is None:
+        return
+    elapsed = time.perf_counter() - t0
+    op = caller_op()
+    sql_latency.observe((op,), elapsed)
+    if config.SLOW_QUERY_MS > 0 and elapsed * 1000 >= config.SLOW_QUERY_MS:
+        slow_queries.inc((op,))
+        # 只记录语句文本，不记录参数（可能含个人信息）
+        slow_log.warning("slow query %.1fms op=%s%s sql=%s", elapsed * 1000, op,
+                         " executemany" if executemany else "", " ".join(statement.split())[:1000])
+
+_installed = False
+
+# 对所有引擎（含异步引擎内部的同步引擎）挂载语句计时
+def install():
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+# ========== 输出 ==========
+
+# 运行中的额外指标：由调用方（/metrics 接口）在事件循环中采集
+def render(extra: dict[str, tuple[str, float]] | None = None) -> str:
+    out: list[str] = []
+    for m in (http_latency, http_requests, http_in_flight, sql_latency, slow_queries):
+        m.render(out)
+    for name, (help, value) in (extra or {}).items():
+        _gauge(out, name, help, value)
+    return "\n".join(out) + "\n"
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Float,
+    Column, Integer, String, Float, Text, Index,
     PrimaryKeyConstraint, ForeignKey, ForeignKeyConstraint
 )
 from sqlalchemy.orm import declarative_base
@@ -12,6 +12,7 @@ class User(Base):
     account_no = Column(String(8), unique=True, index=True, nullable=False)  # 8位账号
     password_hash = Column(String(256), nullable=False)
     role = Column(String(16), nullable=False)  # admin | teacher | student
+    token_version = Column(Integer, index=True)  # 令牌版本，修改 / 重置密码时加一，旧令牌随之失效（空视为 0）；索引供吊销名单加载
 
 class Student(Base):
     __tablename__ = "students"
@@ -20,6 +21,10 @@ class Student(Base):
     Ssex = Column(String(8), nullable=False)
     Sdept = Column(String(64), nullable=False)
     Sage = Column(Integer)
+    __table_args__ = (
+        Index("ix_students_sdept", "Sdept", "Sno"),   # 按专业过滤 + 学号键集分页
+        Index("ix_students_sname", "Sname"),          # 姓名前缀搜索 / 排序
+    )
 
 class Teacher(Base):
     __tablename__ = "teachers"
@@ -34,9 +39,39 @@ class Course(Base):
     Ctno = Column(String(8), nullable=False)  # 任课教师号
     Cname = Column(String(128), nullable=False)
     Ccredit = Column(Float, nullable=False)
+    Ccapacity = Column(Integer)  # 课程容量，为空表示不限
     __table_args__ = (
         PrimaryKeyConstraint("Cno", "Ctno", name="pk_course"),
         ForeignKeyConstraint(["Ctno"], ["teachers.Tno"], ondelete="CASCADE"),
+        Index("ix_courses_ctno", "Ctno"),             # 教师课程列表 / 删除教师时级联
+    )
+
+class CourseStat(Base):
+    # 课程已选人数计数器，与 sc 表在同一事务内维护
+    __tablename__ = "course_stats"
+    Cno = Column(String(32), nullable=False)
+    Ctno = Column(String(8), nullable=False)
+    enrolled = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        PrimaryKeyConstraint("Cno", "Ctno", name="pk_course_stats"),
+        ForeignKeyConstraint(["Cno", "Ctno"], ["courses.Cno", "courses.Ctno"], ondelete="CASCADE"),
+    )
+
+class StudentSummary(Base):
+    # 学生成绩汇总（选课门数、学分、加权成绩与绩点），与 sc 表在同一事务内增量维护
+    __tablename__ = "student_summaries"
+    Sno = Column(String(8), ForeignKey("students.Sno", ondelete="CASCADE"), primary_key=True)
+    courses = Column(Integer, nullable=False, default=0)              # 已选门数
+    graded = Column(Integer, nullable=False, default=0)               # 已录成绩门数
+    credits_attempted = Column(Float, nullable=False, default=0)      # 已选学分
+    credits_graded = Column(Float, nullable=False, default=0)         # 已录成绩学分（加权分母）
+    credits_earned = Column(Float, nullable=False, default=0)         # 及格学分
+    weighted_sum = Column(Float, nullable=False, default=0)           # Σ 学分 × 成绩
+    points_sum = Column(Float, nullable=False, default=0)             # Σ 学分 × 绩点
+    weighted_avg = Column(Float, nullable=False, default=0)           # weighted_sum / credits_graded
+    gpa = Column(Float, nullable=False, default=0)                    # points_sum / credits_graded
+    __table_args__ = (
+        Index("ix_student_summaries_gpa", "gpa", "Sno"),   # 绩点排名（键集分页）
     )
 
 class SC(Base):
@@ -49,4 +84,24 @@ class SC(Base):
         PrimaryKeyConstraint("Sno", "Cno", "Tno", name="pk_sc"),
         ForeignKeyConstraint(["Sno"], ["students.Sno"], ondelete="CASCADE"),
         ForeignKeyConstraint(["Cno", "Tno"], ["courses.Cno", "courses.Ctno"], ondelete="CASCADE"),
-    )
\ No newline at end of file
+        Index("ix_sc_course", "Cno", "Tno"),          # 按课程过滤 / 课程联接 / 删除课程时级联
+        Index("ix_sc_teacher", "Tno", "Cno"),         # 教师视角按 Tno（及 Cno）过滤
+    )
+
+class TableVersion(Base):
+    # 数据版本号：写事务提交时对受影响的范围加一，用于生成 ETag（见 versions.py）
+    __tablename__ = "table_versions"
+    name = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class IdempotencyKey(Base):
+    # 写接口按 Idempotency-Key 保存的首次执行结果，与写入在同一事务内提交（见 idempotency.py）
+    __tablename__ = "idempotency_keys"
+    key = Column(String(32), primary_key=True)            # 摘要(账号, Idempotency-Key)
+    fingerprint = Column(String(32), nullable=False)      # 摘要(方法, 路径, 请求体)，同一键用于不同请求时拒绝
+    status = Column(Integer, nullable=False)
+    body = Column(Text, nullable=False)                   # 响应 JSON
+    created_at = Column(Float, nullable=False)            # 时间戳（秒），超过 IDEMPOTENCY_TTL_S 后清理
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
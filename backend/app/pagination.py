@@ -0,0 +1,84 @@
+from __future__ import annotations
+import base64
+import json
+from typing import Callable, Optional
+from fastapi import Query
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query as SAQuery
+
+# 管理员列表接口共用的键集（游标）分页
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+class PageParams:
+    """列表分页公共参数（作为 FastAPI 依赖注入）"""
+    def __init__(self,
+                 limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                 cursor: Optional[str] = Query(None),
+                 sort: Optional[str] = Query(None),
+                 order: str = Query("asc", pattern="^(asc|desc)$"),
+                 with_total: bool = Query(False)):
+        self.limit = limit
+        self.cursor = cursor
+        self.sort = sort
+        self.desc = order == "desc"
+        self.with_total = with_total
+
+# 游标为最后一行排序键的 JSON 数组，经 base64url 编码
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+_SCALARS = (str, int, float)
+
+# 游标来自客户端：元素只能是标量或 null（对象、数组等会在拼接查询时出错），
+# types 给出时再按各排序列的类型检查（如对字符串列传入数字）；不合法时抛出 ValueError，接口返回 400
+def decode_cursor(cursor: str, size: int, types: list[tuple] | None = None) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("invalid cursor")
+    for i, v in enumerate(values):
+        if v is not None and (isinstance(v, bool) or not isinstance(v, types[i] if types else _SCALARS)):
+            raise ValueError("invalid cursor")
+    return values
+
+# 排序列的值在游标中允许的类型（浮点列也接受整数）
+def _cursor_types(col) -> tuple:
+    try:
+        t = col.type.python_type
+    except NotImplementedError:
+        return _SCALARS
+    if t is float:
+        return (int, float)
+    return (t,) if t in _SCALARS else _SCALARS
+
+# 解析排序字段：sort 必须在白名单内，随后补齐主键列以保证顺序唯一
+def order_columns(sortable: dict, pk_cols: list, sort: str | None) -> list:
+    if sort is None:
+        return list(pk_cols)
+    if sort not in sortable:
+        raise ValueError(f"unsupported sort field: {sort}")
+    first = sortable[sort]
+    return [first] + [c for c in pk_cols if c is not first]
+
+# 执行一页键集查询，返回 (本页行, 下一页游标, 总数或 None)
+# key_of(row, col) 从结果行中取出排序列的值，用于生成下一页游标
+def keyset_page(q: SAQuery, cols: list, key_of: Callable, *, limit: int,
+                cursor: str | None = None, desc: bool = False, with_total: bool = False):
+    total = q.order_by(None).count() if with_total else None
+    if cursor:
+        after = decode_cursor(cursor, len(cols), [_cursor_types(c) for c in cols])
+        key = tuple_(*cols)
+        q = q.filter(key < tuple_(*after) if desc else key > tuple_(*after))
+    q = q.order_by(*[c.desc() if desc else c.asc() for c in cols])
+    rows = q.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([key_of(rows[-1], c) for c in cols])
+    return rows, next_cursor, total
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import threading
+from sqlalchemy.orm import Session
+from . import config, models, versions
+from .deps import SessionLocal
+
+# 令牌吊销名单：users.token_version 为账号当前的令牌版本，修改 / 重置密码时加一，
+# 令牌 claims 中的 ver 小于它即视为已吊销。各进程在内存中保存 token_version > 0 的账号，
+# 请求路径上的检查是一次字典查找。本进程的吊销立即生效；其他进程由后台线程按
+# AUTH_REVOCATION_SYNC_S 轮询 TOKENS 版本号（一次主键查询），有变化时整表重载（只含吊销过的账号）。
+# 重载期间本进程新吊销的账号另行记录，与读到的结果按 max() 合并，不会被较早的查询结果覆盖。
+
+_min_versions: dict[str, int] = {}
+_synced: int | None = None
+reloads = 0
+_lock = threading.Lock()
+_sync_lock = threading.Lock()
+_noted: dict[str, int] | None = None   # 重载进行期间的本进程吊销
+
+def is_revoked(account_no: str, ver: int) -> bool:
+    return ver < _min_versions.get(account_no, 0)
+
+# 本进程吊销（事务提交之后调用）
+def note(account_no: str, version: int):
+    with _lock:
+        if version > _min_versions.get(account_no, 0):
+            _min_versions[account_no] = version
+        if _noted is not None and version > _noted.get(account_no, 0):
+            _noted[account_no] = version
+
+# 版本号有变化时重载名单，返回是否重载。开始记录本进程吊销须在读取版本号之前：
+# 读事务的快照（SQLite）从第一次读取开始，此后提交的吊销查询不到，只能靠记录补上
+def sync(db: Session) -> bool:
+    global _min_versions, _synced, _noted, reloads
+    with _sync_lock:
+        with _lock:
+            _noted = {}
+        try:
+            (v,) = versions.get(db, versions.TOKENS)
+            if v == _synced:
+                return False
+            rows = db.query(models.User.account_no, models.User.token_version).filter(
+                models.User.token_version > 0).all()
+            with _lock:
+                fresh = {a: n for a, n in rows}
+                for a, n in _noted.items():
+                    fresh[a] = max(fresh.get(a, 0), n)
+                _min_versions = fresh
+            _synced = v
+            reloads += 1
+            return True
+        finally:
+            with _lock:
+                _noted = None
+
+def stats() -> dict:
+    return {"revoked_accounts": len(_min_versions), "version": _synced, "reloads": reloads}
+
+class _SyncThread(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="token-revocation", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                _sync_once()
+            except Exception:
+                pass
+
+def _sync_once():
+    db = SessionLocal()
+    try:
+        sync(db)
+    finally:
+        db.close()
+
+_thread: _SyncThread | None = None
+
+# 启动时先同步一次，保证接收请求前名单已就绪
+def start():
+    global _thread
+    _sync_once()
+    if config.AUTH_REVOCATION_SYNC_S <= 0 or _thread is not None:
+        return
+    _thread = _SyncThread(config.AUTH_REVOCATION_SYNC_S)
+    _thread.start()
+
+def stop():
+    global _thread
+    if _thread is not None:
+        _thread.stopped.set()
+        _thread = None
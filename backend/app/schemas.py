@@ -1,5 +1,13 @@
-from pydantic import BaseModel
-from typing import Optional, List, Union
+from pydantic import BaseModel, Field
+from typing import Optional, List, Union, Generic, TypeVar
+
+T = TypeVar("T")
+
+# ========== 通用：分页信封 ==========
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None   # 为空表示已到最后一页
+    total: Optional[int] = None         # 仅在 with_total=true 时返回
 
 # ========== 管理员创建用户 ==========
 class AdminCreateUser(BaseModel):
@@ -18,12 +26,24 @@ class UserOut(BaseModel):
     account_no: str
     role: str
 
+# ========== 批量导入 ==========
+class ImportRowError(BaseModel):
+    line: int
+    account_no: Optional[str] = None
+    error: str
+
+class ImportResult(BaseModel):
+    created: int
+    failed: int
+    errors: List[ImportRowError]
+
 # ========== 课程相关 ==========
 class CourseCreate(BaseModel):
     Cno: str
     Ctno: str
     Cname: str
     Ccredit: float
+    Ccapacity: Optional[int] = Field(None, ge=0)   # 为空表示不限
 
 class CourseOut(BaseModel):
     Cno: str
@@ -32,6 +52,10 @@ class CourseOut(BaseModel):
     Ccredit: float
     enrolled: int
     selected: bool
+    Ccapacity: Optional[int] = None
+
+class CourseCapacityUpdate(BaseModel):
+    Ccapacity: Optional[int] = Field(None, ge=0)
 
 class EnrollRequest(BaseModel):
     Cno: str
@@ -50,6 +74,28 @@ class ChangePasswordRequest(BaseModel):
 class GradeUpdate(BaseModel):
     grade: Optional[str] = None
 
+# 批量录入成绩（教师端 Tno 可省略，默认为本人）
+class GradeBatchItem(BaseModel):
+    Sno: str
+    Cno: str
+    Tno: Optional[str] = None
+    grade: Optional[str] = None
+
+class GradeBatchIn(BaseModel):
+    items: List[GradeBatchItem] = Field(..., max_length=5000)
+
+class GradeBatchRowOut(BaseModel):
+    Sno: str
+    Cno: str
+    Tno: Optional[str] = None
+    ok: bool
+    error: Optional[str] = None
+
+class GradeBatchOut(BaseModel):
+    updated: int
+    failed: int
+    items: List[GradeBatchRowOut]
+
 class EnrollmentOut(BaseModel):
     Sno: str
     Sname: Optional[str] = None
@@ -127,4 +173,77 @@ class AdminEnrollmentOut(BaseModel):
     Cno: str
     Cname: Optional[str] = None
     Tno: Optional[str] = None
-    grade: Optional[Union[str, int]] = None
\ No newline at end of file
+    grade: Optional[Union[str, int]] = None
+# ========== 成绩统计 ==========
+class HistogramBucket(BaseModel):
+    range: str
+    count: int
+
+class CourseGradeStats(BaseModel):
+    Cno: str
+    Tno: str
+    Cname: Optional[str] = None
+    Ccredit: Optional[float] = None
+    enrolled: int
+    graded: int
+    mean: Optional[float] = None
+    min: Optional[int] = None
+    max: Optional[int] = None
+    median: Optional[float] = None
+    p25: Optional[float] = None
+    p75: Optional[float] = None
+    p90: Optional[float] = None
+    pass_rate: Optional[float] = None
+    histogram: List[HistogramBucket]
+
+class StudentSummaryOut(BaseModel):
+    Sno: str
+    Sname: Optional[str] = None
+    Sdept: Optional[str] = None
+    courses: int
+    graded: int
+    credits_attempted: float
+    credits_graded: float
+    credits_earned: float
+    weighted_avg: Optional[float] = None
+    gpa: Optional[float] = None
+
+class DepartmentGradeStats(BaseModel):
+    Sdept: str
+    students: int
+    graded: int
+    mean: Optional[float] = None
+    median: Optional[float] = None
+    pass_rate: Optional[float] = None
+    avg_gpa: Optional[float] = None
+
+# ========== 首页聚合（fields 未选中的区块不返回） ==========
+class MeOut(BaseModel):
+    account_no: str
+    role: str
+
+class Totals(BaseModel):
+    students: int
+    teachers: int
+    courses: int
+    enrollments: int
+    graded: int
+
+class StudentDashboard(BaseModel):
+    me: Optional[MeOut] = None
+    profile: Optional[StudentOut] = None
+    courses: Optional[List[CourseOut]] = None
+    enrollments: Optional[List[StudentEnrollmentOut]] = None
+    summary: Optional[StudentSummaryOut] = None
+
+class TeacherDashboard(BaseModel):
+    me: Optional[MeOut] = None
+    profile: Optional[TeacherOut] = None
+    courses: Optional[List[CourseOut]] = None
+    enrollments: Optional[List[TeacherEnrollmentOut]] = None
+    stats: Optional[List[CourseGradeStats]] = None
+
+class AdminDashboard(BaseModel):
+    me: Optional[MeOut] = None
+    totals: Optional[Totals] = None
+    departments: Optional[List[DepartmentGradeStats]] = None
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from sqlalchemy import DDL, and_, event, func, or_, select, text, column, table, literal_column
+from sqlalchemy.orm import Session
+from . import models
+
+# 学生检索（学号 / 姓名）：
+# - 3 个字符及以上按子串匹配：
+#   SQLite 使用 FTS5 外部内容表 students_fts，trigram 分词（按字符切分，适用于中文姓名），
+#   由 students 表上的触发器同步（含批量插入与外键级联删除）；
+#   PostgreSQL 使用 pg_trgm GIN 索引，LIKE / ILIKE '%x%' 可直接走索引
+# - 更短的查询（trigram 至少需要 3 个字符，如两字的中文姓名、姓氏）按前缀匹配：改写为学号主键与
+#   ix_students_sname 上的范围条件，区分大小写；只匹配开头，不再匹配中间的子串
+# 仍不走索引的情形：PostgreSQL 未安装 pg_trgm 时 3 个字符及以上的查询（LIKE '%x%' 顺序扫描）；
+# 前缀范围依赖按码点排序（SQLite 默认 BINARY，PostgreSQL 须为 C 排序规则，其他排序规则下结果可能不完整）。
+
+MIN_FTS_LEN = 3
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+        Sno, Sname, content='students', content_rowid='rowid', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, Sno, Sname) VALUES (new.rowid, new.Sno, new.Sname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, Sno, Sname) VALUES ('delete', old.rowid, old.Sno, old.Sname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF Sno, Sname ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, Sno, Sname) VALUES ('delete', old.rowid, old.Sno, old.Sname);
+        INSERT INTO students_fts(rowid, Sno, Sname) VALUES (new.rowid, new.Sno, new.Sname);
+    END""",
+]
+
+# 扩展不可用（未安装或无权限）时跳过，检索退化为顺序扫描
+POSTGRES_DDL = [
+    """DO $$ BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN OTHERS THEN
+        RAISE NOTICE 'pg_trgm unavailable';
+    END $$""",
+    """DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+            CREATE INDEX IF NOT EXISTS ix_students_sname_trgm ON students USING gin ("Sname" gin_trgm_ops);
+            CREATE INDEX IF NOT EXISTS ix_students_sno_trgm ON students USING gin ("Sno" gin_trgm_ops);
+        END IF;
+    END $$""",
+]
+
+# 建表后创建检索结构；旧库由 init_db 调用 install 补建
+for _stmt in SQLITE_DDL:
+    event.listen(models.Student.__table__, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+for _stmt in POSTGRES_DDL:
+    event.listen(models.Student.__table__, "after_create", DDL(_stmt).execute_if(dialect="postgresql"))
+event.listen(models.Student.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS students_fts").execute_if(dialect="sqlite"))
+
+def install(engine):
+    stmts = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(engine.dialect.name, [])
+    with engine.begin() as conn:
+        for stmt in stmts:
+            conn.execute(text(stmt))
+
+# 按 students 表重建全文索引
+def rebuild(engine):
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO students_fts(students_fts) VALUES ('rebuild')"))
+
+_fts = table("students_fts", column("rowid"), column("Sno"))
+
+# 同时适用于 Session 与 AsyncSession
+def _dialect(db) -> str:
+    return db.get_bind().dialect.name
+
+def _use_fts(db, q: str) -> bool:
+    return _dialect(db) == "sqlite" and len(q) >= MIN_FTS_LEN
+
+# FTS5 查询串：整体作为短语，trigram 下即子串匹配
+def _fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+# LIKE 子串匹配的模式（PostgreSQL）：q 中的 \、%、_ 按字面匹配（配合 escape="\\"）
+def _like_pattern(q: str) -> str:
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+# 前缀匹配改写为范围条件，可直接使用索引（LIKE 'x%' 在 SQLite 默认排序规则下无法走索引）
+def prefix_range(col, prefix: str):
+    return col >= prefix, col < prefix + "\U0010ffff"
+
+# 学号或姓名包含 q（短查询为以 q 开头）的过滤条件，可用于任意包含 students 的查询
+def student_filter(db, q: str):
+    if len(q) < MIN_FTS_LEN:
+        return or_(and_(*prefix_range(models.Student.Sno, q)), and_(*prefix_range(models.Student.Sname, q)))
+    if _use_fts(db, q):
+        return models.Student.Sno.in_(
+            select(_fts.c.Sno).where(text("students_fts MATCH :fts_q").bindparams(fts_q=_fts_phrase(q)))
+        )
+    like = _like_pattern(q)
+    if _dialect(db) == "postgresql":
+        return or_(models.Student.Sno.like(like, escape="\\"), models.Student.Sname.ilike(like, escape="\\"))
+    return or_(models.Student.Sno.like(like, escape="\\"), models.Student.Sname.like(like, escape="\\"))
+
+# 检索学生并按相关度排序（学号/姓名完全相同者优先），offset 分页；多取一行用于判断是否有下一页
+def search_students(db: Session, q: str, *, limit: int, offset: int = 0):
+    exact = (models.Student.Sno == q) | (models.Student.Sname == q)
+    if _use_fts(db, q):
+        rank = text("bm25(students_fts)")
+        stmt = select(models.Student).join(
+            _fts, _fts.c.rowid == literal_column("students.rowid")
+        ).where(text("students_fts MATCH :fts_q").bindparams(fts_q=_fts_phrase(q))
+        ).order_by(exact.desc(), rank, models.Student.Sno)
+    elif _dialect(db) == "postgresql":
+        # 匹配位置越靠前越相关（不依赖 pg_trgm 的 similarity）
+        pos = func.strpos(func.lower(models.Student.Sname), q.lower())
+        stmt = select(models.Student).where(student_filter(db, q)).order_by(exact.desc(), pos, models.Student.Sno)
+    else:
+        stmt = select(models.Student).where(student_filter(db, q)).order_by(exact.desc(), models.Student.Sno)
+    rows = db.execute(stmt.limit(limit + 1).offset(offset)).scalars().all()
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,227 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from sqlalchemy import and_, event, func, select, tuple_
+from sqlalchemy.orm import Session
+from . import cache, config, deps, models
+
+# 选课人数推送（GET /api/student/courses/stream，Server-Sent Events）：
+# 改变人数或容量的写函数在事务内登记 (Cno, Ctno)，提交后经缓存失效总线通知所有 worker（cache.seats_changed）。
+# 每个 worker 一个定时任务，每 SEATS_TICK_MS 取出期间有变化的课程，一次查询读出当前人数与容量，
+# 与上一次推送的值比较后只编码真正变化的课程（一个 tick 内的选课 + 退课相互抵消），
+# 同一份字节依次放入各连接的队列：查询与编码只与变化的课程数有关，连接数只影响入队次数，
+# 没有变化的 tick 不做任何事。空闲连接不占用定时器，心跳同样由该任务统一下发。
+# 推送的是当前人数（绝对值），重复或乱序的通知不会导致计数错误；另每 SEATS_RESYNC_S 全量重读一次，
+# 补上总线丢失的事件。
+
+log = logging.getLogger(__name__)
+
+_INFO_KEY = "changed_seats"
+
+# 在写事务内登记人数 / 容量有变化的课程，提交后通知（回滚时作废）
+def touch(db: Session, *pairs: tuple[str, str]):
+    db.info.setdefault(_INFO_KEY, set()).update(pairs)
+
+@event.listens_for(Session, "after_commit")
+def _notify_on_commit(session: Session):
+    pairs = session.info.pop(_INFO_KEY, None)
+    if pairs:
+        cache.seats_changed(*pairs)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session):
+    session.info.pop(_INFO_KEY, None)
+
+def _frame(event_name: str, seq: int, data) -> bytes:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {seq}\nevent: {event_name}\ndata: {body}\n\n".encode()
+
+# 客户端断线后 3 秒重连
+RETRY = b"retry: 3000\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+class TooManyClients(Exception):
+    pass
+
+class Subscriber:
+    __slots__ = ("frames", "wakeup")
+
+    def __init__(self):
+        self.frames: deque[bytes] = deque()
+        self.wakeup = asyncio.Event()
+
+    def push(self, frame: bytes, resync: bytes):
+        if len(self.frames) >= config.SEATS_QUEUE_MAX:
+            # 客户端读取过慢：丢弃积压，改为通知其重新拉取课程列表
+            self.frames.clear()
+            frame = resync
+        self.frames.append(frame)
+        self.wakeup.set()
+
+def _seats_query(pairs=None):
+    C, S = models.Course, models.CourseStat
+    q = select(C.Cno, C.Ctno, func.coalesce(S.enrolled, 0), C.Ccapacity).outerjoin(
+        S, and_(S.Cno == C.Cno, S.Ctno == C.Ctno))
+    if pairs is not None:
+        q = q.where(tuple_(C.Cno, C.Ctno).in_(pairs))
+    return q
+
+class Broadcaster:
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self.seats: dict[tuple[str, str], tuple[int, int | None]] = {}   # (Cno, Ctno) -> (人数, 容量)
+        self.seq = 0
+        self._pending: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._snapshot: bytes | None = None
+        self._task: asyncio.Task | None = None
+        self.ticks = self.frames = self.changes = 0
+        self.fanout_s = 0.0
+
+    # 订阅回调：本地提交与总线线程都会调用，只记录键
+    def note(self, pairs):
+        with self._lock:
+            self._pending.update(tuple(p) for p in pairs)
+
+    def full(self) -> bool:
+        return len(self.subscribers) >= config.SEATS_MAX_CLIENTS
+
+    def subscribe(self) -> Subscriber:
+        if self.full():
+            raise TooManyClients()
+        sub = Subscriber()
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    # 全部课程的当前人数（连接时 snapshot=1 使用），数据变化前重复使用同一帧
+    def snapshot(self) -> bytes:
+        if self._snapshot is None:
+            self._snapshot = _frame("snapshot", self.seq, {"seq": self.seq, "seats": [
+                {"Cno": Cno, "Ctno": Ctno, "enrolled": n, "Ccapacity": cap}
+                for (Cno, Ctno), (n, cap) in self.seats.items()]})
+        return self._snapshot
+
+    async def _read(self, pairs: list | None) -> dict:
+        async with deps.get_async_sessionmaker()() as db:
+            if pairs is None:
+                rows = (await db.execute(_seats_query())).all()
+            else:
+                rows = []
+                for i in range(0, len(pairs), 500):
+                    rows += (await db.execute(_seats_query(pairs[i:i + 500]))).all()
+        return {(Cno, Ctno): (n, cap) for Cno, Ctno, n, cap in rows}
+
+    # 读取课程当前值并与已推送的值比较，返回变化的课程；pairs 为 None 时全量重读
+    async def refresh(self, pairs: list | None = None) -> list[dict]:
+        fresh = await self._read(pairs)
+        keys = self.seats.keys() | fresh.keys() if pairs is None else pairs
+        changed = []
+        for key in keys:
+            new = fresh.get(key)
+            if new == self.seats.get(key):
+                continue
+            if new is None:
+                # 课程已删除：客户端在课程目录变化时会重新拉取列表，这里只移除
+                del self.seats[key]
+                continue
+            self.seats[key] = new
+            changed.append({"Cno": key[0], "Ctno": key[1], "enrolled": new[0], "Ccapacity": new[1]})
+        return changed
+
+    def publish(self, changed: list[dict]):
+        self.seq += 1
+        self._snapshot = None
+        frame = _frame("seats", self.seq, {"seq": self.seq, "ts": round(time.time(), 3), "seats": changed})
+        self._fanout(frame)
+        self.frames += 1
+        self.changes += len(changed)
+
+    def _fanout(self, frame: bytes):
+        t0 = time.perf_counter()
+        resync = _frame("resync", self.seq, {"seq": self.seq})
+        for sub in self.subscribers:
+            sub.push(frame, resync)
+        self.fanout_s += time.perf_counter() - t0
+
+    async def run(self):
+        self.seats = {}
+        await self.refresh()
+        last_full = last_frame = time.monotonic()
+        while True:
+            await asyncio.sleep(config.SEATS_TICK_MS / 1000)
+            self.ticks += 1
+            now = time.monotonic()
+            with self._lock:
+                pairs, self._pending = self._pending, set()
+            try:
+                if config.SEATS_RESYNC_S > 0 and now - last_full >= config.SEATS_RESYNC_S:
+                    changed = await self.refresh()
+                    last_full = now
+                elif pairs:
+                    changed = await self.refresh(list(pairs))
+                else:
+                    changed = []
+            except Exception:
+                log.exception("读取选课人数失败")
+                self.note(pairs)
+                continue
+            if changed:
+                self.publish(changed)
+                last_frame = now
+            elif self.subscribers and now - last_frame >= config.SEATS_KEEPALIVE_S:
+                self._fanout(KEEPALIVE)
+                last_frame = now
+
+    def stats(self) -> dict:
+        return {"clients": len(self.subscribers), "courses": len(self.seats), "seq": self.seq,
+                "ticks": self.ticks, "frames": self.frames, "changes": self.changes,
+                "fanout_ms": round(self.fanout_s * 1000, 2), "pending": len(self._pending)}
+
+broadcaster = Broadcaster()
+
+# 连接的输出流：连接建立后先发 retry（与可选的全量快照），之后把队列中积压的帧合并为一次写出。
+# 在开始输出时才订阅：响应未开始（客户端已断开）时不会留下订阅；此时连接数已满则只发 retry 后结束，客户端稍后重连
+async def stream(snapshot: bool = False):
+    try:
+        sub = broadcaster.subscribe()
+    except TooManyClients:
+        yield RETRY
+        return
+    try:
+        yield RETRY + (broadcaster.snapshot() if snapshot else b"")
+        while True:
+            await sub.wakeup.wait()
+            sub.wakeup.clear()
+            chunk = b"".join(sub.frames)
+            sub.frames.clear()
+            yield chunk
+    finally:
+        broadcaster.unsubscribe(sub)
+
+def running() -> bool:
+    return broadcaster._task is not None and not broadcaster._task.done()
+
+async def start():
+    if not config.SEATS_PUSH or broadcaster._task is not None:
+        return
+    cache.subscribers.setdefault("seats", []).append(broadcaster.note)
+    broadcaster._task = asyncio.create_task(broadcaster.run(), name="seats-broadcaster")
+
+async def stop():
+    task, broadcaster._task = broadcaster._task, None
+    if task is None:
+        return
+    if broadcaster.note in cache.subscribers.get("seats", ()):
+        cache.subscribers["seats"].remove(broadcaster.note)
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
@@ -0,0 +1,153 @@
+from __future__ import annotations
+import argparse
+import random
+import sys
+import time
+from sqlalchemy import bindparam, func, insert, select, update
+from .deps import SessionLocal
+from . import deps, models, crud, search, versions, config
+from .auth import get_password_hash
+
+# 合成数据生成：python -m app.seed --scale large
+# 按固定随机种子生成学生、教师、课程与选课记录（含成绩），相同参数得到相同数据；
+# 各表以批量 INSERT（executemany）写入，选课计数随生成直接写入，成绩汇总与检索索引在写入后一次性重建。
+# 全部账号使用同一密码（默认 DEFAULT_PASSWORD），哈希只计算一次。
+# 账号编号规则见 student_no / teacher_no，压测脚本（bench.py）据此登录。
+
+ADMIN = ("12345678", "admin123")
+
+SCALES = {   # 学生, 教师, 课程, 选课记录
+    "small": (2000, 100, 300, 40000),
+    "medium": (10000, 500, 1000, 200000),
+    "large": (50000, 2000, 5000, 1000000),
+}
+
+DEPTS = ("计算机科学", "软件工程", "电子信息", "数学", "物理", "化学", "经济学", "工商管理", "外国语", "法学")
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈"
+GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬芳燕彩春菊兰凤洁梅琳素云莲真环雪荣爱妹霞香月莺媛艳瑞凡佳嘉琼勤珍贞莉桂娣叶璧璐娅琦晶妍茜秋珊莎锦黛青倩婷姣婉娴瑾颖露瑶怡婵雁蓓纨仪荷丹蓉眉君琴蕊薇菁梦岚苑婕馨瑗琰韵融园艺咏卿聪澜纯毓悦昭冰爽琬茗羽希宁欣飘育滢馥筠柔竹霭凝晓欢霄枫芸菲寒伊亚宜可姬舒影荔枝思丽"
+SUBJECTS = ("数据结构", "操作系统", "数据库系统", "计算机网络", "编译原理", "高等数学", "线性代数", "概率论",
+            "大学物理", "有机化学", "微观经济学", "管理学原理", "大学英语", "法理学", "软件工程导论", "信号与系统")
+CREDITS = (1.0, 1.5, 2.0, 2.5, 3.0, 4.0)
+
+def student_no(i: int) -> str:
+    return f"{20000000 + i}"
+
+def teacher_no(i: int) -> str:
+    return f"000{i:05d}"
+
+def course_no(i: int) -> str:
+    return f"C{i:05d}"
+
+def _name(rng: random.Random) -> str:
+    return rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+
+def _grade(rng: random.Random) -> int | None:
+    if rng.random() < 0.3:
+        return None
+    return max(0, min(100, round(rng.gauss(76, 12))))
+
+def _insert(conn, table, rows: list[dict], batch: int):
+    for i in range(0, len(rows), batch):
+        conn.execute(insert(table), rows[i:i + batch])
+
+def generate(students: int, teachers: int, courses: int, enrollments: int, *,
+             seed: int = 42, password: str = config.DEFAULT_PASSWORD, batch: int = 5000, log=print):
+    rng = random.Random(seed)
+    pw_hash = get_password_hash(password)
+    per_student = min(courses, max(1, round(enrollments / max(students, 1))))
+    t0 = time.perf_counter()
+
+    with deps.engine.begin() as conn:
+        users = [{"account_no": teacher_no(i), "password_hash": pw_hash, "role": "teacher"} for i in range(teachers)]
+        users += [{"account_no": student_no(i), "password_hash": pw_hash, "role": "student"} for i in range(students)]
+        _insert(conn, models.User.__table__, users, batch)
+        _insert(conn, models.Teacher.__table__, [
+            {"Tno": teacher_no(i), "Tname": _name(rng), "Tdept": rng.choice(DEPTS), "Tsex": rng.choice("男女")}
+            for i in range(teachers)], batch)
+        _insert(conn, models.Student.__table__, [
+            {"Sno": student_no(i), "Sname": _name(rng), "Ssex": rng.choice("男女"),
+             "Sdept": rng.choice(DEPTS), "Sage": rng.randint(17, 25)}
+            for i in range(students)], batch)
+        log(f"账号与档案：{students} 名学生，{teachers} 名教师（{time.perf_counter() - t0:.1f}s）")
+
+        course_rows = [{"Cno": course_no(i), "Ctno": teacher_no(rng.randrange(teachers)),
+                        "Cname": f"{rng.choice(SUBJECTS)}（{i}）", "Ccredit": rng.choice(CREDITS),
+                        "Ccapacity": None} for i in range(courses)]
+        _insert(conn, models.Course.__table__, course_rows, batch)
+        counts = [0] * courses
+        chunk: list[dict] = []
+        for s in range(students):
+            Sno = student_no(s)
+            for c in rng.sample(range(courses), per_student):
+                counts[c] += 1
+                chunk.append({"Sno": Sno, "Cno": course_rows[c]["Cno"], "Tno": course_rows[c]["Ctno"],
+                              "grade": _grade(rng)})
+            if len(chunk) >= batch * 4:
+                _insert(conn, models.SC.__table__, chunk, batch)
+                chunk.clear()
+        _insert(conn, models.SC.__table__, chunk, batch)
+        # 计数器按生成时的人数直接写入；容量在实际人数上留余量，约三成课程不限容量
+        _insert(conn, models.CourseStat.__table__, [
+            {"Cno": row["Cno"], "Ctno": row["Ctno"], "enrolled": n} for row, n in zip(course_rows, counts)], batch)
+        t = models.Course.__table__
+        caps = [{"b_Cno": row["Cno"], "b_Ctno": row["Ctno"], "cap": n + rng.randint(20, 200)}
+                for row, n in zip(course_rows, counts) if rng.random() >= 0.3]
+        for i in range(0, len(caps), batch):
+            conn.execute(update(t).where(t.c.Cno == bindparam("b_Cno"), t.c.Ctno == bindparam("b_Ctno"))
+                         .values(Ccapacity=bindparam("cap")), caps[i:i + batch])
+        log(f"课程与选课：{courses} 门课程，{sum(counts)} 条选课记录（{time.perf_counter() - t0:.1f}s）")
+
+    db = SessionLocal()
+    try:
+        crud.rebuild_student_summaries(db)
+        versions.touch(db, *versions.SCOPES)
+        db.commit()
+    finally:
+        db.close()
+    search.rebuild(deps.engine)
+    log(f"成绩汇总与检索索引已重建（共 {time.perf_counter() - t0:.1f}s）")
+
+def _ensure_admin():
+    db = SessionLocal()
+    try:
+        if not crud.get_user_by_account(db, ADMIN[0]):
+            crud.create_user(db, *ADMIN, "admin")
+    finally:
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成数据（学生 / 教师 / 课程 / 选课记录）")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--teachers", type=int)
+    parser.add_argument("--courses", type=int)
+    parser.add_argument("--enrollments", type=int, help="选课记录总数（按学生平均分配）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default=config.DEFAULT_PASSWORD, help="所有生成账号的密码")
+    parser.add_argument("--reset", action="store_true", help="先删除并重建全部表（会清空现有数据）")
+    args = parser.parse_args(argv)
+    students, teachers, courses, enrollments = SCALES[args.scale]
+    students = args.students or students
+    teachers = args.teachers or teachers
+    courses = args.courses or courses
+    enrollments = args.enrollments if args.enrollments is not None else enrollments
+
+    engine = deps.engine
+    if deps.DB_PATH is not None:
+        deps.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if args.reset:
+        models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    search.install(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(models.Student.__table__)).scalar()
+    if existing:
+        print(f"数据库中已有 {existing} 名学生；如需重新生成请加 --reset")
+        return 1
+    _ensure_admin()
+    generate(students, teachers, courses, enrollments, seed=args.seed, password=args.password)
+    print(f"管理员：{ADMIN[0]} / {ADMIN[1]}；学生 {student_no(0)}… / 教师 {teacher_no(0)}… 密码 {args.password}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import random
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from . import models
+
+# 数据版本号：按范围（scope）记录写入次数，读取只需一次主键查询，用于生成 ETag。
+# 写函数在事务内调用 touch() 登记受影响的范围，提交前统一加一（同一事务只加一次），
+# 与数据变更原子生效；事务回滚时登记作废。
+
+COURSES = "courses"          # 课程目录（增删、容量）
+ENROLLMENTS = "enrollments"  # 选课记录、成绩与选课人数
+STUDENTS = "students"        # 学生档案
+TEACHERS = "teachers"        # 教师档案
+TOKENS = "tokens"            # 令牌吊销（users.token_version）
+SCOPES = (COURSES, ENROLLMENTS, STUDENTS, TEACHERS, TOKENS)
+
+# 选课 / 成绩写入频繁：其版本号拆成多行（分片，行名 enrollments、enrollments#1 …），
+# 写事务随机选一行加一，读取时求和。单行计数会让所有选课 / 成绩事务在这一行的行锁上排队，
+# 分片后并发事务只有选中同一行时才互相等待；求和随每次提交严格递增，ETag 语义不变。
+SHARDS = {ENROLLMENTS: 16}
+
+_INFO_KEY = "touched_versions"
+
+def _rows(scope: str) -> list[str]:
+    return [scope] + [f"{scope}#{i}" for i in range(1, SHARDS.get(scope, 1))]
+
+def touch(db: Session, *scopes: str):
+    db.info.setdefault(_INFO_KEY, set()).update(scopes)
+
+@event.listens_for(Session, "before_commit")
+def _bump_on_commit(session: Session):
+    scopes = session.info.pop(_INFO_KEY, None)
+    if not scopes:
+        return
+    # 固定顺序加锁，避免并发事务互相等待
+    for scope in sorted(scopes):
+        # 分片行缺失（旧库，init_db 会补建）时退回首行
+        for name in dict.fromkeys([random.choice(_rows(scope)), scope]):
+            res = session.execute(update(models.TableVersion).where(models.TableVersion.name == name)
+                                  .values(version=models.TableVersion.version + 1))
+            if res.rowcount:
+                break
+        else:
+            session.add(models.TableVersion(name=scope, version=1))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session):
+    session.info.pop(_INFO_KEY, None)
+
+# 建表时写入各范围（含分片）的初始行
+@event.listens_for(models.TableVersion.__table__, "after_create")
+def _seed(target, connection, **kw):
+    connection.execute(insert(target), [{"name": n, "version": 0} for s in SCOPES for n in _rows(s)])
+
+# 为旧库补建缺失的行（init_db 调用）
+def install(engine):
+    t = models.TableVersion.__table__
+    with engine.begin() as conn:
+        existing = set(conn.execute(select(t.c.name)).scalars())
+        missing = [{"name": n, "version": 0} for s in SCOPES for n in _rows(s) if n not in existing]
+        if missing:
+            conn.execute(insert(t), missing)
+
+def _query(scopes):
+    return select(models.TableVersion.name, models.TableVersion.version).where(
+        models.TableVersion.name.in_([n for s in scopes for n in _rows(s)]))
+
+# 各分片求和，返回与 scopes 顺序一致的元组（缺失视为 0）
+def _sum(rows, scopes) -> tuple[int, ...]:
+    totals = dict.fromkeys(scopes, 0)
+    for name, version in rows:
+        totals[name.split("#", 1)[0]] += version
+    return tuple(totals[s] for s in scopes)
+
+# 读取版本号
+def get(db: Session, *scopes: str) -> tuple[int, ...]:
+    return _sum(db.execute(_query(scopes)).all(), scopes)
+
+async def get_async(db, *scopes: str) -> tuple[int, ...]:
+    return _sum((await db.execute(_query(scopes))).all(), scopes)
@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+# 测试环境：须在导入 app 之前设置（配置在导入时读取）
+_TMP = tempfile.mkdtemp(prefix="simms-test-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP}/app.db")
+os.environ["CACHE_BUS"] = "none"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["AUTH_REVOCATION_SYNC_S"] = "0"
+os.environ["DB_MAINTENANCE_INTERVAL_S"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from app import analytics, auth, cache, crud, deps, idempotency, main, models, revocation, search
+
+# 参与测试的数据库：总是包含临时 SQLite 库；TEST_DATABASE_URLS（逗号分隔）可追加其他数据库，
+# 如本机 PostgreSQL：postgresql+psycopg://postgres:@/simms_test?host=/tmp。其中的表会被删除重建。
+def _database_urls() -> list[str]:
+    urls = [f"sqlite:///{_TMP}/test.db"]
+    urls += [u.strip() for u in os.environ.get("TEST_DATABASE_URLS", "").split(",") if u.strip()]
+    return urls
+
+def _dialect(url: str) -> str:
+    return url.split(":", 1)[0].split("+", 1)[0]
+
+@pytest.fixture(scope="session", params=_database_urls(), ids=_dialect)
+def database(request):
+    deps.rebind(request.param)
+    models.Base.metadata.drop_all(bind=deps.engine)
+    models.Base.metadata.create_all(bind=deps.engine)
+    search.install(deps.engine)
+    yield request.param
+    deps.engine.dispose()
+
+def _reset_process_state():
+    cache.clear()
+    analytics._cache.clear()
+    auth._verified.clear()
+    idempotency.recent.clear()
+    revocation._min_versions.clear()
+    revocation._synced = None
+
+# 清空各表（保留 table_versions 的各范围行）与进程内缓存
+def reset_database():
+    with deps.engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name != models.TableVersion.__tablename__:
+                conn.execute(delete(table))
+    search.rebuild(deps.engine)
+    _reset_process_state()
+
+# 每个测试使用空库
+@pytest.fixture
+def db(database):
+    reset_database()
+    session = deps.SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def client(db):
+    return TestClient(main.app)
+
+def login(client, account_no: str, password: str = "123456") -> dict:
+    r = client.post("/api/auth/login", data={"username": account_no, "password": password})
+    assert r.status_code == 200, r.text
+    return {"Authorization": "Bearer " + r.json()["access_token"]}
+
+# 小型样例数据：管理员、3 名教师、5 名学生、4 门课程；学生 20230000 选全部课程，20230001 选 C0
+@pytest.fixture
+def sample(client, db):
+    crud.create_user(db, "12345678", "admin123", "admin")
+    A = login(client, "12345678", "admin123")
+    for i in range(3):
+        r = client.post("/api/admin/users", json={"account_no": f"0000000{i}", "role": "teacher", "Tname": f"T{i}"},
+                        headers=A)
+        assert r.status_code == 200, r.text
+    for i in range(5):
+        r = client.post("/api/admin/users", json={"account_no": f"2023000{i}", "role": "student", "Sname": f"学生{i}",
+                                                  "Ssex": "男", "Sdept": "CS" if i % 2 else "EE", "Sage": 20}, headers=A)
+        assert r.status_code == 200, r.text
+    for i in range(4):
+        r = client.post("/api/admin/courses", json={"Cno": f"C{i}", "Ctno": f"0000000{i % 3}", "Cname": f"课程{i}",
+                                                    "Ccredit": 2 + i % 2}, headers=A)
+        assert r.status_code == 200, r.text
+    S = login(client, "20230000")
+    for i in range(4):
+        assert client.post("/api/student/enroll", json={"Cno": f"C{i}", "Tno": f"0000000{i % 3}"},
+                           headers=S).status_code == 200
+    S1 = login(client, "20230001")
+    assert client.post("/api/student/enroll", json={"Cno": "C0", "Tno": "00000000"}, headers=S1).status_code == 200
+    return {"admin": A, "student": S, "student1": S1, "teacher": login(client, "00000000")}
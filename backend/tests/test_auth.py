@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from app import auth, config, revocation, versions
+from conftest import login
+
+# PASSWORD_HASH_WORKERS=0（测试环境的设置）时哈希在线程池中计算，不阻塞事件循环
+def test_hashing_without_process_pool_runs_off_the_event_loop():
+    assert config.PASSWORD_HASH_WORKERS == 0
+
+    async def run():
+        loop_thread = threading.get_ident()
+        worker = await asyncio.wrap_future(auth._submit(threading.get_ident))
+        hashed = await auth.get_password_hash_async("secret")
+        return loop_thread, worker, await auth.verify_and_update_async("secret", hashed)
+    loop_thread, worker, (ok, new_hash) = asyncio.run(run())
+    assert worker != loop_thread
+    assert ok and new_hash is None
+    assert auth.pending_hashes() == 0
+
+# 批量哈希按实际工作者数（线程池模式为 CPU 核数）切块，排队数按密码个数计且不超过上限
+def test_batch_hashing_is_chunked_per_worker_and_bounded_per_password(monkeypatch):
+    auth.shutdown_hash_pool()
+    monkeypatch.setattr(auth.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(config, "PASSWORD_HASH_MAX_PENDING", 6)
+    submitted = []
+    try_submit = auth._try_submit
+
+    def spy(fn, *args, weight=1):
+        fut = try_submit(fn, *args, weight=weight)
+        if fut is not None:
+            submitted.append((len(args[0]), auth.pending_hashes()))
+        return fut
+    monkeypatch.setattr(auth, "_try_submit", spy)
+    pws = [f"pw{i}" for i in range(10)]
+    try:
+        hashes = asyncio.run(auth.hash_passwords_async(pws))
+    finally:
+        auth.shutdown_hash_pool()
+    assert [n for n, _ in submitted] == [3, 3, 3, 1]
+    assert max(pending for _, pending in submitted) <= 6
+    assert all(auth.pwd_ctx.verify(pw, h) for pw, h in zip(pws, hashes))
+    assert auth.pending_hashes() == 0
+
+def test_single_hash_is_rejected_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(config, "PASSWORD_HASH_MAX_PENDING", 0)
+    with pytest.raises(HTTPException) as e:
+        auth._submit(threading.get_ident)
+    assert e.value.status_code == 503
+
+# ========== 令牌校验缓存与吊销 ==========
+
+def test_verified_claims_are_cached(client, sample, monkeypatch):
+    decoded = []
+    decode = auth._decode
+    monkeypatch.setattr(auth, "_decode", lambda token: decoded.append(token) or decode(token))
+    S = login(client, "20230002")
+    for _ in range(3):
+        r = client.get("/api/auth/me", headers=S)
+        assert r.status_code == 200 and r.json()["account_no"] == "20230002"
+    assert len(decoded) == 1
+
+def test_change_password_revokes_cached_tokens(client, sample):
+    S = login(client, "20230002")
+    assert client.get("/api/auth/me", headers=S).status_code == 200
+    r = client.post("/api/auth/change-password", json={"old_password": "123456", "new_password": "654321"}, headers=S)
+    assert r.status_code == 200, r.text
+    assert client.get("/api/auth/me", headers=S).status_code == 401
+    assert client.get("/api/auth/me", headers=login(client, "20230002", "654321")).status_code == 200
+
+def test_admin_reset_revokes_cached_tokens(client, sample):
+    S = login(client, "20230002")
+    assert client.get("/api/auth/me", headers=S).status_code == 200
+    r = client.post("/api/admin/users/reset-password", json={"account_no": "20230002"}, headers=sample["admin"])
+    assert r.status_code == 200
+    assert client.get("/api/auth/me", headers=S).status_code == 401
+    assert client.get("/api/auth/me", headers=login(client, "20230002")).status_code == 200
+
+def test_cached_token_expires(client, sample):
+    token = auth.create_access_token({"account_no": "20230002", "role": "student"}, minutes=1 / 60)
+    headers = {"Authorization": f"Bearer {token}"}
+    r = client.get("/api/auth/me", headers=headers)
+    assert r.status_code == 200
+    # exp 为整秒，JWT 库在 exp 所在的那一秒内仍接受该令牌
+    time.sleep(max(0.0, r.json()["exp"] + 1.1 - time.time()))
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+# 重载名单期间本进程的吊销不会被较早的查询结果覆盖
+def test_revocation_noted_during_sync_is_kept(db, monkeypatch):
+    get = versions.get
+
+    def get_then_revoke(session, *scopes):
+        result = get(session, *scopes)
+        revocation.note("20239999", 3)
+        return result
+    monkeypatch.setattr(revocation, "_synced", None)
+    monkeypatch.setattr(versions, "get", get_then_revoke)
+    assert revocation.sync(db)
+    assert revocation.is_revoked("20239999", 2) and not revocation.is_revoked("20239999", 3)
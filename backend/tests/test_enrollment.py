@@ -0,0 +1,141 @@
+import pytest
+from concurrent.futures import Future
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import cache, crud, deps, enroll_queue, idempotency, models
+from conftest import login
+
+def _consistent(db):
+    assert crud.verify_enrolled_counts(db) == {}
+    assert not crud.verify_student_summaries(db)
+
+def test_enroll_unenroll_keeps_counters(client, sample, db):
+    S1, A = sample["student1"], sample["admin"]
+    courses = {c["Cno"]: c for c in client.get("/api/student/courses", headers=S1).json()}
+    assert courses["C0"]["enrolled"] == 2 and courses["C0"]["selected"]
+    assert client.post("/api/student/enroll", json={"Cno": "C0", "Tno": "00000000"}, headers=S1).status_code == 409
+    assert client.delete("/api/student/enroll/C0/00000000", headers=S1).status_code == 200
+    assert client.delete("/api/student/enroll/C0/00000000", headers=S1).status_code == 404
+    _consistent(db)
+
+    assert client.put("/api/admin/courses/C1/00000001/capacity", json={"Ccapacity": 2}, headers=A).status_code == 200
+    assert client.post("/api/student/enroll", json={"Cno": "C1", "Tno": "00000001"}, headers=S1).status_code == 200
+    S2 = login(client, "20230002")
+    r = client.post("/api/student/enroll", json={"Cno": "C1", "Tno": "00000001"}, headers=S2)
+    assert r.status_code == 409 and r.json()["detail"] == "课程已满"
+    _consistent(db)
+
+def test_grades_and_cascading_deletes_keep_summaries(client, sample, db):
+    A, T = sample["admin"], sample["teacher"]
+    assert client.put("/api/teacher/enrollments/20230000/C0/grade", json={"grade": "88"}, headers=T).status_code == 200
+    assert client.put("/api/admin/enrollments/20230000/C1/00000001/grade", json={"grade": "55"},
+                      headers=A).status_code == 200
+    _consistent(db)
+    gpa = client.get("/api/student/analytics/gpa", headers=sample["student"]).json()
+    assert gpa["graded"] == 2 and gpa["courses"] == 4
+    assert client.delete("/api/admin/enrollments/20230000/C1/00000001", headers=A).status_code == 200
+    _consistent(db)
+    assert client.delete("/api/admin/courses/C2/00000002", headers=A).status_code == 200
+    _consistent(db)
+    assert client.delete("/api/admin/users/00000000", headers=A).status_code == 200
+    _consistent(db)
+    assert client.get("/api/student/analytics/gpa", headers=sample["student"]).json()["courses"] == 0
+
+# 在被测会话第一次读取 sc.grade 之后、写入之前，由另一个会话提交一次改成绩（模拟并发写入）
+def _interleave_grade_change(db, Sno, Cno, Tno, grade):
+    fired = []
+
+    @event.listens_for(db, "do_orm_execute")
+    def hook(state):
+        if fired or not state.is_select or "sc.grade" not in str(state.statement):
+            return
+        fired.append(True)
+        result = state.invoke_statement()
+        other = deps.SessionLocal()
+        try:
+            crud.set_grade(other, Sno, Cno, Tno, grade)
+        finally:
+            other.close()
+        return result
+    return fired
+
+def test_admin_unenroll_races_with_grade_change(client, sample, db):
+    fired = _interleave_grade_change(db, "20230000", "C1", "00000001", 95)
+    assert crud.admin_unenroll(db, "20230000", "C1", "00000001")
+    assert fired
+    _consistent(db)
+
+def test_cascading_deletes_race_with_grade_change(client, sample, db):
+    _interleave_grade_change(db, "20230000", "C2", "00000002", 77)
+    assert crud.delete_course(db, "C2", "00000002")
+    _consistent(db)
+    _interleave_grade_change(db, "20230000", "C1", "00000001", 66)
+    assert crud.delete_user(db, "00000001")
+    _consistent(db)
+
+# 批量录入成绩：响应只构造、登记一次，重试（相同幂等键）返回同一结果且不再写入
+@pytest.mark.parametrize("items", [
+    [{"Sno": "20230000", "Cno": "C0", "grade": "90"}, {"Sno": "20230004", "Cno": "C0", "grade": "80"}],
+    [{"Sno": "20230000", "Cno": "C0", "grade": "abc"}],
+])
+def test_grade_batch_registers_response_once(client, sample, monkeypatch, items):
+    calls = []
+    respond = idempotency.respond
+    monkeypatch.setattr(idempotency, "respond", lambda *a, **kw: calls.append(a) or respond(*a, **kw))
+    headers = {**sample["teacher"], "Idempotency-Key": "batch-1"}
+    first = client.put("/api/teacher/grades", json={"items": items}, headers=headers)
+    assert first.status_code == 200 and len(calls) == 1
+    replay = client.put("/api/teacher/grades", json={"items": items}, headers=headers)
+    assert replay.json() == first.json() and len(calls) == 1
+
+# 选课队列：整批提交失败后逐条提交，每条请求各自得到结果；只有唯一键冲突记为重复选课
+def test_enroll_queue_resolves_each_request_on_fallback(sample, db):
+    locked = OperationalError("COMMIT", {}, Exception("database is locked"))
+    failures = iter([None, locked])   # 整批因外键失败回滚；逐条提交时第 2 条提交失败
+
+    def session_factory():
+        session = deps.SessionLocal()
+        commit = session.commit
+
+        def flaky_commit():
+            e = next(failures, None)
+            if e is not None:
+                raise e
+            commit()
+        session.commit = flaky_commit
+        return session
+
+    batch = [(Future(), "enroll", Sno, Cno, Tno) for Sno, Cno, Tno in [
+        ("20230002", "C0", "00000000"),   # 成功
+        ("20230003", "C1", "00000001"),   # 提交失败
+        ("29999999", "C0", "00000000"),   # 学生不存在：外键失败，不是重复选课
+        ("20230001", "C0", "00000000"),   # 已选该课
+    ]]
+    enroll_queue.EnrollQueue(session_factory)._process(batch)
+    assert batch[0][0].result() == enroll_queue.OK
+    assert isinstance(batch[1][0].exception(), OperationalError)
+    assert isinstance(batch[2][0].exception(), IntegrityError)
+    assert batch[3][0].result() == enroll_queue.DUPLICATE
+    assert crud.get_enrollment(db, "20230002", "C0", "00000000") is not None
+    assert crud.get_enrollment(db, "20230003", "C1", "00000001") is None
+    _consistent(db)
+
+def test_is_unique_violation(sample, db):
+    db.add(models.SC(Sno="20230000", Cno="C0", Tno="00000000"))
+    with pytest.raises(IntegrityError) as duplicate:
+        db.flush()
+    db.rollback()
+    db.add(models.SC(Sno="29999999", Cno="C0", Tno="00000000"))
+    with pytest.raises(IntegrityError) as missing:
+        db.flush()
+    db.rollback()
+    assert deps.is_unique_violation(duplicate.value) and not deps.is_unique_violation(missing.value)
+
+# 删除学生：按实际删除的选课记录扣减课程计数，并推送释放的名额
+def test_delete_student_releases_seats(client, sample, db, monkeypatch):
+    changed = []
+    monkeypatch.setattr(cache, "seats_changed", lambda *pairs: changed.extend(pairs))
+    assert crud.delete_user(db, "20230000")
+    assert set(changed) == {("C0", "00000000"), ("C1", "00000001"), ("C2", "00000002"), ("C3", "00000000")}
+    assert crud.get_enrolled_counts(db)[("C0", "00000000")] == 1
+    _consistent(db)
@@ -0,0 +1,38 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from app import config, export
+
+EXPECTED = {("20230000", f"C{i}", f"0000000{i % 3}") for i in range(4)} | {("20230001", "C0", "00000000")}
+
+def _parse(fmt: str, text: str) -> list[dict]:
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(text.lstrip("\ufeff"))))
+    return [json.loads(line) for line in text.splitlines()]
+
+# 小批量、小分块：导出分多块输出；gzip=true 下载 .gz 文件本身，不设 Content-Encoding
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+@pytest.mark.parametrize("compressed", [False, True])
+def test_export_streams_all_rows(client, sample, monkeypatch, fmt, compressed):
+    monkeypatch.setattr(config, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(config, "EXPORT_CHUNK_BYTES", 64)
+    with client.stream("GET", "/api/admin/enrollments/export", params={"format": fmt, "gzip": compressed},
+                       headers=sample["admin"]) as r:
+        assert r.status_code == 200
+        chunks = list(r.iter_raw())
+    # 测试客户端会把响应体合并为一块，分块本身直接检查生成器
+    assert len(list(export.stream_enrollments(fmt, gzip=compressed))) > 1
+    assert "content-encoding" not in r.headers
+    disposition = r.headers["content-disposition"]
+    if compressed:
+        assert r.headers["content-type"] == "application/gzip"
+        assert disposition.endswith(f'enrollments.{fmt}.gz"')
+        body = gzip.decompress(b"".join(chunks))
+    else:
+        assert r.headers["content-type"].startswith("text/csv" if fmt == "csv" else "application/x-ndjson")
+        assert disposition.endswith(f'enrollments.{fmt}"')
+        body = b"".join(chunks)
+    rows = _parse(fmt, body.decode())
+    assert {(r["Sno"], r["Cno"], r["Tno"]) for r in rows} == EXPECTED and len(rows) == len(EXPECTED)
@@ -0,0 +1,47 @@
+from app import http_cache
+
+def _get(client, path, headers, etag=None):
+    return client.get(path, headers={**headers, **({"If-None-Match": etag} if etag else {})})
+
+# If-None-Match 命中返回 304（无响应体，带同一 ETag 与策略）；写入之后 ETag 变化，旧 ETag 重新得到 200
+def test_matching_etag_returns_304_until_write(client, sample):
+    S = sample["student1"]
+    r = _get(client, "/api/student/courses", S)
+    assert r.status_code == 200 and r.headers["cache-control"] == http_cache.CATALOG
+    etag = r.headers["etag"]
+
+    r = _get(client, "/api/student/courses", S, etag)
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag and r.headers["cache-control"] == http_cache.CATALOG
+    assert _get(client, "/api/student/courses", S, f'W/{etag}, "other"').status_code == 304
+
+    assert client.post("/api/student/enroll", json={"Cno": "C1", "Tno": "00000001"}, headers=S).status_code == 200
+    r = _get(client, "/api/student/courses", S, etag)
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert next(c for c in r.json() if c["Cno"] == "C1")["selected"]
+
+# ETag 按账号区分：另一个学生拿同一 ETag 不会得到 304
+def test_etag_is_per_account(client, sample):
+    etag = _get(client, "/api/student/courses", sample["student"]).headers["etag"]
+    assert _get(client, "/api/student/courses", sample["student1"], etag).status_code == 200
+
+def test_routes_set_their_cache_policy(client, sample):
+    for path, headers, policy in [("/api/admin/courses", sample["admin"], http_cache.CATALOG),
+                                  ("/api/teacher/courses", sample["teacher"], http_cache.CATALOG),
+                                  ("/api/student/enrollments", sample["student"], http_cache.PER_USER),
+                                  ("/api/student/dashboard", sample["student"], http_cache.PER_USER),
+                                  ("/api/teacher/enrollments", sample["teacher"], http_cache.PER_USER),
+                                  ("/api/admin/students", sample["admin"], http_cache.PER_USER)]:
+        r = _get(client, path, headers)
+        assert r.status_code == 200, path
+        assert r.headers["cache-control"] == policy and "Authorization" in r.headers["vary"].split(", "), path
+
+# 改成绩只影响选课记录：学生的选课列表 ETag 变化
+def test_grade_change_invalidates_enrollments(client, sample):
+    S = sample["student"]
+    etag = _get(client, "/api/student/enrollments", S).headers["etag"]
+    assert _get(client, "/api/student/enrollments", S, etag).status_code == 304
+    r = client.put("/api/teacher/enrollments/20230000/C0/grade", json={"grade": "90"}, headers=sample["teacher"])
+    assert r.status_code == 200, r.text
+    r = _get(client, "/api/student/enrollments", S, etag)
+    assert r.status_code == 200 and r.headers["etag"] != etag
@@ -0,0 +1,63 @@
+import json
+import time
+from app import crud, deps, idempotency, models
+
+ENROLL = json.dumps({"Cno": "C1", "Tno": "00000001"}).encode()
+
+# 模拟另一个 worker：本请求查询幂等键之后、写入之前，同一请求在别处执行并提交了结果
+def _race_with_other_worker(monkeypatch, other_worker):
+    lookup = idempotency.lookup
+    raced = []
+
+    def racing_lookup(db, key):
+        if not raced:
+            raced.append(key)
+            session = deps.SessionLocal()
+            try:
+                other_worker(session, key)
+            finally:
+                session.close()
+            idempotency.recent.clear()   # 结果只在数据库中（其他 worker 的进程内缓存不共享）
+            return None
+        return lookup(db, key)
+    monkeypatch.setattr(idempotency, "lookup", racing_lookup)
+    return raced
+
+def test_enroll_retry_on_another_worker_replays_result(client, sample, db, monkeypatch):
+    S2 = {**sample["student1"], "Idempotency-Key": "enroll-1", "Content-Type": "application/json"}
+    fingerprint = idempotency._digest(b"POST", b"/api/student/enroll", ENROLL)
+
+    def other_worker(session, key):
+        session.info[idempotency._INFO_KEY] = idempotency.Pending(key, fingerprint)
+        idempotency.respond(session, {"ok": True})
+        crud.enroll(session, "20230001", "C1", "00000001")
+    raced = _race_with_other_worker(monkeypatch, other_worker)
+
+    r = client.post("/api/student/enroll", content=ENROLL, headers=S2)
+    assert raced
+    assert r.status_code == 200 and r.json() == {"ok": True}
+    assert r.headers.get("Idempotent-Replayed") == "true"
+    assert crud.verify_enrolled_counts(db) == {}
+
+# 写入本身不冲突时（改成绩），保存结果遇到 idempotency_keys 主键冲突：整体回滚并返回已保存的结果
+def test_key_conflict_rolls_back_and_replays(client, sample, db, monkeypatch):
+    body = json.dumps({"items": [{"Sno": "20230000", "Cno": "C0", "grade": "90"}]}).encode()
+    saved = '{"updated":1,"failed":0,"items":[]}'
+
+    def other_worker(session, key):
+        session.add(models.IdempotencyKey(
+            key=key, fingerprint=idempotency._digest(b"PUT", b"/api/teacher/grades", body),
+            status=200, body=saved, created_at=time.time()))
+        session.commit()
+    _race_with_other_worker(monkeypatch, other_worker)
+
+    r = client.put("/api/teacher/grades", content=body,
+                   headers={**sample["teacher"], "Idempotency-Key": "grades-1", "Content-Type": "application/json"})
+    assert r.status_code == 200 and r.text == saved
+    assert crud.get_enrollment(db, "20230000", "C0", "00000000").grade is None
+
+# 请求失败且没有已保存的结果时照常返回错误
+def test_failure_without_saved_result_is_not_replayed(client, sample):
+    r = client.post("/api/student/enroll", json={"Cno": "C0", "Tno": "00000000"},
+                    headers={**sample["student1"], "Idempotency-Key": "dup-1"})
+    assert r.status_code == 409
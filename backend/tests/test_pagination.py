@@ -0,0 +1,27 @@
+import pytest
+from app.pagination import decode_cursor, encode_cursor
+
+@pytest.mark.parametrize("values", [[{"a": 1}], [[1]], [True]])
+def test_decode_cursor_rejects_non_scalars(values):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(values), 1)
+
+def test_decode_cursor_accepts_scalars():
+    assert decode_cursor(encode_cursor(["a", 1, 2.5, None]), 4) == ["a", 1, 2.5, None]
+
+# 元素类型不对（对象、数组，或与排序列类型不符）时返回 400 而不是 500
+@pytest.mark.parametrize("values", [[{"a": 1}], [[1]], [1]])
+def test_list_rejects_malformed_cursor(client, sample, values):
+    r = client.get("/api/admin/students", params={"cursor": encode_cursor(values)}, headers=sample["admin"])
+    assert r.status_code == 400
+
+def test_list_accepts_numeric_cursor_for_float_sort(client, sample):
+    r = client.get("/api/admin/analytics/students", params={"sort": "gpa", "cursor": encode_cursor([3, "20230000"])},
+                   headers=sample["admin"])
+    assert r.status_code == 200
+
+def test_search_rejects_malformed_cursor(client, sample):
+    for values in ([{"a": 1}], [True], ["1"]):
+        r = client.get("/api/admin/students/search", params={"q": "学生", "cursor": encode_cursor(values)},
+                       headers=sample["admin"])
+        assert r.status_code == 400
@@ -0,0 +1,89 @@
+import asyncio
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import crud, crud_async, deps, models
+
+# 各 list_enrollments* 函数发出的 SQL 语句数必须是常数，不随返回的行数增长（防止逐行补查询）
+
+@contextmanager
+def count_statements():
+    counter = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.append(statement)
+    event.listen(Engine, "before_cursor_execute", on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", on_execute)
+
+def _populate(db, students: int, courses: int):
+    db.add(models.User(account_no="00000001", password_hash="x", role="teacher"))
+    db.flush()
+    db.add(models.Teacher(Tno="00000001", Tname="T"))
+    db.flush()
+    for c in range(courses):
+        db.add(models.Course(Cno=f"C{c:03d}", Ctno="00000001", Cname=f"课程{c}", Ccredit=2))
+    db.flush()
+    for s in range(students):
+        Sno = f"2023{s:04d}"
+        db.add(models.User(account_no=Sno, password_hash="x", role="student"))
+        db.flush()
+        db.add(models.Student(Sno=Sno, Sname=f"学生{s}", Ssex="男", Sdept="CS"))
+        db.flush()
+        for c in range(courses):
+            db.add(models.SC(Sno=Sno, Cno=f"C{c:03d}", Tno="00000001", grade=60 + c))
+    db.commit()
+
+SYNC_CASES = {
+    "list_enrollments": lambda db: crud.list_enrollments(db),
+    "list_enrollments(Sno)": lambda db: crud.list_enrollments(db, Sno="20230000"),
+    "list_enrollments_by_student": lambda db: crud.list_enrollments_by_student(db, "20230000"),
+    "list_enrollments_by_teacher": lambda db: crud.list_enrollments_by_teacher(db, "00000001"),
+    "list_enrollments_by_teacher(search)": lambda db: crud.list_enrollments_by_teacher(db, "00000001", search="学生"),
+    "page_enrollments": lambda db: crud.page_enrollments(db, limit=1000),
+    "page_enrollments(total)": lambda db: crud.page_enrollments(db, limit=1000, with_total=True),
+    "iter_enrollments": lambda db: list(crud.iter_enrollments(db)),
+}
+
+ASYNC_CASES = {
+    "async list_enrollments_by_student": lambda db: crud_async.list_enrollments_by_student(db, "20230000"),
+    "async list_enrollments_by_student(rows)":
+        lambda db: crud_async.list_enrollments_by_student(db, "20230000", as_rows=True),
+    "async list_enrollments_by_teacher": lambda db: crud_async.list_enrollments_by_teacher(db, "00000001"),
+    "async list_enrollments_by_teacher(rows)":
+        lambda db: crud_async.list_enrollments_by_teacher(db, "00000001", as_rows=True),
+}
+
+EXPECTED = {name: 1 for name in [*SYNC_CASES, *ASYNC_CASES]}
+EXPECTED["page_enrollments(total)"] = 2
+
+def _measure(db) -> dict[str, tuple[int, int]]:
+    out = {}
+    for name, fn in SYNC_CASES.items():
+        db.expire_all()
+        with count_statements() as stmts:
+            rows = fn(db)
+        out[name] = (len(stmts), len(rows.items if hasattr(rows, "items") else rows))
+
+    async def run_async():
+        try:
+            async with deps.get_async_sessionmaker()() as adb:
+                for name, fn in ASYNC_CASES.items():
+                    with count_statements() as stmts:
+                        rows = await fn(adb)
+                    out[name] = (len(stmts), len(rows))
+        finally:
+            await deps.dispose_async_engine()
+    asyncio.run(run_async())
+    return out
+
+@pytest.mark.parametrize("students,courses", [(2, 1), (20, 12)])
+def test_list_enrollments_statement_count_is_constant(db, students, courses):
+    _populate(db, students, courses)
+    measured = _measure(db)
+    for name, (statements, rows) in measured.items():
+        assert rows > 0, name
+        assert statements == EXPECTED[name], (name, statements, rows)
@@ -0,0 +1,199 @@
+import asyncio
+import re
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import (analytics, cache, crud, crud_async, deps, idempotency, models, revocation, search, seats, seed,
+                 versions)
+from app.pagination import encode_cursor
+from conftest import reset_database
+
+# 查询计划回归检查：以 app.seed 生成的数据逐个调用各查询 / 写函数，记录其发出的 SQL，
+# 对每条语句取执行计划；出现未声明的全表扫描时失败。
+# SQLite 使用 EXPLAIN QUERY PLAN（SCAN <表>）；PostgreSQL 在关闭顺序扫描后 EXPLAIN，
+# 仍为 Seq Scan 说明没有可用的索引（小表上规划器本就倾向顺序扫描，不能直接看默认计划）。
+
+STUDENTS, TEACHERS, COURSES, ENROLLMENTS = 400, 20, 60, 4000
+
+@pytest.fixture(scope="module")
+def ids(database):
+    reset_database()
+    seed.generate(STUDENTS, TEACHERS, COURSES, ENROLLMENTS, batch=1000, log=lambda *a: None)
+    db = deps.SessionLocal()
+    try:
+        S = seed.student_no(1)
+        selected = {(sc.Cno, sc.Tno) for sc in crud.list_student_selected(db, S)}
+        C, T = min(selected)
+        free = next((c.Cno, c.Ctno) for c in crud.list_courses(db) if (c.Cno, c.Ctno) not in selected)
+        other = next(r[0].Sno for r in crud.list_enrollments(db, Cno=C, Tno=T) if r[0].Sno != S)
+        Sname = crud.get_student(db, S).Sname
+    finally:
+        db.close()
+    yield {"S": S, "S2": other, "C": C, "T": T, "free": free, "Sname": Sname}
+    reset_database()
+
+def _run_async(fn):
+    async def run():
+        try:
+            async with deps.get_async_sessionmaker()() as adb:
+                return await fn(adb)
+        finally:
+            await deps.dispose_async_engine()
+    return asyncio.run(run())
+
+# 选课、改成绩、退课，结束时数据与调用前一致
+def _enroll_cycle(db, i):
+    (Cno, Tno), S = i["free"], i["S"]
+    crud.enroll(db, S, Cno, Tno)
+    crud.set_grade(db, S, Cno, Tno, 88)
+    crud.set_grades(db, [(S, Cno, Tno, 90), (i["S2"], i["C"], i["T"], 70), ("99999999", Cno, Tno, 1)])
+    crud.unenroll(db, S, Cno, Tno)
+
+# 新建教师、课程与选课记录后删除课程与教师
+def _delete_cycle(db, i):
+    Tno, S = "09999999", i["S"]
+    crud.create_account(db, Tno, "123456", "teacher", teacher={"Tname": "临时"})
+    for Cno in ("Z1", "Z2"):
+        crud.create_course(db, Cno, Tno, "临时课程", 2.0)
+        crud.enroll(db, S, Cno, Tno)
+    crud.set_grade(db, S, "Z1", Tno, 75)
+    crud.delete_course(db, "Z1", Tno)
+    crud.delete_user(db, Tno)
+
+# (名称, 调用, 允许全表扫描的表)：允许的只有本就读取整表的查询
+CASES = [
+    # 账号与档案
+    ("get_user_by_account", lambda db, i: crud.get_user_by_account(db, i["S"]), ()),
+    ("get_student", lambda db, i: crud.get_student(db, i["S"]), ()),
+    ("get_teacher", lambda db, i: crud.get_teacher(db, i["T"]), ()),
+    ("page_students", lambda db, i: crud.page_students(db, limit=50, cursor=encode_cursor([i["S"]])), ()),
+    ("page_students(Sdept)", lambda db, i: crud.page_students(db, limit=50, Sdept=seed.DEPTS[0]), ()),
+    ("page_students(Sname)", lambda db, i: crud.page_students(db, limit=50, Sname=i["Sname"][:1]), ()),
+    ("page_teachers", lambda db, i: crud.page_teachers(db, limit=50, cursor=encode_cursor([i["T"]])), ()),
+    ("update_student", lambda db, i: crud.update_student(db, i["S"], Sage=20), ()),
+    ("set_user_password", lambda db, i: crud.set_user_password(db, i["S2"], "123456"), ()),
+    ("revocation.sync", lambda db, i: revocation.sync(db), ()),
+    ("versions.get", lambda db, i: versions.get(db, *versions.SCOPES), ()),
+    ("idempotency.lookup", lambda db, i: idempotency.lookup(db, "0" * 32), ()),
+    # 课程
+    ("list_courses(Ctno)", lambda db, i: crud.list_courses(db, Ctno=i["T"]), ()),
+    ("list_courses", lambda db, i: crud.list_courses(db), ("courses",)),
+    ("page_courses(Ctno)", lambda db, i: crud.page_courses(db, limit=50, Ctno=i["T"]), ()),
+    ("course_exists", lambda db, i: crud.course_exists(db, i["C"], i["T"]), ()),
+    ("set_course_capacity", lambda db, i: crud.set_course_capacity(db, i["C"], i["T"], 500), ()),
+    ("get_enrolled_counts(pairs)", lambda db, i: crud.get_enrolled_counts(db, [(i["C"], i["T"])]), ()),
+    ("get_enrolled_counts", lambda db, i: crud.get_enrolled_counts(db), ("course_stats",)),
+    ("seats(pairs)", lambda db, i: db.execute(seats._seats_query([(i["C"], i["T"])])).all(), ()),
+    # 选课与成绩
+    ("list_student_selected", lambda db, i: crud.list_student_selected(db, i["S"]), ()),
+    ("get_enrollment", lambda db, i: crud.get_enrollment(db, i["S"], i["C"], i["T"]), ()),
+    ("enroll / set_grade / set_grades / unenroll", _enroll_cycle, ()),
+    ("admin_unenroll", lambda db, i: crud.admin_unenroll(db, i["S"], "C99999", i["T"]), ()),
+    ("delete_course / delete_user", _delete_cycle, ()),
+    ("list_enrollments(Sno)", lambda db, i: crud.list_enrollments(db, Sno=i["S"]), ()),
+    ("list_enrollments(Cno)", lambda db, i: crud.list_enrollments(db, Cno=i["C"]), ()),
+    ("list_enrollments(Tno)", lambda db, i: crud.list_enrollments(db, Tno=i["T"]), ()),
+    ("list_enrollments_by_student", lambda db, i: crud.list_enrollments_by_student(db, i["S"]), ()),
+    ("list_enrollments_by_teacher", lambda db, i: crud.list_enrollments_by_teacher(db, i["T"]), ()),
+    ("list_enrollments_by_teacher(Cno)",
+     lambda db, i: crud.list_enrollments_by_teacher(db, i["T"], Cno=i["C"]), ()),
+    ("list_enrollments_by_teacher(search)",
+     lambda db, i: crud.list_enrollments_by_teacher(db, i["T"], search=i["Sname"][:1]), ()),
+    ("list_enrollments_by_teacher(search fts)",
+     lambda db, i: crud.list_enrollments_by_teacher(db, i["T"], search=i["S"][:4]), ()),
+    ("page_enrollments", lambda db, i: crud.page_enrollments(
+        db, limit=50, cursor=encode_cursor([i["S"], i["C"], i["T"]])), ()),
+    ("page_enrollments(Cno)", lambda db, i: crud.page_enrollments(db, limit=50, Cno=i["C"]), ()),
+    ("page_enrollments(Tno)", lambda db, i: crud.page_enrollments(db, limit=50, Tno=i["T"]), ()),
+    # 检索：短于三个字符按学号 / 姓名前缀走索引范围；达到三个字符时走 FTS5 / pg_trgm 索引
+    ("search.student_filter(short)", lambda db, i: search.search_students(db, i["Sname"][:1], limit=20), ()),
+    ("search.student_filter(short Sname)", lambda db, i: search.search_students(db, i["Sname"][:2], limit=20), ()),
+    ("search.student_filter(short Sno)", lambda db, i: search.search_students(db, i["S"][:2], limit=20), ()),
+    ("search.student_filter", lambda db, i: search.search_students(db, i["S"][:5], limit=20), ()),
+    # 成绩汇总与统计
+    ("_summaries_from_sc(Snos)", lambda db, i: crud._summaries_from_sc(db, [i["S"], i["S2"]]), ()),
+    ("_summaries_from_sc", lambda db, i: crud._summaries_from_sc(db), ("sc",)),
+    ("get_student_summary", lambda db, i: crud.get_student_summary(db, i["S"]), ()),
+    ("page_student_summaries", lambda db, i: crud.page_student_summaries(
+        db, limit=50, cursor=encode_cursor([i["S"]])), ()),
+    ("page_student_summaries(gpa)", lambda db, i: crud.page_student_summaries(
+        db, limit=50, sort="gpa", desc=True, cursor=encode_cursor([3.0, i["S"]])), ()),
+    ("analytics.course_stats(Cno)", lambda db, i: analytics.course_stats(db, Cno=i["C"]), ()),
+    ("analytics.course_stats(Tno)", lambda db, i: analytics.course_stats(db, Tno=i["T"]), ()),
+    ("analytics.course_stats", lambda db, i: analytics.course_stats(db), ("sc",)),
+    ("analytics.department_stats", lambda db, i: analytics.department_stats(db), ("sc",)),
+    # 异步读取
+    ("async get_user_by_account", lambda db, i: _run_async(
+        lambda adb: crud_async.get_user_by_account(adb, i["S"])), ()),
+    ("async list_courses", lambda db, i: _run_async(crud_async.list_courses), ("courses",)),
+    ("async list_courses(Ctno)", lambda db, i: _run_async(lambda adb: crud_async.list_courses(adb, Ctno=i["T"])), ()),
+    ("async get_enrolled_counts(pairs)", lambda db, i: _run_async(
+        lambda adb: crud_async.get_enrolled_counts(adb, [(i["C"], i["T"])])), ()),
+    ("async list_student_selected", lambda db, i: _run_async(
+        lambda adb: crud_async.list_student_selected(adb, i["S"])), ()),
+    ("async list_enrollments_by_student", lambda db, i: _run_async(
+        lambda adb: crud_async.list_enrollments_by_student(adb, i["S"], as_rows=True)), ()),
+    ("async list_enrollments_by_teacher", lambda db, i: _run_async(
+        lambda adb: crud_async.list_enrollments_by_teacher(adb, i["T"], Cno=i["C"], as_rows=True)), ()),
+    ("async versions.get", lambda db, i: _run_async(
+        lambda adb: versions.get_async(adb, *versions.SCOPES)), ()),
+]
+
+# 调用 fn 并收集其执行的 (SQL, 参数)；executemany 只取第一组参数
+def capture(fn, i) -> list[tuple[str, object]]:
+    stmts = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            stmts.append((statement, parameters[0] if executemany else parameters))
+    cache.clear()   # 确保读穿透函数实际发出查询
+    analytics._cache.clear()
+    event.listen(Engine, "before_cursor_execute", on_execute)
+    db = deps.SessionLocal()
+    try:
+        fn(db, i)
+    finally:
+        event.remove(Engine, "before_cursor_execute", on_execute)
+        db.rollback()
+        db.close()
+    return stmts
+
+# 只检查数据表（子查询结果、常量行与 FTS 虚表的 SCAN 不算）
+_TABLES = set(models.Base.metadata.tables)
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+# 返回计划中被全表扫描的 (表名, 计划行)
+def scanned_tables(statement: str, parameters) -> list[tuple[str, str]]:
+    out = []
+    with deps.engine.connect() as conn:
+        if deps.IS_SQLITE:
+            for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all():
+                detail = row[-1]
+                if detail.startswith("SCAN ") and detail.split()[1] in _TABLES:
+                    out.append((detail.split()[1], detail))
+        else:
+            conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for (line,) in conn.exec_driver_sql("EXPLAIN " + statement, parameters).all():
+                m = _PG_SEQ_SCAN.search(line)
+                if m and m.group(1) in _TABLES:
+                    out.append((m.group(1), line.strip()))
+            conn.rollback()
+    return out
+
+# PostgreSQL 未安装 pg_trgm 时检索按设计退化为顺序扫描（见 search.py）
+def _substring_index() -> bool:
+    if deps.IS_SQLITE:
+        return True
+    with deps.engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+
+@pytest.mark.parametrize("name,fn,allowed", CASES, ids=[c[0] for c in CASES])
+def test_no_full_table_scan(ids, name, fn, allowed):
+    if name.startswith("search.") and "(short" not in name and not _substring_index():
+        allowed = (*allowed, "students")
+    stmts = capture(fn, ids)
+    assert stmts, "未执行任何查询"
+    failures = [f"{detail}\n    {' '.join(statement.split())}"
+                for statement, parameters in stmts
+                for table, detail in scanned_tables(statement, parameters) if table not in allowed]
+    assert not failures, "全表扫描：\n" + "\n".join(failures)
@@ -0,0 +1,32 @@
+import pytest
+
+@pytest.fixture
+def odd_name(client, sample):
+    r = client.post("/api/admin/users", json={"account_no": "20239999", "role": "student", "Sname": "%_a\\b",
+                                              "Ssex": "女", "Sdept": "CS", "Sage": 20}, headers=sample["admin"])
+    assert r.status_code == 200, r.text
+    return sample["admin"]
+
+def _search(client, headers, q):
+    r = client.get("/api/admin/students/search", params={"q": q}, headers=headers)
+    assert r.status_code == 200
+    return [s["Sno"] for s in r.json()["items"]]
+
+# %、_、\ 按字面匹配，不作通配符：短查询按前缀（索引范围），3 个字符及以上按子串
+@pytest.mark.parametrize("q, expected", [("%", ["20239999"]), ("%_", ["20239999"]), ("_", []), ("学_", []),
+                                         ("_a\\", ["20239999"]), ("a\\b", ["20239999"]), ("%_%", [])])
+def test_search_treats_wildcards_literally(client, odd_name, q, expected):
+    assert _search(client, odd_name, q) == expected
+
+# 短于 3 个字符的查询按学号 / 姓名前缀匹配
+def test_short_search_matches_prefixes(client, sample):
+    A = sample["admin"]
+    assert _search(client, A, "学生") == [f"2023000{i}" for i in range(5)]
+    assert _search(client, A, "20") == [f"2023000{i}" for i in range(5)]
+    assert _search(client, A, "生0") == []
+    assert _search(client, A, "学生0") == ["20230000"]
+
+def test_teacher_search_treats_wildcards_literally(client, sample):
+    r = client.get("/api/teacher/enrollments", params={"search": "_"}, headers=sample["teacher"])
+    assert r.status_code == 200 and r.json() == []
+    assert len(client.get("/api/teacher/enrollments", params={"search": "学生"}, headers=sample["teacher"]).json()) == 3
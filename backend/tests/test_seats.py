@@ -0,0 +1,26 @@
+import asyncio
+from app import config, seats
+
+# 订阅在开始输出时才登记：响应未开始（客户端已断开）时不占用连接数，结束输出后注销
+def test_stream_subscribes_only_while_iterated():
+    async def run():
+        unused = seats.stream()
+        assert not seats.broadcaster.subscribers
+        await unused.aclose()
+        assert not seats.broadcaster.subscribers
+
+        gen = seats.stream()
+        assert await gen.__anext__() == seats.RETRY
+        assert len(seats.broadcaster.subscribers) == 1
+        await gen.aclose()
+        assert not seats.broadcaster.subscribers
+    asyncio.run(run())
+
+def test_stream_ends_after_retry_when_full(monkeypatch):
+    monkeypatch.setattr(config, "SEATS_MAX_CLIENTS", 0)
+
+    async def run():
+        assert seats.broadcaster.full()
+        return [chunk async for chunk in seats.stream()]
+    assert asyncio.run(run()) == [seats.RETRY]
+    assert not seats.broadcaster.subscribers
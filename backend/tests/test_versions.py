@@ -0,0 +1,30 @@
+from sqlalchemy import select
+from app import models, versions
+
+# 版本号分片：每次提交恰好加一（求和），写入分散在各分片行上
+def test_sharded_version_counts_every_commit(db):
+    (start,) = versions.get(db, versions.ENROLLMENTS)
+    for _ in range(64):
+        versions.touch(db, versions.ENROLLMENTS, versions.COURSES)
+        db.commit()
+    assert versions.get(db, versions.ENROLLMENTS, versions.TOKENS)[0] == start + 64
+    T = models.TableVersion
+    shards = db.execute(select(T.name, T.version).where(T.name.like(versions.ENROLLMENTS + "%"))).all()
+    assert len(shards) == versions.SHARDS[versions.ENROLLMENTS]
+    assert sum(1 for _, v in shards if v) > 1
+
+def test_rolled_back_writes_do_not_bump(db):
+    before = versions.get(db, *versions.SCOPES)
+    versions.touch(db, *versions.SCOPES)
+    db.rollback()
+    db.commit()
+    assert versions.get(db, *versions.SCOPES) == before
+
+def test_install_adds_missing_shard_rows(db):
+    T = models.TableVersion
+    db.query(T).filter(T.name.like(versions.ENROLLMENTS + "#%")).delete(synchronize_session=False)
+    db.commit()
+    versions.touch(db, versions.ENROLLMENTS)
+    db.commit()   # 分片行缺失时退回首行
+    versions.install(db.get_bind())
+    assert db.query(T).filter(T.name.like(versions.ENROLLMENTS + "%")).count() == versions.SHARDS[versions.ENROLLMENTS]